@@ -0,0 +1,312 @@
+# Versioned JSON API: /api/v1/<resource> and /api/v1/<resource>/<id>.
+#
+#   GET /api/v1/appointments?status=confirmed,completed&appointment_date__gte=2025-01-01
+#       &fields=appointment_date,work_hours&include=caregiver.user&fields[caregiver.user]=given_name,surname
+#       &sort=appointment_date&order=desc&limit=100&after=<cursor>
+#
+# Responses are built from Core column projections (only the requested
+# columns, no ORM identity map or object construction) and serialized with
+# orjson. fields= picks the columns (the primary key is always returned),
+# <column>=a,b filters on equality / IN, and <column>__gte/__gt/__lte/__lt on
+# ranges, for the columns each resource lists in its filters. Lists are keyset
+# paginated like the HTML pages (next_cursor / prev_cursor). include= adds
+# related rows, nested with dots; every include level is one IN query over the
+# whole page, so a request costs 1 + (number of includes) queries however many
+# rows it returns. Has-many includes (a caregiver's appointments) carry at most
+# API_MAX_RELATED rows per parent, lowest ids first, so one page can't pull in
+# an unbounded number of related rows; list the rest from their own resource
+# (/api/v1/appointments?caregiver_id=3).
+#
+#   POST /api/v1/appointments/batch   [{"caregiver_id": 3, "member_id": 8, "appointment_date": "2031-03-02",
+#                                       "appointment_time": "10:00", "work_hours": 2, "status": "confirmed"}, ...]
+#
+# creates up to BATCH_MAX_ROWS appointments, jobs or job applications in one
+# transaction (crud.create_*_batch) and answers with a result per row, so the
+# rows that fail a check are reported without holding back the others.
+
+import os
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, List, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from models import User, Caregiver, Member, Job, Appointment, JobApplication, Address
+from db import get_db, get_engine
+import loadguard
+from loadguard import query_budget
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate, resolve_sort
+import crud
+
+# Most include paths (counting each nested level) one request may ask for.
+API_MAX_INCLUDES = int(os.getenv("API_MAX_INCLUDES", 5))
+# Most rows a has-many include returns per parent row
+API_MAX_RELATED = int(os.getenv("API_MAX_RELATED", 100))
+# Most rows one batch create may carry
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", 1000))
+
+RESERVED_PARAMS = {"fields", "include", "sort", "order", "after", "before", "limit"}
+OPERATORS = {
+    "gte": lambda column, value: column >= value,
+    "gt": lambda column, value: column > value,
+    "lte": lambda column, value: column <= value,
+    "lt": lambda column, value: column < value,
+}
+
+
+class Relation:
+    # Rows of `target` whose `remote` column equals this row's `local` column
+    def __init__(self, target, local, remote, many):
+        self.target, self.local, self.remote, self.many = target, local, remote, many
+
+
+class Resource:
+    def __init__(self, model, sorts, filters, relations, hidden=()):
+        self.model = model
+        self.pk = model.__mapper__.primary_key[0].key
+        self.columns = {attr.key: getattr(model, attr.key) for attr in model.__mapper__.column_attrs
+                        if attr.key not in hidden}
+        self.sorts = sorts
+        self.filters = filters
+        self.relations = relations
+
+
+RESOURCES = {
+    "users": Resource(User, crud.USER_SORTS, ("email", "surname", "city"), {
+        "caregiver": Relation("caregivers", "user_id", "user_id", many=False),
+        "member": Relation("members", "user_id", "user_id", many=False),
+        "addresses": Relation("addresses", "user_id", "user_id", many=True),
+    }, hidden=("password",)),
+    "caregivers": Resource(Caregiver, crud.CAREGIVER_SORTS,
+                           ("user_id", "caregiving_type", "gender", "hourly_rate"), {
+        "user": Relation("users", "user_id", "user_id", many=False),
+        "appointments": Relation("appointments", "caregiver_id", "caregiver_id", many=True),
+        "applications": Relation("job_applications", "caregiver_id", "caregiver_id", many=True),
+    }),
+    "members": Resource(Member, crud.MEMBER_SORTS, ("user_id",), {
+        "user": Relation("users", "user_id", "user_id", many=False),
+        "jobs": Relation("jobs", "member_id", "member_id", many=True),
+        "appointments": Relation("appointments", "member_id", "member_id", many=True),
+    }),
+    "jobs": Resource(Job, crud.JOB_SORTS, ("member_id", "required_caregiving_type", "date_posted"), {
+        "member": Relation("members", "member_id", "member_id", many=False),
+        "applications": Relation("job_applications", "job_id", "job_id", many=True),
+    }),
+    "appointments": Resource(Appointment, crud.APPOINTMENT_SORTS,
+                             ("caregiver_id", "member_id", "appointment_date", "status"), {
+        "caregiver": Relation("caregivers", "caregiver_id", "caregiver_id", many=False),
+        "member": Relation("members", "member_id", "member_id", many=False),
+    }),
+    "job_applications": Resource(JobApplication,
+                                 {"id": JobApplication.application_id, "date_applied": JobApplication.date_applied},
+                                 ("caregiver_id", "job_id", "status", "date_applied"), {
+        "caregiver": Relation("caregivers", "caregiver_id", "caregiver_id", many=False),
+        "job": Relation("jobs", "job_id", "job_id", many=False),
+    }),
+    "addresses": Resource(Address, {"id": Address.address_id}, ("user_id", "city", "country"), {
+        "user": Relation("users", "user_id", "user_id", many=False),
+    }),
+}
+
+
+def _field_list(resource, fields, param="fields"):
+    if not fields:
+        return list(resource.columns)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in resource.columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s) in {param}: {', '.join(unknown)}")
+    return [resource.pk] + [name for name in names if name != resource.pk]
+
+
+def _include_tree(resource, include):
+    # "caregiver.user,member" -> {"caregiver": {"user": {}}, "member": {}}
+    tree, count = {}, 0
+    for path in (include or "").split(","):
+        if not path.strip():
+            continue
+        node, current = tree, resource
+        for name in path.strip().split("."):
+            relation = current.relations.get(name)
+            if relation is None:
+                raise HTTPException(status_code=400, detail=f"Cannot include '{path.strip()}'")
+            if name not in node:
+                node[name] = {}
+                count += 1
+            node, current = node[name], RESOURCES[relation.target]
+    if count > API_MAX_INCLUDES:
+        raise HTTPException(status_code=400, detail=f"At most {API_MAX_INCLUDES} includes per request")
+    return tree
+
+
+def _parse(column, raw):
+    python_type = column.type.python_type
+    try:
+        if python_type is datetime:
+            return datetime.fromisoformat(raw)
+        if python_type is date:
+            return date.fromisoformat(raw)
+        return python_type(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid value for {column.key}: {raw!r}")
+
+
+def _filter(resource, stmt, query_params):
+    for key, raw in query_params.multi_items():
+        if key in RESERVED_PARAMS or key.startswith("fields["):
+            continue
+        name, _, op = key.partition("__")
+        if name not in resource.filters or (op and op not in OPERATORS):
+            raise HTTPException(status_code=400, detail=f"Cannot filter on '{key}', expected one of: "
+                                                        f"{', '.join(resource.filters)} (optionally with "
+                                                        f"__{', __'.join(OPERATORS)})")
+        column = resource.columns[name]
+        if op:
+            stmt = stmt.where(OPERATORS[op](column, _parse(column, raw)))
+        else:
+            values = [_parse(column, value) for value in raw.split(",")]
+            stmt = stmt.where(column.in_(values) if len(values) > 1 else column == values[0])
+    return stmt
+
+
+def _projection(resource, fields, tree, *extra):
+    # The requested fields plus the columns the includes join on
+    needed = list(fields)
+    for name in list(extra) + [resource.relations[name].local for name in tree]:
+        if name not in needed:
+            needed.append(name)
+    return select(*[resource.columns[name] for name in needed])
+
+
+def _shape(rows, fields, tree):
+    return [{**{name: row[name] for name in fields}, **{name: row[name] for name in tree}} for row in rows]
+
+
+def _first_per_parent(resource, relation, stmt):
+    # Keeps the API_MAX_RELATED lowest ids per parent, still in one query
+    rank = func.row_number().over(partition_by=resource.columns[relation.remote],
+                                  order_by=resource.columns[resource.pk]).label("_rank")
+    ranked = stmt.add_columns(rank).subquery()
+    return (select(*[column for column in ranked.c if column.key != "_rank"])
+            .where(ranked.c._rank <= API_MAX_RELATED)
+            .order_by(ranked.c[resource.pk]))
+
+
+def _attach(db, resource, rows, tree, sparse, prefix=""):
+    # Adds each included relation to the row dicts, one query per relation
+    for name, subtree in tree.items():
+        relation = resource.relations[name]
+        target = RESOURCES[relation.target]
+        path = prefix + name
+        fields = _field_list(target, sparse.get(path), f"fields[{path}]")
+        keys = {row[relation.local] for row in rows if row[relation.local] is not None}
+        related = []
+        if keys:
+            stmt = (_projection(target, fields, subtree, relation.remote)
+                    .where(target.columns[relation.remote].in_(keys)))
+            if relation.many:
+                stmt = _first_per_parent(target, relation, stmt)
+            else:
+                stmt = stmt.order_by(target.columns[target.pk])
+            related = [dict(r._mapping) for r in db.execute(stmt)]
+            _attach(db, target, related, subtree, sparse, path + ".")
+        grouped = defaultdict(list)
+        for row, shaped in zip(related, _shape(related, fields, subtree)):
+            grouped[row[relation.remote]].append(shaped)
+        for row in rows:
+            matches = grouped.get(row[relation.local], [])
+            row[name] = matches if relation.many else (matches[0] if matches else None)
+
+
+def _sparse_fields(query_params):
+    return {key[len("fields["):-1]: value for key, value in query_params.items()
+            if key.startswith("fields[") and key.endswith("]")}
+
+
+def _list_endpoint(resource):
+    @query_budget(1 + API_MAX_INCLUDES)
+    def list_items(
+        request: Request,
+        fields: Optional[str] = None,
+        include: Optional[str] = None,
+        sort: str = "id",
+        order: str = Query("asc", pattern="^(asc|desc)$"),
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        db: Session = Depends(get_db)
+    ):
+        selected = _field_list(resource, fields)
+        tree = _include_tree(resource, include)
+        try:
+            sort_column = resolve_sort(resource.sorts, sort)
+            stmt = _filter(resource, _projection(resource, selected, tree, sort_column.key), request.query_params)
+            page = paginate(stmt, sort_column, resource.columns[resource.pk], after, before, limit,
+                            order == "desc", sort, db=db)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        rows = [dict(r._mapping) for r in page.items]
+        _attach(db, resource, rows, tree, _sparse_fields(request.query_params))
+        return ORJSONResponse({"data": _shape(rows, selected, tree), "next_cursor": page.next_cursor,
+                               "prev_cursor": page.prev_cursor})
+    return list_items
+
+
+def _get_endpoint(resource):
+    @query_budget(1 + API_MAX_INCLUDES)
+    def get_item(
+        request: Request,
+        item_id: int,
+        fields: Optional[str] = None,
+        include: Optional[str] = None,
+        db: Session = Depends(get_db)
+    ):
+        selected = _field_list(resource, fields)
+        tree = _include_tree(resource, include)
+        row = db.execute(_projection(resource, selected, tree)
+                         .where(resource.columns[resource.pk] == item_id)).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        rows = [dict(row._mapping)]
+        _attach(db, resource, rows, tree, _sparse_fields(request.query_params))
+        return ORJSONResponse({"data": _shape(rows, selected, tree)[0]})
+    return get_item
+
+
+def _insert_statements(rows):
+    # PostgreSQL returns the rows of a multi-row INSERT in parameter order, in
+    # statements of up to 1000 rows; SQLite can't, so SQLAlchemy sends an
+    # INSERT per row there.
+    chunk = 1000 if get_engine().dialect.name == "postgresql" else 1
+    return -(-rows // chunk)
+
+
+def _batch_endpoint(create, queries):
+    @query_budget(queries)
+    def create_batch(rows: List[Any] = Body(...), db: Session = Depends(get_db)):
+        if len(rows) > BATCH_MAX_ROWS:
+            raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ROWS} rows per batch")
+        loadguard.allow(_insert_statements(len(rows)))
+        results = create(db, rows)
+        failed = sum("error" in result for result in results)
+        return ORJSONResponse({"created": len(results) - failed, "failed": failed, "results": results})
+    return create_batch
+
+
+# resource -> (crud function, statements besides the INSERT: one SELECT per
+# referenced table, the caregivers' schedules, the counter and rollup updates)
+BATCH_CREATES = {
+    "appointments": (crud.create_appointments_batch, 5),
+    "jobs": (crud.create_jobs_batch, 2),
+    "job_applications": (crud.create_applications_batch, 2),
+}
+
+router = APIRouter(prefix="/api/v1", tags=["api"])
+for _name, (_create, _queries) in BATCH_CREATES.items():
+    router.add_api_route(f"/{_name}/batch", _batch_endpoint(_create, _queries), methods=["POST"],
+                         name=f"api_batch_{_name}")
+for _name, _resource in RESOURCES.items():
+    router.add_api_route(f"/{_name}", _list_endpoint(_resource), methods=["GET"], name=f"api_list_{_name}")
+    router.add_api_route(f"/{_name}/{{item_id}}", _get_endpoint(_resource), methods=["GET"],
+                         name=f"api_get_{_name}")
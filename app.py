@@ -1,98 +1,313 @@
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Form, Query, Header, Depends, HTTPException
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
 import os
-from models import Base, User, Caregiver, Member, Job, Appointment
+import secrets
+import threading
+import anyio
+from typing import Optional
+from sqlalchemy.engine import Engine
 import crud
+import counters
+import options_cache
+import fragment_cache
+import table_versions
+import search_index
+import text_search
+import matching
+import schedule
+import export
+import api
+import rates
+import metrics
+import loadguard
+import conditional
+import compression
+import static_assets
+from loadguard import query_budget
+from conditional import conditional_get
+from datetime import date
+from db import get_engine, dispose_engine, get_db, SessionLocal
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+# Route handlers are plain `def` functions: the crud layer uses blocking
+# SQLAlchemy sessions, so FastAPI runs each handler in its worker threadpool
+# and concurrent requests overlap their database I/O instead of queueing on
+# the event loop. THREADPOOL_SIZE caps how many run at once.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", 40))
+
+# Dashboard counters are maintained incrementally; set this to also reset them
+# to true COUNT(*) values every N seconds (0 disables).
+COUNTER_RECONCILE_SECONDS = int(os.getenv("COUNTER_RECONCILE_SECONDS", 0))
+
+# Admin routes require the X-Admin-Token header to match ADMIN_TOKEN; they are
+# disabled when it isn't set.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Importing this module never touches the database: the engine is created
+# lazily (db.py) and the tables come from the Alembic migrations, not
+# create_all. At startup SCHEMA_CHECK compares the database's revision with
+# the migrations: "warn" (default) prints a mismatch from a background thread
+# without holding up startup, "require" refuses to start, "upgrade" runs
+# `alembic upgrade head` (development), "off" skips the check. Import and startup times are printed, with a
+# warning when they exceed STARTUP_BUDGET_SECONDS; check_startup.py measures
+# cold starts in fresh processes.
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "warn").lower()
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", 1.0))
+
+def check_schema(mode):
+    import schema  # Alembic is only imported when the check runs
+    schema.check(get_engine(), mode)
+
+@asynccontextmanager
+async def lifespan(app):
+    started = time.perf_counter()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    if SCHEMA_CHECK == "warn":
+        threading.Thread(target=check_schema, args=(SCHEMA_CHECK,), name="schema-check", daemon=True).start()
+    elif SCHEMA_CHECK in ("require", "upgrade"):
+        await anyio.to_thread.run_sync(check_schema, SCHEMA_CHECK)
+    if COUNTER_RECONCILE_SECONDS > 0:
+        counters.start_reconciler(SessionLocal, COUNTER_RECONCILE_SECONDS)
+    finished = time.perf_counter()
+    total = finished - IMPORT_STARTED
+    print(f"Started in {total:.2f}s (imports {started - IMPORT_STARTED:.2f}s, startup {finished - started:.2f}s)")
+    if total > STARTUP_BUDGET_SECONDS:
+        print(f"Warning: startup took longer than STARTUP_BUDGET_SECONDS={STARTUP_BUDGET_SECONDS:g}")
+    yield
+    dispose_engine()
+
+app = FastAPI(title="Caregiver Platform - CSCI 341", lifespan=lifespan)
+
+# Per-route request/SQL timings and a slow-query log; see metrics.py. The
+# events are registered on the Engine class, so they cover the engine db.py
+# creates on first use. Middleware added later wraps the earlier ones:
+# compression (compression.py) sees the validators' ETag, and the load guard
+# (off unless LOAD_GUARD is set) runs inside the metrics middleware, which
+# also times compression.
+metrics.instrument(Engine)
+app.add_middleware(conditional.ValidatorsMiddleware)
+app.add_middleware(compression.CompressionMiddleware)
+loadguard.install(app)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Compiled templates are kept as bytecode in TEMPLATE_CACHE_DIR (default: a
+# directory under the system temp dir), so new workers load them instead of
+# parsing and compiling every template again.
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR")
+
+app.mount("/static", static_assets.StaticAssets(directory="static"), name="static")
+templates = Jinja2Templates(directory="templates", bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR))
+templates.env.globals["static_url"] = static_assets.static_url
+
+def page_params(
+    sort: str = "id",
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    return {"sort": sort, "order": order, "after": after, "before": before, "limit": limit}
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable not set!")
-
-print("Connecting to database...")
-engine = create_engine(DATABASE_URL)
-
-Base.metadata.create_all(bind=engine)
-print("Database ready!")
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-app = FastAPI(title="Caregiver Platform - CSCI 341")
+def load_page(get_page, db, params):
+    try:
+        return get_page(db, **params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Tables whose rows each list and edit page shows (its table and dropdowns).
+# The rendered table is cached until one of them changes (fragment_cache.py),
+# and the pages answer conditional GETs from their versions (conditional.py).
+PAGE_TABLES = {
+    "users": ("users",),
+    "caregivers": ("caregivers", "users"),
+    "members": ("members", "users"),
+    "jobs": ("jobs", "members", "users"),
+    "appointments": ("appointments", "caregivers", "members", "users"),
+}
+
+def page_validators(name):
+    return [conditional_get(*PAGE_TABLES[name])]
+
+def list_table(request, name, get_page, sort_options, db, params):
+    key = (request.url.path, tuple(sorted(params.items())), table_versions.current(PAGE_TABLES[name]))
+    def render():
+        page = load_page(get_page, db, params)
+        return templates.get_template(f"_{name}_table.html").render(
+            {"request": request, name: page, "page": page, "sort_options": sort_options})
+    return Markup(fragment_cache.get_or_render(key, render))
+
+def save_appointment(write, db, *args):
+    try:
+        write(db, *args)
+    except schedule.AppointmentConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
 
 # Home page
 @app.get("/", response_class=HTMLResponse)
-async def home(request: Request):
-    db = SessionLocal()
+@query_budget(1)
+def home(request: Request, db: Session = Depends(get_db)):
     try:
-        users_count = db.query(User).count()
-        caregivers_count = db.query(Caregiver).count()
-        members_count = db.query(Member).count()
-        jobs_count = db.query(Job).count()
-        appointments_count = db.query(Appointment).count()
+        counts = counters.get_counts(db)
     except Exception as e:
         print(f"Error counting: {e}")
-        users_count = caregivers_count = members_count = jobs_count = appointments_count = 0
-    finally:
-        db.close()
+        counts = {}
 
     return templates.TemplateResponse("index.html", {
         "request": request,
-        "users_count": users_count,
-        "caregivers_count": caregivers_count,
-        "members_count": members_count,
-        "jobs_count": jobs_count,
-        "appointments_count": appointments_count
+        "users_count": counts.get("users", 0),
+        "caregivers_count": counts.get("caregivers", 0),
+        "members_count": counts.get("members", 0),
+        "jobs_count": counts.get("jobs", 0),
+        "appointments_count": counts.get("appointments", 0)
     })
 
+# SEARCH ROUTES
+
+@app.get("/metrics", response_class=PlainTextResponse)
+@query_budget(0)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/search/{entity}", response_class=JSONResponse)
+@query_budget(2)
+def search(
+    entity: str,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=search_index.SEARCH_MAX_RESULTS),
+    db: Session = Depends(get_db)
+):
+    if entity not in ("users", "caregivers", "members"):
+        raise HTTPException(status_code=404, detail=f"Cannot search {entity}")
+    return search_index.search(db, entity, q, limit)
+
+@app.get("/api/jobs/search", response_class=JSONResponse)
+@query_budget(2)
+def search_jobs(
+    q: str = Query(..., min_length=1, max_length=200),
+    caregiving_type: Optional[str] = None,
+    city: Optional[str] = None,
+    field: str = Query("all", pattern="^(all|requirements|house_rules)$"),
+    limit: int = Query(20, ge=1, le=text_search.MAX_RESULTS),
+    db: Session = Depends(get_db)
+):
+    return text_search.search(db, q, caregiving_type, city, field, limit)
+
+@app.get("/api/jobs/{job_id}/matches", response_class=JSONResponse)
+@query_budget(8)
+def match_job(
+    job_id: int,
+    budget: Optional[float] = Query(None, gt=0),
+    limit: int = Query(10, ge=1, le=matching.MAX_MATCHES),
+    db: Session = Depends(get_db)
+):
+    matches = matching.match_job(db, job_id, budget, limit)
+    if matches is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return matches
+
+# JSON API (/api/v1/...), see api.py
+app.include_router(api.router)
+
+# EXPORT ROUTES
+
+@app.get("/export/{entity}")
+@query_budget(1)
+def export_table(
+    entity: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    status: Optional[str] = Query(None, description="comma-separated statuses"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    if entity not in export.ENTITIES:
+        raise HTTPException(status_code=404, detail=f"Cannot export {entity}")
+    statuses = [s.strip() for s in status.split(",") if s.strip()] if status else None
+    try:
+        stmt = export.build_query(entity, statuses, date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        export.stream(db.get_bind(), stmt, format),
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{entity}.{format}"'}
+    )
+
+# ADMIN ROUTES
+
+@app.post("/admin/rates/adjust", response_class=JSONResponse, dependencies=[Depends(require_admin)])
+@query_budget(4)
+def adjust_rates(
+    threshold: float = Form(rates.DEFAULT_THRESHOLD, ge=0),
+    flat: float = Form(rates.DEFAULT_FLAT),
+    percent: float = Form(rates.DEFAULT_PERCENT, gt=-100),
+    caregiving_type: Optional[str] = Form(None),
+    city: Optional[str] = Form(None),
+    dry_run: bool = Form(True),
+    db: Session = Depends(get_db)
+):
+    return rates.adjust(db, dry_run, threshold=threshold, flat=flat, percent=percent,
+                        caregiving_type=caregiving_type or None, city=city or None)
+
 # USERS ROUTES
 
-@app.get("/users", response_class=HTMLResponse)
-async def list_users(request: Request):
-    db = SessionLocal()
-    users = crud.get_users(db)
-    db.close()
-    return templates.TemplateResponse("users.html", {"request": request, "users": users})
+@app.get("/users", response_class=HTMLResponse, dependencies=page_validators("users"))
+@query_budget(1)
+def list_users(request: Request, params: dict = Depends(page_params), db: Session = Depends(get_db)):
+    table = list_table(request, "users", crud.get_users_page, crud.USER_SORTS, db, params)
+    return templates.TemplateResponse("users.html", {
+        "request": request,
+        "table": table
+    })
 
 @app.get("/users/create", response_class=HTMLResponse)
-async def create_user_form(request: Request):
+@query_budget(0)
+def create_user_form(request: Request):
     return templates.TemplateResponse("users.html", {"request": request, "users": [], "show_form": True})
 
 @app.post("/users/create")
-async def create_user(
+@query_budget(3)
+def create_user(
     email: str = Form(...),
     given_name: str = Form(...),
     surname: str = Form(...),
     city: str = Form(...),
     phone_number: str = Form(...),
     profile_description: str = Form(...),
-    password: str = Form(...)
+    password: str = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     crud.create_user(db, email, given_name, surname, city, phone_number, profile_description, password)
-    db.close()
     return RedirectResponse(url="/users", status_code=303)
 
-@app.get("/users/edit/{user_id}", response_class=HTMLResponse)
-async def edit_user_form(request: Request, user_id: int):
-    db = SessionLocal()
+@app.get("/users/edit/{user_id}", response_class=HTMLResponse, dependencies=page_validators("users"))
+@query_budget(2)
+def edit_user_form(request: Request, user_id: int, params: dict = Depends(page_params), db: Session = Depends(get_db)):
     user = crud.get_user(db, user_id)
-    users = crud.get_users(db)
-    db.close()
+    table = list_table(request, "users", crud.get_users_page, crud.USER_SORTS, db, params)
     return templates.TemplateResponse("users.html", {
         "request": request,
-        "users": users,
+        "table": table,
         "edit_user": user
     })
 
 @app.post("/users/edit/{user_id}")
-async def edit_user(
+@query_budget(3)
+def edit_user(
     user_id: int,
     email: str = Form(...),
     given_name: str = Form(...),
@@ -100,257 +315,264 @@ async def edit_user(
     city: str = Form(...),
     phone_number: str = Form(...),
     profile_description: str = Form(...),
-    password: str = Form(...)
+    password: str = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     crud.update_user(db, user_id, email, given_name, surname, city, phone_number, profile_description, password)
-    db.close()
     return RedirectResponse(url="/users", status_code=303)
 
 @app.api_route("/users/delete/{user_id}", methods=["GET", "POST"])
-async def delete_user(user_id: int):
-    db = SessionLocal()
+@query_budget(14)
+def delete_user(user_id: int, db: Session = Depends(get_db)):
     crud.delete_user(db, user_id)
-    db.close()
     return RedirectResponse(url="/users", status_code=303)
 
 # CAREGIVERS ROUTES
 
-@app.get("/caregivers", response_class=HTMLResponse)
-async def list_caregivers(request: Request):
-    db = SessionLocal()
-    caregivers = crud.get_caregivers(db)
-    users = crud.get_users(db)
-    db.close()
+@app.get("/caregivers", response_class=HTMLResponse, dependencies=page_validators("caregivers"))
+@query_budget(2)
+def list_caregivers(request: Request, params: dict = Depends(page_params), db: Session = Depends(get_db)):
+    table = list_table(request, "caregivers", crud.get_caregivers_page, crud.CAREGIVER_SORTS, db, params)
+    user_options = options_cache.get_options(db, "users")
     return templates.TemplateResponse("caregivers.html", {
         "request": request,
-        "caregivers": caregivers,
-        "users": users
+        "table": table,
+        "user_options": user_options
     })
 
 @app.post("/caregivers/create")
-async def create_caregiver(
+@query_budget(3)
+def create_caregiver(
     user_id: int = Form(...),
     photo_url: str = Form(...),
     gender: str = Form(...),
     caregiving_type: str = Form(...),
-    hourly_rate: float = Form(...)
+    hourly_rate: float = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     crud.create_caregiver(db, user_id, photo_url, gender, caregiving_type, hourly_rate)
-    db.close()
     return RedirectResponse(url="/caregivers", status_code=303)
 
-@app.get("/caregivers/edit/{caregiver_id}", response_class=HTMLResponse)
-async def edit_caregiver_form(request: Request, caregiver_id: int):
-    db = SessionLocal()
+@app.get("/caregivers/edit/{caregiver_id}", response_class=HTMLResponse, dependencies=page_validators("caregivers"))
+@query_budget(3)
+def edit_caregiver_form(request: Request, caregiver_id: int, params: dict = Depends(page_params), db: Session = Depends(get_db)):
     caregiver = crud.get_caregiver(db, caregiver_id)
-    caregivers = crud.get_caregivers(db)
-    users = crud.get_users(db)
-    db.close()
+    table = list_table(request, "caregivers", crud.get_caregivers_page, crud.CAREGIVER_SORTS, db, params)
+    user_options = options_cache.get_options(db, "users")
     return templates.TemplateResponse("caregivers.html", {
         "request": request,
-        "caregivers": caregivers,
-        "users": users,
+        "table": table,
+        "user_options": user_options,
         "edit_caregiver": caregiver
     })
 
 @app.post("/caregivers/edit/{caregiver_id}")
-async def edit_caregiver(
+@query_budget(4)
+def edit_caregiver(
     caregiver_id: int,
     photo_url: str = Form(...),
     gender: str = Form(...),
     caregiving_type: str = Form(...),
-    hourly_rate: float = Form(...)
+    hourly_rate: float = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     crud.update_caregiver(db, caregiver_id, photo_url, gender, caregiving_type, hourly_rate)
-    db.close()
     return RedirectResponse(url="/caregivers", status_code=303)
 
+@app.get("/caregivers/{caregiver_id}/free-slots", response_class=JSONResponse)
+@query_budget(2)
+def caregiver_free_slots(
+    caregiver_id: int,
+    start: date,
+    end: date,
+    day_start: str = "08:00",
+    day_end: str = "20:00",
+    min_minutes: int = Query(30, ge=1, le=24 * 60),
+    db: Session = Depends(get_db)
+):
+    if crud.get_caregiver(db, caregiver_id) is None:
+        raise HTTPException(status_code=404, detail="Caregiver not found")
+    try:
+        slots = schedule.free_slots(db, caregiver_id, start, end, day_start, day_end, min_minutes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [{"starts_at": starts_at.isoformat(), "ends_at": ends_at.isoformat()} for starts_at, ends_at in slots]
+
 @app.api_route("/caregivers/delete/{caregiver_id}", methods=["GET", "POST"])
-async def delete_caregiver(caregiver_id: int):
-    db = SessionLocal()
+@query_budget(9)
+def delete_caregiver(caregiver_id: int, db: Session = Depends(get_db)):
     crud.delete_caregiver(db, caregiver_id)
-    db.close()
     return RedirectResponse(url="/caregivers", status_code=303)
 
 # MEMBERS ROUTES
 
-@app.get("/members", response_class=HTMLResponse)
-async def list_members(request: Request):
-    db = SessionLocal()
-    members = crud.get_members(db)
-    users = crud.get_users(db)
-    db.close()
+@app.get("/members", response_class=HTMLResponse, dependencies=page_validators("members"))
+@query_budget(2)
+def list_members(request: Request, params: dict = Depends(page_params), db: Session = Depends(get_db)):
+    table = list_table(request, "members", crud.get_members_page, crud.MEMBER_SORTS, db, params)
+    user_options = options_cache.get_options(db, "users")
     return templates.TemplateResponse("members.html", {
         "request": request,
-        "members": members,
-        "users": users
+        "table": table,
+        "user_options": user_options
     })
 
 @app.post("/members/create")
-async def create_member(
+@query_budget(3)
+def create_member(
     user_id: int = Form(...),
-    house_rules: str = Form(...)
+    house_rules: str = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     crud.create_member(db, user_id, house_rules)
-    db.close()
     return RedirectResponse(url="/members", status_code=303)
 
-@app.get("/members/edit/{member_id}", response_class=HTMLResponse)
-async def edit_member_form(request: Request, member_id: int):
-    db = SessionLocal()
+@app.get("/members/edit/{member_id}", response_class=HTMLResponse, dependencies=page_validators("members"))
+@query_budget(3)
+def edit_member_form(request: Request, member_id: int, params: dict = Depends(page_params), db: Session = Depends(get_db)):
     member = crud.get_member(db, member_id)
-    members = crud.get_members(db)
-    users = crud.get_users(db)
-    db.close()
+    table = list_table(request, "members", crud.get_members_page, crud.MEMBER_SORTS, db, params)
+    user_options = options_cache.get_options(db, "users")
     return templates.TemplateResponse("members.html", {
         "request": request,
-        "members": members,
-        "users": users,
+        "table": table,
+        "user_options": user_options,
         "edit_member": member
     })
 
 @app.post("/members/edit/{member_id}")
-async def edit_member(
+@query_budget(3)
+def edit_member(
     member_id: int,
-    house_rules: str = Form(...)
+    house_rules: str = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     crud.update_member(db, member_id, house_rules)
-    db.close()
     return RedirectResponse(url="/members", status_code=303)
 
 @app.api_route("/members/delete/{member_id}", methods=["GET", "POST"])
-async def delete_member(member_id: int):
-    db = SessionLocal()
+@query_budget(12)
+def delete_member(member_id: int, db: Session = Depends(get_db)):
     crud.delete_member(db, member_id)
-    db.close()
     return RedirectResponse(url="/members", status_code=303)
 
 # JOBS ROUTES
 
-@app.get("/jobs", response_class=HTMLResponse)
-async def list_jobs(request: Request):
-    db = SessionLocal()
-    jobs = crud.get_jobs(db)
-    members = crud.get_members(db)
-    db.close()
+@app.get("/jobs", response_class=HTMLResponse, dependencies=page_validators("jobs"))
+@query_budget(2)
+def list_jobs(request: Request, params: dict = Depends(page_params), db: Session = Depends(get_db)):
+    table = list_table(request, "jobs", crud.get_jobs_page, crud.JOB_SORTS, db, params)
+    member_options = options_cache.get_options(db, "members")
     return templates.TemplateResponse("jobs.html", {
         "request": request,
-        "jobs": jobs,
-        "members": members
+        "table": table,
+        "member_options": member_options
     })
 
 @app.post("/jobs/create")
-async def create_job(
+@query_budget(3)
+def create_job(
     member_id: int = Form(...),
     required_caregiving_type: str = Form(...),
-    other_requirements: str = Form(...)
+    other_requirements: str = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     crud.create_job(db, member_id, required_caregiving_type, other_requirements)
-    db.close()
     return RedirectResponse(url="/jobs", status_code=303)
 
-@app.get("/jobs/edit/{job_id}", response_class=HTMLResponse)
-async def edit_job_form(request: Request, job_id: int):
-    db = SessionLocal()
+@app.get("/jobs/edit/{job_id}", response_class=HTMLResponse, dependencies=page_validators("jobs"))
+@query_budget(3)
+def edit_job_form(request: Request, job_id: int, params: dict = Depends(page_params), db: Session = Depends(get_db)):
     job = crud.get_job(db, job_id)
-    jobs = crud.get_jobs(db)
-    members = crud.get_members(db)
-    db.close()
+    table = list_table(request, "jobs", crud.get_jobs_page, crud.JOB_SORTS, db, params)
+    member_options = options_cache.get_options(db, "members")
     return templates.TemplateResponse("jobs.html", {
         "request": request,
-        "jobs": jobs,
-        "members": members,
+        "table": table,
+        "member_options": member_options,
         "edit_job": job
     })
 
 @app.post("/jobs/edit/{job_id}")
-async def edit_job(
+@query_budget(3)
+def edit_job(
     job_id: int,
     required_caregiving_type: str = Form(...),
-    other_requirements: str = Form(...)
+    other_requirements: str = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
     crud.update_job(db, job_id, required_caregiving_type, other_requirements)
-    db.close()
     return RedirectResponse(url="/jobs", status_code=303)
 
 @app.api_route("/jobs/delete/{job_id}", methods=["GET", "POST"])
-async def delete_job(job_id: int):
-    db = SessionLocal()
+@query_budget(5)
+def delete_job(job_id: int, db: Session = Depends(get_db)):
     crud.delete_job(db, job_id)
-    db.close()
     return RedirectResponse(url="/jobs", status_code=303)
 
 # APPOINTMENTS ROUTES
 
-@app.get("/appointments", response_class=HTMLResponse)
-async def list_appointments(request: Request):
-    db = SessionLocal()
-    appointments = crud.get_appointments(db)
-    caregivers = crud.get_caregivers(db)
-    members = crud.get_members(db)
-    db.close()
+@app.get("/appointments", response_class=HTMLResponse, dependencies=page_validators("appointments"))
+@query_budget(3)
+def list_appointments(request: Request, params: dict = Depends(page_params), db: Session = Depends(get_db)):
+    table = list_table(request, "appointments", crud.get_appointments_page, crud.APPOINTMENT_SORTS, db, params)
+    caregiver_options = options_cache.get_options(db, "caregivers")
+    member_options = options_cache.get_options(db, "members")
     return templates.TemplateResponse("appointments.html", {
         "request": request,
-        "appointments": appointments,
-        "caregivers": caregivers,
-        "members": members
+        "table": table,
+        "caregiver_options": caregiver_options,
+        "member_options": member_options
     })
 
 @app.post("/appointments/create")
-async def create_appointment(
+@query_budget(4)
+def create_appointment(
     caregiver_id: int = Form(...),
     member_id: int = Form(...),
     appointment_date: str = Form(...),
     appointment_time: str = Form(...),
     work_hours: float = Form(...),
-    status: str = Form(...)
+    status: str = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
-    crud.create_appointment(db, caregiver_id, member_id, appointment_date, appointment_time, work_hours, status)
-    db.close()
+    save_appointment(crud.create_appointment, db, caregiver_id, member_id, appointment_date, appointment_time,
+                     work_hours, status)
     return RedirectResponse(url="/appointments", status_code=303)
 
-@app.get("/appointments/edit/{appointment_id}", response_class=HTMLResponse)
-async def edit_appointment_form(request: Request, appointment_id: int):
-    db = SessionLocal()
+@app.get("/appointments/edit/{appointment_id}", response_class=HTMLResponse, dependencies=page_validators("appointments"))
+@query_budget(4)
+def edit_appointment_form(request: Request, appointment_id: int, params: dict = Depends(page_params), db: Session = Depends(get_db)):
     appointment = crud.get_appointment(db, appointment_id)
-    appointments = crud.get_appointments(db)
-    caregivers = crud.get_caregivers(db)
-    members = crud.get_members(db)
-    db.close()
+    table = list_table(request, "appointments", crud.get_appointments_page, crud.APPOINTMENT_SORTS, db, params)
+    caregiver_options = options_cache.get_options(db, "caregivers")
+    member_options = options_cache.get_options(db, "members")
     return templates.TemplateResponse("appointments.html", {
         "request": request,
-        "appointments": appointments,
-        "caregivers": caregivers,
-        "members": members,
+        "table": table,
+        "caregiver_options": caregiver_options,
+        "member_options": member_options,
         "edit_appointment": appointment
     })
 
 @app.post("/appointments/edit/{appointment_id}")
-async def edit_appointment(
+@query_budget(5)
+def edit_appointment(
     appointment_id: int,
     appointment_date: str = Form(...),
     appointment_time: str = Form(...),
     work_hours: float = Form(...),
-    status: str = Form(...)
+    status: str = Form(...),
+    db: Session = Depends(get_db)
 ):
-    db = SessionLocal()
-    crud.update_appointment(db, appointment_id, appointment_date, appointment_time, work_hours, status)
-    db.close()
+    save_appointment(crud.update_appointment, db, appointment_id, appointment_date, appointment_time, work_hours,
+                     status)
     return RedirectResponse(url="/appointments", status_code=303)
 
 @app.api_route("/appointments/delete/{appointment_id}", methods=["GET", "POST"])
-async def delete_appointment(appointment_id: int):
-    db = SessionLocal()
+@query_budget(4)
+def delete_appointment(appointment_id: int, db: Session = Depends(get_db)):
     crud.delete_appointment(db, appointment_id)
-    db.close()
     return RedirectResponse(url="/appointments", status_code=303)
 
 if __name__ == "__main__":
@@ -0,0 +1,268 @@
+# Benchmark for the report queries in queries.py and the crud read functions.
+#
+#   python bench_queries.py --database-url postgresql://.../bench --scales 1000 100000 --save-baseline
+#   python bench_queries.py --database-url postgresql://.../bench --scales 1000 100000
+#
+# For every scale the benchmark database is wiped, seeded by datagen.py with
+# that many users (and proportional caregivers, members, jobs, applications
+# and appointments) through bulk_load.py, and every benchmark is run --repeat
+# times after a warm-up. Functions that write (3.x updates, 4.x deletes) run inside a
+# transaction that is rolled back after each run, so every run sees the same
+# data. Results (p50/p95/max wall time, rows, statements issued) go to
+# --output, where rows is the size of the final result of a read (the last
+# table a report prints) or the rows affected by a write (rows_kind says
+# which), and the plan of each SELECT, from EXPLAIN (ANALYZE, BUFFERS) on
+# PostgreSQL or EXPLAIN QUERY PLAN on SQLite, is saved under --plans.
+#
+# With a baseline file, the run fails (exit status 1) if any benchmark's p50
+# is more than --threshold times its baseline p50 and at least --min-delta-ms
+# slower, or if a benchmark that ran in the baseline now fails; --save-baseline writes the current results as the new baseline.
+# The database given is dropped and recreated: never point this at real data.
+
+import argparse
+import contextlib
+import inspect
+import io
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+import crud
+import datagen
+import queries
+import schema
+import text_search
+
+def benchmarks():
+    # name -> function(session); queries.* print their results, crud reads return them
+    found = {}
+    for name, fn in inspect.getmembers(queries, inspect.isfunction):
+        if name.split("_")[0] in ("update", "delete", "query"):
+            found[f"queries.{name}"] = fn
+    for name, fn in inspect.getmembers(crud, inspect.isfunction):
+        if name.startswith("get_") and fn.__module__ == "crud":
+            params = list(inspect.signature(fn).parameters)[1:]
+            if params and params[0].endswith("_id"):
+                found[f"crud.{name}"] = lambda db, fn=fn: fn(db, 1)
+            else:
+                found[f"crud.{name}"] = fn
+    return dict(sorted(found.items()))
+
+
+def seed(engine, users, rng_seed=42, revision=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        datagen.seed_database(engine, datagen.Sizes(users), rng_seed)
+    if revision:
+        # Benchmark the schema as of an older migration, e.g. without an index pack
+        schema.downgrade(engine, revision)
+    if engine.dialect.name != "postgresql":
+        # Build the in-process text index now rather than in the background
+        # during the first timed run.
+        with Session(engine) as db:
+            text_search._index.load(db.execute(text_search._DOCUMENTS))
+
+
+# Summary tables the flush hooks keep up to date; their rows aren't what a write affected.
+BOOKKEEPING_TABLES = {"table_counters", "caregiver_monthly_rollups"}
+_WRITE_TARGET = re.compile(r'\s*(?:UPDATE|DELETE\s+FROM|INSERT\s+INTO)\s+"?(\w+)', re.IGNORECASE)
+
+
+class StatementLog:
+    # Records the statements of one benchmark run, the rows its writes
+    # affected, and the size of the last table a report printed.
+    def __init__(self, engine):
+        self.reset()
+        event.listen(engine, "after_cursor_execute", self._record)
+        self.engine = engine
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")):
+            return
+        self.statements.append((statement, parameters))
+        target = _WRITE_TARGET.match(statement)
+        if target and target.group(1).lower() not in BOOKKEEPING_TABLES and cursor.rowcount > 0:
+            self.affected += cursor.rowcount
+
+    def reset(self):
+        self.statements, self.affected, self.printed = [], 0, None
+
+    def close(self):
+        event.remove(self.engine, "after_cursor_execute", self._record)
+
+
+def run_once(engine, fn, log):
+    # Run fn in a transaction that is rolled back afterwards; commits inside
+    # fn only release a savepoint. The reports print their results instead of
+    # returning them, so print_results is wrapped to count the rows.
+    print_results = queries.print_results
+
+    def counting_print_results(headers, rows, message=""):
+        log.printed = len(rows)
+        print_results(headers, rows, message)
+
+    queries.print_results = counting_print_results
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            with Session(bind=conn, join_transaction_mode="create_savepoint") as db, \
+                    contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                result = fn(db)
+                elapsed = time.perf_counter() - start
+        finally:
+            transaction.rollback()
+            queries.print_results = print_results
+    return elapsed, result
+
+
+def explain(engine, statements):
+    plans = []
+    prefix = "EXPLAIN (ANALYZE, BUFFERS) " if engine.dialect.name == "postgresql" else "EXPLAIN QUERY PLAN "
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            for statement, parameters in statements:
+                if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                    continue
+                rows = conn.exec_driver_sql(prefix + statement, parameters).all()
+                plans.append(statement.strip() + "\n\n" + "\n".join(" | ".join(str(v) for v in row) for row in rows))
+        finally:
+            transaction.rollback()
+    return plans
+
+
+def _row_count(name, result, log):
+    # (rows, "affected" or "returned")
+    if name.startswith(("queries.update_", "queries.delete_")):
+        return log.affected, "affected"
+    if hasattr(result, "__len__"):
+        return len(result), "returned"
+    if result is not None:
+        return 1, "returned"
+    return log.printed, "returned"
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run_scale(engine, scale, repeat, warmup, plans_dir, only=None):
+    results = {}
+    log = StatementLog(engine)
+    try:
+        for name, fn in benchmarks().items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            samples, rows, rows_kind, statements, error = [], None, None, [], None
+            try:
+                for i in range(warmup + repeat):
+                    log.reset()
+                    elapsed, result = run_once(engine, fn, log)
+                    if i >= warmup:
+                        samples.append(elapsed * 1000)
+                rows, rows_kind = _row_count(name, result, log)
+                statements = list(log.statements)
+            except Exception as e:
+                error = str(e).splitlines()[0]
+            if error:
+                results[name] = {"error": error}
+                print(f"  {name:<55} ERROR {error}")
+                continue
+            results[name] = {
+                "p50_ms": round(statistics.median(samples), 3),
+                "p95_ms": round(percentile(samples, 95), 3),
+                "max_ms": round(max(samples), 3),
+                "rows": rows,
+                "rows_kind": rows_kind,
+                "statements": len(statements),
+            }
+            print(f"  {name:<55} p50 {results[name]['p50_ms']:>9.2f} ms  p95 {results[name]['p95_ms']:>9.2f} ms"
+                  f"  {rows_kind} {rows if rows is not None else '-':>8}  stmts {len(statements):>3}")
+            if plans_dir:
+                os.makedirs(os.path.join(plans_dir, str(scale)), exist_ok=True)
+                with open(os.path.join(plans_dir, str(scale), f"{name}.txt"), "w", encoding="utf-8") as f:
+                    f.write("\n\n----\n\n".join(explain(engine, statements)) or "(no SELECT statements)\n")
+    finally:
+        log.close()
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    regressions = []
+    for scale, benches in results.items():
+        for name, current in benches.items():
+            previous = baseline.get(scale, {}).get(name)
+            if not previous or "p50_ms" not in previous:
+                continue
+            if "error" in current:
+                # Ran in the baseline, fails now
+                regressions.append((scale, name, previous["p50_ms"], None))
+            elif (current["p50_ms"] > previous["p50_ms"] * threshold
+                    and current["p50_ms"] - previous["p50_ms"] >= min_delta_ms):
+                regressions.append((scale, name, previous["p50_ms"], current["p50_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark report queries and crud reads")
+    parser.add_argument("--database-url", required=True, help="scratch database; it is wiped for every scale")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000], help="number of users per run")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--only", nargs="+", help="only benchmarks whose name contains one of these")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--plans", default="bench_plans", help="folder for EXPLAIN output ('' to skip)")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=1.5, help="allowed p50 ratio to the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--revision", help="run against the schema of this migration instead of head")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    results = {}
+    for scale in args.scales:
+        print(f"Seeding {scale} users ({engine.dialect.name})...")
+        start = time.perf_counter()
+        seed(engine, scale, revision=args.revision)
+        print(f"Seeded in {time.perf_counter() - start:.1f}s")
+        results[str(scale)] = run_scale(engine, scale, args.repeat, args.warmup, args.plans, args.only)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    for scale, benches in results.items():
+        for name, current in benches.items():
+            previous = baseline.get(scale, {}).get(name, {})
+            if "p50_ms" in previous and "p50_ms" in current:
+                print(f"[{scale}] {name:<55} p50 {previous['p50_ms']:>9.2f} -> {current['p50_ms']:>9.2f} ms "
+                      f"(speedup {previous['p50_ms'] / max(current['p50_ms'], 0.001):.1f}x)")
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    for scale, name, before, after in regressions:
+        if after is None:
+            print(f"REGRESSION [{scale}] {name}: p50 {before:.2f} ms -> ERROR {results[scale][name]['error']}")
+        else:
+            print(f"REGRESSION [{scale}] {name}: p50 {before:.2f} ms -> {after:.2f} ms")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold}x the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Benchmark: indexed text search vs. the LIKE '%...%' scans it replaces.
+#
+#   python bench_text_search.py --database-url postgresql://.../bench --seed --jobs 1000000
+#
+# --seed fills an EMPTY database with synthetic members and jobs first. Then
+# each query is timed as the original LIKE filter and through
+# text_search.search returning every match (what the reports in queries.py
+# ask for, so the row counts are comparable), and the ranked top 20 the
+# search route returns.
+
+import argparse
+import random
+import statistics
+import time
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+from models import Base, User, Member, Job
+import text_search
+
+WORDS = ("patient experienced reliable caring gentle energetic punctual bilingual certified "
+         "friendly organised creative calm flexible mature honest cheerful attentive trained "
+         "cooking cleaning homework driving swimming music reading medication walks meals").split()
+PHRASES = ["soft-spoken", "first aid", "non-smoker", "own car", "night shifts", "speaks Kazakh"]
+HOUSE_RULES = ["No pets", "No smoking", "Shoes off indoors", "Quiet after 9pm", "No visitors", "Vegetarian kitchen"]
+CITIES = ["Astana", "Almaty", "Shymkent", "Karaganda", "Aktobe"]
+TYPES = ["Babysitter", "Caregiver", "Special Needs", "Tutor", "elderly_care"]
+
+QUERIES = [
+    ("jobs mentioning soft-spoken", "%soft-spoken%", '"soft-spoken"', {"field": "requirements"}),
+    ("jobs mentioning first aid", "%first aid%", '"first aid"', {"field": "requirements"}),
+    ("single word", "%bilingual%", "bilingual", {}),
+    ("No pets, elderly care, Astana", "%No pets%", '"No pets"',
+     {"field": "house_rules", "caregiving_type": "elderly_care", "city": "Astana"}),
+]
+
+
+def seed(engine, n_jobs, batch_size=10_000):
+    rng = random.Random(42)
+    n_members = max(1, n_jobs // 5)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for start in range(0, n_members, batch_size):
+            ids = range(start + 1, min(n_members, start + batch_size) + 1)
+            conn.execute(insert(User), [{
+                "user_id": i, "email": f"member{i}@example.kz", "given_name": f"Member{i}", "surname": "Bench",
+                "city": rng.choice(CITIES), "phone_number": "+77000000000", "password": "x",
+            } for i in ids])
+            conn.execute(insert(Member), [{
+                "member_id": i, "user_id": i,
+                "house_rules": ". ".join(rng.sample(HOUSE_RULES, 2)),
+            } for i in ids])
+        for start in range(0, n_jobs, batch_size):
+            rows = []
+            for i in range(start + 1, min(n_jobs, start + batch_size) + 1):
+                words = rng.sample(WORDS, rng.randint(6, 14))
+                if rng.random() < 0.1:
+                    words.insert(rng.randrange(len(words)), rng.choice(PHRASES))
+                rows.append({"job_id": i, "member_id": rng.randint(1, n_members),
+                             "required_caregiving_type": rng.choice(TYPES),
+                             "other_requirements": " ".join(words)})
+            conn.execute(insert(Job), rows)
+            print(f"  seeded {start + len(rows)}/{n_jobs} jobs", end="\r")
+    print()
+
+
+def like_scan(db, pattern, options):
+    column = Member.house_rules if options.get("field") == "house_rules" else Job.other_requirements
+    stmt = select(Job.job_id, Job.required_caregiving_type, column).join(Member).join(User) \
+        .where(column.like(pattern))
+    if options.get("caregiving_type"):
+        stmt = stmt.where(Job.required_caregiving_type == options["caregiving_type"])
+    if options.get("city"):
+        stmt = stmt.where(User.city == options["city"])
+    return db.execute(stmt).all()
+
+
+def timed(fn, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LIKE scans with indexed text search")
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--seed", action="store_true", help="populate an empty database first")
+    parser.add_argument("--jobs", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if args.seed:
+        seed(engine, args.jobs)
+
+    with Session(engine) as db:
+        n_jobs = db.execute(select(func.count()).select_from(Job)).scalar()
+        print(f"{n_jobs} jobs, backend {engine.dialect.name}")
+        if engine.dialect.name != "postgresql":
+            start = time.perf_counter()
+            text_search._index.load(db.execute(text_search._DOCUMENTS))
+            print(f"In-process index built in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'query':<32} {'LIKE ms':>10} {'rows':>8} {'search ms':>10} {'rows':>8} {'top 20 ms':>10}")
+        for name, pattern, query, options in QUERIES:
+            like_ms, like_rows = timed(lambda: like_scan(db, pattern, options), args.repeat)
+            all_ms, results = timed(lambda: text_search.search(db, query, limit=None, **options), args.repeat)
+            top_ms, _ = timed(lambda: text_search.search(db, query, **options), args.repeat)
+            print(f"{name:<32} {like_ms:>10.1f} {len(like_rows):>8} {all_ms:>10.1f} {len(results):>8} "
+                  f"{top_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
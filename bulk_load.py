@@ -0,0 +1,259 @@
+# Bulk loader for the tables in models.py.
+#
+#   python bulk_load.py data/ [--batch-size 50000] [--tables users caregivers] [--restart]
+#
+# The source directory holds one file per table, named after it: users.csv or
+# users.ndjson (.jsonl also works), or several parts loaded in name order:
+# users.00000.csv, users.00001.csv, ... CSV files need a header row naming the
+# columns; an empty CSV cell is loaded as NULL. Tables are loaded parent first,
+# in foreign key order, and files are streamed, never read whole.
+#
+# On PostgreSQL every batch goes through COPY; other backends use a batched
+# executemany. Each batch is committed together with its row in the
+# bulk_load_progress table, so a failed or interrupted load can simply be run
+# again and continues after the last committed batch (--restart starts over).
+# Appointments without starts_at/ends_at get them derived as the app does.
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+from sqlalchemy import (BigInteger, Column, DateTime, MetaData, String, Table, create_engine, delete, inspect, select,
+                        text)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from models import Base, Appointment
+import counters
+import rollups
+import schedule
+import schema
+
+DEFAULT_BATCH_SIZE = 10_000
+EXTENSIONS = (".csv", ".ndjson", ".jsonl")
+SKIPPED_TABLES = {"table_counters", "caregiver_monthly_rollups"}  # derived, rebuilt after loading
+
+_progress = Table(
+    "bulk_load_progress", MetaData(),
+    Column("source", String(255), primary_key=True),
+    Column("rows_loaded", BigInteger, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+
+def find_sources(directory, table_name):
+    # users.csv, or the parts users.00000.csv, users.00001.csv, ... in order
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(name)
+        if extension in EXTENSIONS and (stem == table_name or stem.rsplit(".", 1)[0] == table_name):
+            paths.append(os.path.join(directory, name))
+    return paths
+
+
+def read_records(path):
+    # Yields one dict per record.
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            for record in csv.DictReader(f):
+                yield {key: (value if value != "" else None) for key, value in record.items()}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _with_window(record):
+    if record.get("starts_at") is None and record.get("appointment_time") is not None:
+        starts_at, ends_at = schedule.appointment_window(record["appointment_date"], record["appointment_time"],
+                                                         float(record["work_hours"]))
+        record["starts_at"], record["ends_at"] = starts_at, ends_at
+    return record
+
+
+_DERIVED = {Appointment.__tablename__: (("starts_at", "ends_at"), _with_window)}
+
+
+def _converters(table, columns):
+    # executemany needs Python values for date/number columns; COPY parses text.
+    converters = []
+    for name in columns:
+        python_type = table.c[name].type.python_type
+        if python_type is datetime:
+            converters.append(lambda v: datetime.fromisoformat(v) if isinstance(v, str) else v)
+        elif python_type is date:
+            converters.append(lambda v: datetime.fromisoformat(v).date() if isinstance(v, str) else v)
+        elif python_type in (int, float):
+            converters.append(lambda v, t=python_type: t(v) if isinstance(v, str) else v)
+        else:
+            converters.append(None)
+    return converters
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _copy_batch(conn, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(v) for v in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY {table.name} ({", ".join(columns)}) FROM STDIN', buffer)
+    finally:
+        cursor.close()
+
+
+def _insert_batch(conn, table, columns, rows, converters):
+    conn.execute(table.insert(), [
+        {name: (convert(value) if convert and value is not None else value)
+         for name, convert, value in zip(columns, converters, row)}
+        for row in rows
+    ])
+
+
+def _save_progress(conn, source, rows_loaded):
+    values = {"source": source, "rows_loaded": rows_loaded, "updated_at": datetime.utcnow()}
+    if conn.dialect.name == "postgresql":
+        stmt = pg_insert(_progress).values(**values)
+        conn.execute(stmt.on_conflict_do_update(index_elements=["source"], set_=values))
+    elif conn.execute(_progress.update().where(_progress.c.source == source).values(**values)).rowcount == 0:
+        conn.execute(_progress.insert().values(**values))
+
+
+def load_table(engine, table, path, batch_size=DEFAULT_BATCH_SIZE):
+    source = f"{table.name}:{os.path.basename(path)}"
+    with engine.connect() as conn:
+        done = conn.execute(select(_progress.c.rows_loaded).where(_progress.c.source == source)).scalar() or 0
+    use_copy = engine.dialect.name == "postgresql"
+    derived, derive = _DERIVED.get(table.name, ((), None))
+
+    records = read_records(path)
+    first = next(records, None)
+    if first is None:
+        print(f"{table.name}: {path} is empty")
+        return 0
+    columns = list(first)
+    unknown = [name for name in columns if name not in table.c]
+    if unknown:
+        raise ValueError(f"{path}: unknown columns for {table.name}: {', '.join(unknown)}")
+    columns += [name for name in derived if name not in columns]
+    converters = _converters(table, columns)
+
+    def batches():
+        batch = []
+        for n, record in enumerate(_chain(first, records), start=1):
+            if n <= done:
+                continue
+            if derive:
+                try:
+                    record = derive(record)
+                except (KeyError, TypeError, ValueError) as e:
+                    raise ValueError(f"{path}, record {n}: {e}") from e
+            batch.append([record.get(name) for name in columns])
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    if done:
+        print(f"{table.name}: resuming after {done} rows")
+    loaded, started = done, time.perf_counter()
+    for batch in batches():
+        with engine.begin() as conn:
+            if use_copy:
+                _copy_batch(conn, table, columns, batch)
+            else:
+                _insert_batch(conn, table, columns, batch, converters)
+            loaded += len(batch)
+            _save_progress(conn, source, loaded)
+        rate = (loaded - done) / max(time.perf_counter() - started, 1e-9)
+        print(f"  {table.name}: {loaded} rows ({rate:,.0f} rows/s)", end="\r", flush=True)
+    print(f"{table.name}: {loaded} rows loaded in {time.perf_counter() - started:.1f}s" + " " * 20)
+    if use_copy:
+        _sync_sequence(engine, table)
+    return loaded - done
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def _sync_sequence(engine, table):
+    # COPY with explicit ids leaves SERIAL sequences behind; move them past max(id).
+    pk = list(table.primary_key.columns)
+    if len(pk) != 1 or not pk[0].autoincrement:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table.name}', '{pk[0].name}'), "
+                          f"GREATEST((SELECT max({pk[0].name}) FROM {table.name}), 1))"))
+
+
+def load(engine, directory, tables=None, batch_size=DEFAULT_BATCH_SIZE, restart=False):
+    # An empty database gets the whole schema from create_all and is stamped
+    # with the head revision; one that already has tables keeps its revision
+    # and is migrated with `alembic upgrade head`.
+    with engine.connect() as conn:
+        empty = not inspect(conn).get_table_names()
+    Base.metadata.create_all(engine)
+    if empty:
+        schema.stamp(engine)
+    _progress.create(engine, checkfirst=True)
+    if restart:
+        with engine.begin() as conn:
+            conn.execute(delete(_progress))
+
+    loaded = {}
+    for table in Base.metadata.sorted_tables:
+        if table.name in SKIPPED_TABLES or (tables and table.name not in tables):
+            continue
+        for path in find_sources(directory, table.name):
+            loaded[table.name] = loaded.get(table.name, 0) + load_table(engine, table, path, batch_size)
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load CSV/NDJSON files into the database")
+    parser.add_argument("directory", help="folder with <table>.csv or <table>.ndjson files")
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--tables", nargs="+", help="only load these tables")
+    parser.add_argument("--restart", action="store_true", help="forget earlier progress and load everything")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from db import engine
+
+    started = time.perf_counter()
+    try:
+        loaded = load(engine, args.directory, args.tables, args.batch_size, args.restart)
+    except Exception as e:
+        print(f"\nLoad failed: {e}")
+        print("Fix the problem and run the same command again to continue.")
+        sys.exit(1)
+    print(f"Loaded {sum(loaded.values())} rows in {time.perf_counter() - started:.1f}s")
+    refresh_derived(engine)
+
+
+def refresh_derived(engine):
+    # Row counters and report rollups aren't maintained by the raw inserts.
+    with Session(engine) as db:
+        counts = counters.reconcile(db)
+        print("Counters: " + ", ".join(f"{table}={count}" for table, count in counts.items()))
+        print(f"Rollups: {rollups.rebuild(db)} caregiver month rows")
+
+
+if __name__ == "__main__":
+    main()
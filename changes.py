@@ -0,0 +1,57 @@
+# Commit notifications for the in-process caches.
+#
+# Rows inserted, updated or deleted through an ORM session are collected at
+# flush time and handed to subscribers once the transaction commits, as
+# {table_name: {primary_key: {column: value}}}. The column snapshot is taken
+# from already-loaded state, so it costs no extra queries; for deletes it holds
+# the values the row had. Rolled-back work is discarded.
+#
+# Writes that bypass the ORM should call notify({table_name: None}) to signal
+# that any row of the table may have changed.
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+_subscribers = []
+
+
+def subscribe(callback):
+    _subscribers.append(callback)
+    return callback
+
+
+def notify(changed):
+    for callback in list(_subscribers):
+        try:
+            callback(changed)
+        except Exception as e:
+            print(f"Change subscriber {callback.__name__} failed: {e}")
+
+
+def _snapshot(state):
+    return {attr.key: state.dict[attr.key] for attr in state.mapper.column_attrs if attr.key in state.dict}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    pending = session.info.setdefault("changed_rows", {})
+    for objects, only_modified in ((session.new, False), (session.dirty, True), (session.deleted, False)):
+        for obj in objects:
+            if only_modified and not session.is_modified(obj, include_collections=False):
+                continue
+            state = inspect(obj)
+            pk = state.mapper.primary_key_from_instance(obj)
+            table = pending.setdefault(state.mapper.local_table.name, {})
+            table[pk[0] if len(pk) == 1 else tuple(pk)] = _snapshot(state)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch(session):
+    changed = session.info.pop("changed_rows", None)
+    if changed:
+        notify(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("changed_rows", None)
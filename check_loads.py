@@ -0,0 +1,130 @@
+# Checks every page and form route for lazy loads and query budgets.
+#
+#   python check_loads.py [--users 500]
+#
+# Seeds a scratch SQLite database with datagen.py, then requests each list
+# page, edit form, JSON route and create/edit/delete/batch POST once through the
+# test client with LOAD_GUARD=raise (see loadguard.py). Prints the statements
+# and lazy loads of every request against its route's budget and exits with
+# status 1 if any request lazy-loads, goes over budget or fails.
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+
+def requests_to_check(users):
+    # users: size of the data set; the user created here gets the next id
+    day = "2031-03-02"
+    return [
+        ("GET", "/", None),
+        ("GET", "/users", None),
+        ("GET", "/users?sort=city&order=desc", None),
+        ("GET", "/users/create", None),
+        ("GET", "/users/edit/2", None),
+        ("GET", "/caregivers", None),
+        ("GET", "/caregivers?sort=hourly_rate", None),
+        ("GET", "/caregivers/edit/2", None),
+        ("GET", "/members", None),
+        ("GET", "/members/edit/2", None),
+        ("GET", "/jobs", None),
+        ("GET", "/jobs/edit/2", None),
+        ("GET", "/appointments", None),
+        ("GET", "/appointments?sort=appointment_date&order=desc", None),
+        ("GET", "/appointments/edit/2", None),
+        ("GET", "/api/search/users?q=Ar", None),
+        ("GET", "/api/jobs/search?q=patient", None),
+        ("GET", "/api/jobs/2/matches", None),
+        ("GET", f"/caregivers/2/free-slots?start={day}&end=2031-03-09", None),
+        ("GET", "/export/jobs?format=ndjson", None),
+        ("GET", "/api/v1/users?include=caregiver,member,addresses", None),
+        ("GET", "/api/v1/appointments?status=confirmed&include=caregiver.user,member.user", None),
+        ("GET", "/api/v1/job_applications?sort=date_applied&include=job.member.user,caregiver", None),
+        ("GET", "/api/v1/caregivers/2?fields=hourly_rate&include=appointments,applications", None),
+        ("GET", "/metrics", None),
+        ("POST", "/users/create", {"email": "check@example.kz", "given_name": "Check", "surname": "Loads",
+                                   "city": "Astana", "phone_number": "+77010000000",
+                                   "profile_description": "-", "password": "x"}),
+        ("POST", "/caregivers/create", {"user_id": users + 1, "photo_url": "-", "gender": "Male",
+                                        "caregiving_type": "babysitter", "hourly_rate": 9.5}),
+        ("POST", "/members/create", {"user_id": users + 1, "house_rules": "No pets."}),
+        ("POST", "/users/edit/2", {"email": "edited@example.kz", "given_name": "Edited", "surname": "User",
+                                   "city": "Almaty", "phone_number": "+77010000000",
+                                   "profile_description": "-", "password": "x"}),
+        ("POST", "/caregivers/edit/2", {"photo_url": "-", "gender": "Female", "caregiving_type": "babysitter",
+                                        "hourly_rate": 12.5}),
+        ("POST", "/members/edit/2", {"house_rules": "No pets."}),
+        ("POST", "/jobs/create", {"member_id": 2, "required_caregiving_type": "babysitter",
+                                  "other_requirements": "Patient."}),
+        ("POST", "/jobs/edit/2", {"required_caregiving_type": "elderly_care", "other_requirements": "Calm."}),
+        ("POST", "/appointments/create", {"caregiver_id": 2, "member_id": 2, "appointment_date": day,
+                                          "appointment_time": "10:00", "work_hours": 2, "status": "confirmed"}),
+        ("POST", "/appointments/edit/2", {"appointment_date": day, "appointment_time": "14:00",
+                                          "work_hours": 1, "status": "confirmed"}),
+        ("POST", "/api/v1/appointments/batch", [
+            {"caregiver_id": c, "member_id": 2, "appointment_date": f"2031-03-{d:02}", "appointment_time": "08:00",
+             "work_hours": 2, "status": "confirmed"} for c in (2, 3, 4, users * 10) for d in (3, 4, 5)]),
+        ("POST", "/api/v1/jobs/batch", [{"member_id": m, "required_caregiving_type": "babysitter"}
+                                        for m in (2, 3, users * 10)]),
+        ("POST", "/api/v1/job_applications/batch", [{"caregiver_id": 2, "job_id": j} for j in (2, 3, 4)]),
+        ("POST", "/appointments/delete/3", None),
+        ("POST", "/jobs/delete/3", None),
+        ("POST", "/caregivers/delete/3", None),
+        ("POST", "/members/delete/3", None),
+        ("POST", "/users/delete/4", None),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check routes for lazy loads and query budgets")
+    parser.add_argument("--users", type=int, default=500, help="size of the generated data set")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'check_loads.db')}"
+    os.environ["LOAD_GUARD"] = "raise"
+    os.environ.setdefault("SLOW_QUERY_MS", "10000")
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    import contextlib
+    import io
+    import datagen
+    from db import engine
+    with contextlib.redirect_stdout(io.StringIO()):
+        datagen.seed_database(engine, datagen.Sizes(args.users))
+        from fastapi.testclient import TestClient
+        import app
+        import loadguard
+
+    failed = 0
+    with TestClient(app.app) as client:
+        print(f"{'request':<50} {'status':>6} {'queries':>7} {'budget':>6} {'lazy':>4}")
+        for method, path, data in requests_to_check(args.users):
+            try:
+                body = {"json": data} if isinstance(data, list) else {"data": data}
+                response = client.request(method, path, follow_redirects=False, **body)
+                status = response.status_code
+                error = None if status < 400 else response.text[:200]
+            except (loadguard.LazyLoadError, loadguard.QueryBudgetExceeded) as e:
+                status, error = "raised", str(e)
+            _, _, queries, lazy_loads, budget = loadguard.recent[-1] if loadguard.recent else (0,) * 5
+            print(f"{method + ' ' + path:<50} {status:>6} {queries:>7} {budget if budget is not None else '-':>6} "
+                  f"{lazy_loads:>4}")
+            if error:
+                failed += 1
+                print(f"  {error}")
+            elif budget is None:
+                failed += 1
+                print("  no @query_budget on this route")
+    engine.dispose()
+    shutil.rmtree(directory, ignore_errors=True)
+    if failed:
+        print(f"{failed} request(s) failed the check")
+        sys.exit(1)
+    print("All routes within budget, no lazy loads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Measures cold starts of the app against a startup budget.
+#
+#   python check_startup.py [--runs 5] [--budget 1.0] [--database-url URL]
+#
+# Starts the app in fresh Python processes, as a new uvicorn worker would:
+# import app.py, run its lifespan startup and serve a first request to /.
+# Prints import, startup and first-request times of each run and exits with
+# status 1 if the median time to the first response goes over the budget
+# (STARTUP_BUDGET_SECONDS, default 1.0). SCHEMA_CHECK is taken from the
+# environment ("require" adds the Alembic check to startup). Without
+# --database-url a scratch SQLite database migrated to head is used.
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = """
+import json, time
+from fastapi.testclient import TestClient
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+with TestClient(app.app) as client:
+    ready = time.perf_counter()
+    status = client.get("/").status_code
+    served = time.perf_counter()
+print(json.dumps({"import": imported - started, "startup": ready - imported, "first_request": served - ready,
+                  "total": served - started, "status": status}))
+"""
+
+
+def cold_start(env):
+    launched = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"app failed to start:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - launched
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold starts of the app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_SECONDS", 1.0)),
+                        help="seconds from import to first response (median)")
+    parser.add_argument("--database-url", help="database to start against (default: scratch SQLite)")
+    args = parser.parse_args()
+
+    directory = None
+    url = args.database_url
+    if url is None:
+        directory = tempfile.mkdtemp()
+        url = f"sqlite:///{os.path.join(directory, 'check_startup.db')}"
+        from sqlalchemy import create_engine
+        import schema
+        engine = create_engine(url)
+        schema.upgrade(engine)
+        engine.dispose()
+    env = dict(os.environ, DATABASE_URL=url)
+
+    runs = []
+    try:
+        cold_start(env)  # warm the OS file cache, as on a host that already ran the image
+        print(f"{'run':>3} {'import':>8} {'startup':>8} {'request':>8} {'total':>8} {'process':>8}")
+        for run in range(1, args.runs + 1):
+            t = cold_start(env)
+            runs.append(t)
+            print(f"{run:>3} {t['import']:>8.3f} {t['startup']:>8.3f} {t['first_request']:>8.3f} "
+                  f"{t['total']:>8.3f} {t['process']:>8.3f}" + ("" if t["status"] == 200 else f"  HTTP {t['status']}"))
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    median = statistics.median(t["total"] for t in runs)
+    print(f"Median time to first response {median:.3f}s (budget {args.budget:g}s; "
+          f"process incl. interpreter {statistics.median(t['process'] for t in runs):.3f}s)")
+    if median > args.budget or any(t["status"] != 200 for t in runs):
+        print("Startup budget exceeded" if median > args.budget else "First request failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
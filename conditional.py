@@ -0,0 +1,83 @@
+# Conditional GETs (ETag / Last-Modified) for the list and edit pages.
+#
+# A page's ETag is a hash of its URL and the versions of the tables it shows
+# (table_versions.py), and Last-Modified is when the newest of those tables
+# last changed. Both are known before the handler runs, so the route
+# dependency answers a request whose If-None-Match (or, without one,
+# If-Modified-Since) still matches with 304 Not Modified: no database
+# session, no query, no rendering. ETags include a per-process id because the
+# version counters are per process; with several workers a poll that lands on
+# another worker simply gets a fresh 200.
+#
+# Last-Modified has whole-second precision, so it is rounded up from the
+# newest change (but never later than now), and If-Modified-Since only
+# matches if every change happened before that second: a second write within
+# the same second as the one a client saw can't get a stale 304.
+#
+# Pages are sent with Cache-Control: no-cache, so browsers revalidate them on
+# every view instead of guessing a freshness lifetime from Last-Modified.
+
+import hashlib
+import math
+import secrets
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Depends, HTTPException, Request
+import table_versions
+
+_PROCESS = secrets.token_hex(4)
+
+
+def validators(request, tables):
+    versions = table_versions.current(tables)
+    key = f"{_PROCESS}:{request.url.path}?{request.url.query}:{versions}"
+    etag = '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+    return etag, table_versions.last_modified(tables)
+
+
+def _not_modified(headers, etag, modified):
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as RFC 9110 specifies for If-None-Match
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return modified < parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_get(*tables):
+    # Route dependency: dependencies=[conditional_get("users", ...)]
+    def check(request: Request):
+        etag, modified = validators(request, tables)
+        last_modified = min(math.ceil(modified), int(time.time()))
+        headers = {"ETag": etag, "Last-Modified": formatdate(last_modified, usegmt=True),
+                   "Cache-Control": "no-cache"}
+        if _not_modified(request.headers, etag, modified):
+            raise HTTPException(status_code=304, headers=headers)
+        request.state.validators = headers
+    return Depends(check)
+
+
+class ValidatorsMiddleware:
+    # Adds the headers computed by conditional_get() to the page's 200 response.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+
+        async def send_with_validators(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = scope.get("state", {}).get("validators")
+                if headers:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (name.lower().encode(), value.encode()) for name, value in headers.items()]
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
@@ -0,0 +1,98 @@
+# Row counts for the dashboard, kept in the table_counters summary table.
+#
+# Every ORM flush adjusts the counters for the rows it inserted or deleted, in
+# the same transaction, so the dashboard reads five small rows instead of
+# running COUNT(*) over each table. Writes that bypass the ORM either call
+# add() in their transaction (crud.py's batch creates) or, like bulk
+# query.delete(), raw SQL and imports, are corrected by reconcile().
+
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+from models import User, Caregiver, Member, Job, Appointment, TableCounter
+
+COUNTED_TABLES = {model.__tablename__: model for model in (User, Caregiver, Member, Job, Appointment)}
+_TABLE_OF = {model: table for table, model in COUNTED_TABLES.items()}
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_deltas(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        table = _TABLE_OF.get(type(obj))
+        if table:
+            deltas[table] += 1
+    for obj in session.deleted:
+        table = _TABLE_OF.get(type(obj))
+        if table:
+            deltas[table] -= 1
+
+    add(session.connection(), deltas)
+
+
+def add(connection, deltas):
+    # deltas: {table_name: rows inserted minus rows deleted}
+    for table, delta in deltas.items():
+        if delta:
+            connection.execute(
+                update(TableCounter.__table__)
+                .where(TableCounter.table_name == table)
+                .values(row_count=TableCounter.row_count + delta)
+            )
+
+
+def get_counts(db: Session):
+    counts = dict(db.execute(select(TableCounter.table_name, TableCounter.row_count)).all())
+    missing = [table for table in COUNTED_TABLES if table not in counts]
+    if missing:
+        counts.update(reconcile(db, missing))
+    return counts
+
+
+def reconcile(db: Session, tables=None):
+    # Locking the counter row first makes concurrent writers wait for us, so
+    # an increment can neither be lost nor counted twice.
+    counts = {}
+    for table in tables or COUNTED_TABLES:
+        counter = db.query(TableCounter).filter(TableCounter.table_name == table).with_for_update().first()
+        true_count = db.query(func.count()).select_from(COUNTED_TABLES[table]).scalar()
+        if counter is None:
+            counter = TableCounter(table_name=table)
+            db.add(counter)
+        counter.row_count = true_count
+        counter.reconciled_at = datetime.utcnow()
+        counts[table] = true_count
+    db.commit()
+    return counts
+
+
+def start_reconciler(session_factory, interval_seconds):
+    # Background thread that periodically resets the counters to true counts.
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            db = session_factory()
+            try:
+                reconcile(db)
+            except Exception as e:
+                print(f"Counter reconciliation failed: {e}")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=run, name="counter-reconciler", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    from db import get_session, close_session
+
+    session = get_session()
+    try:
+        for table, count in reconcile(session).items():
+            print(f"{table}: {count}")
+    finally:
+        close_session(session)
@@ -1,13 +1,58 @@
-from sqlalchemy.orm import Session, joinedload
-from models import User, Caregiver, Member, Job, Appointment
+from datetime import date
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
+from models import User, Caregiver, Member, Job, Appointment, JobApplication
+from pagination import DEFAULT_PAGE_SIZE, paginate, resolve_sort
+import counters  # registers the flush hook that keeps dashboard counts current
+import options_cache  # subscribes dropdown caches to committed writes
+import rollups  # registers the flush hook that maintains the report rollups
+import changes
+import schedule
+
+# Columns the list pages may be sorted by. Each one is paired with the primary
+# key for keyset pagination, so it should be NOT NULL and ideally indexed.
+USER_SORTS = {"id": User.user_id, "surname": User.surname, "email": User.email, "city": User.city}
+CAREGIVER_SORTS = {"id": Caregiver.caregiver_id, "caregiving_type": Caregiver.caregiving_type,
+                   "hourly_rate": Caregiver.hourly_rate}
+MEMBER_SORTS = {"id": Member.member_id}
+JOB_SORTS = {"id": Job.job_id, "required_caregiving_type": Job.required_caregiving_type}
+APPOINTMENT_SORTS = {"id": Appointment.appointment_id, "appointment_date": Appointment.appointment_date,
+                     "status": Appointment.status}
+
+# Eager loading for each read, matching what its templates show: list rows and
+# edit forms print the names of the linked users, so those are joined in.
+# Anything else a template touches is a lazy load per row (see loadguard.py).
+USER_LOADS = ()
+CAREGIVER_LOADS = (joinedload(Caregiver.user),)
+MEMBER_LOADS = (joinedload(Member.user),)
+JOB_LOADS = (joinedload(Job.member).joinedload(Member.user),)
+APPOINTMENT_LOADS = (joinedload(Appointment.caregiver).joinedload(Caregiver.user),
+                     joinedload(Appointment.member).joinedload(Member.user))
+
+# Deleting a row cascades through the ORM (counters, rollups and the caches
+# see every deleted child), which needs its child rows loaded: one SELECT per
+# relationship level instead of one per parent.
+CAREGIVER_DELETE_LOADS = (selectinload(Caregiver.appointments), selectinload(Caregiver.job_applications))
+JOB_DELETE_LOADS = (selectinload(Job.applications),)
+MEMBER_DELETE_LOADS = (selectinload(Member.appointments),
+                       selectinload(Member.jobs).selectinload(Job.applications))
+USER_DELETE_LOADS = (selectinload(User.addresses),
+                     *(selectinload(User.caregiver).options(o) for o in CAREGIVER_DELETE_LOADS),
+                     *(selectinload(User.member).options(o) for o in MEMBER_DELETE_LOADS))
 
 # USER CRUD
 
 def get_users(db: Session):
-    return db.query(User).all()
+    return db.query(User).options(*USER_LOADS).all()
+
+def get_users_page(db: Session, sort: str = "id", order: str = "asc", after: str = None,
+                   before: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    return paginate(db.query(User).options(*USER_LOADS), resolve_sort(USER_SORTS, sort), User.user_id,
+                    after, before, limit, order == "desc", sort)
 
 def get_user(db: Session, user_id: int):
-    return db.query(User).filter(User.user_id == user_id).first()
+    return db.query(User).options(*USER_LOADS).filter(User.user_id == user_id).first()
 
 def create_user(db: Session, email: str, given_name: str, surname: str, city: str,
                 phone_number: str, profile_description: str, password: str):
@@ -41,7 +86,7 @@ def update_user(db: Session, user_id: int, email: str, given_name: str, surname:
     return user
 
 def delete_user(db: Session, user_id: int):
-    user = db.query(User).filter(User.user_id == user_id).first()
+    user = db.query(User).options(*USER_DELETE_LOADS).filter(User.user_id == user_id).first()
     if user:
         db.delete(user)
         db.commit()
@@ -50,10 +95,16 @@ def delete_user(db: Session, user_id: int):
 # CAREGIVER CRUD
 
 def get_caregivers(db: Session):
-    return db.query(Caregiver).options(joinedload(Caregiver.user)).all()
+    return db.query(Caregiver).options(*CAREGIVER_LOADS).all()
+
+def get_caregivers_page(db: Session, sort: str = "id", order: str = "asc", after: str = None,
+                        before: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    query = db.query(Caregiver).options(*CAREGIVER_LOADS)
+    return paginate(query, resolve_sort(CAREGIVER_SORTS, sort), Caregiver.caregiver_id,
+                    after, before, limit, order == "desc", sort)
 
 def get_caregiver(db: Session, caregiver_id: int):
-    return db.query(Caregiver).options(joinedload(Caregiver.user)).filter(Caregiver.caregiver_id == caregiver_id).first()
+    return db.query(Caregiver).options(*CAREGIVER_LOADS).filter(Caregiver.caregiver_id == caregiver_id).first()
 
 def create_caregiver(db: Session, user_id: int, photo_url: str, gender: str,
                      caregiving_type: str, hourly_rate: float):
@@ -82,7 +133,7 @@ def update_caregiver(db: Session, caregiver_id: int, photo_url: str, gender: str
     return caregiver
 
 def delete_caregiver(db: Session, caregiver_id: int):
-    caregiver = db.query(Caregiver).filter(Caregiver.caregiver_id == caregiver_id).first()
+    caregiver = db.query(Caregiver).options(*CAREGIVER_DELETE_LOADS).filter(Caregiver.caregiver_id == caregiver_id).first()
     if caregiver:
         db.delete(caregiver)
         db.commit()
@@ -91,10 +142,16 @@ def delete_caregiver(db: Session, caregiver_id: int):
 # MEMBER CRUD
 
 def get_members(db: Session):
-    return db.query(Member).options(joinedload(Member.user)).all()
+    return db.query(Member).options(*MEMBER_LOADS).all()
+
+def get_members_page(db: Session, sort: str = "id", order: str = "asc", after: str = None,
+                     before: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    query = db.query(Member).options(*MEMBER_LOADS)
+    return paginate(query, resolve_sort(MEMBER_SORTS, sort), Member.member_id,
+                    after, before, limit, order == "desc", sort)
 
 def get_member(db: Session, member_id: int):
-    return db.query(Member).options(joinedload(Member.user)).filter(Member.member_id == member_id).first()
+    return db.query(Member).options(*MEMBER_LOADS).filter(Member.member_id == member_id).first()
 
 def create_member(db: Session, user_id: int, house_rules: str):
     member = Member(
@@ -115,7 +172,7 @@ def update_member(db: Session, member_id: int, house_rules: str):
     return member
 
 def delete_member(db: Session, member_id: int):
-    member = db.query(Member).filter(Member.member_id == member_id).first()
+    member = db.query(Member).options(*MEMBER_DELETE_LOADS).filter(Member.member_id == member_id).first()
     if member:
         db.delete(member)
         db.commit()
@@ -124,10 +181,16 @@ def delete_member(db: Session, member_id: int):
 # JOB CRUD
 
 def get_jobs(db: Session):
-    return db.query(Job).options(joinedload(Job.member).joinedload(Member.user)).all()
+    return db.query(Job).options(*JOB_LOADS).all()
+
+def get_jobs_page(db: Session, sort: str = "id", order: str = "asc", after: str = None,
+                  before: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    query = db.query(Job).options(*JOB_LOADS)
+    return paginate(query, resolve_sort(JOB_SORTS, sort), Job.job_id,
+                    after, before, limit, order == "desc", sort)
 
 def get_job(db: Session, job_id: int):
-    return db.query(Job).filter(Job.job_id == job_id).first()
+    return db.query(Job).options(*JOB_LOADS).filter(Job.job_id == job_id).first()
 
 def create_job(db: Session, member_id: int, required_caregiving_type: str, other_requirements: str):
     job = Job(
@@ -150,7 +213,7 @@ def update_job(db: Session, job_id: int, required_caregiving_type: str, other_re
     return job
 
 def delete_job(db: Session, job_id: int):
-    job = db.query(Job).filter(Job.job_id == job_id).first()
+    job = db.query(Job).options(*JOB_DELETE_LOADS).filter(Job.job_id == job_id).first()
     if job:
         db.delete(job)
         db.commit()
@@ -159,29 +222,38 @@ def delete_job(db: Session, job_id: int):
 # APPOINTMENT CRUD
 
 def get_appointments(db: Session):
-    return db.query(Appointment).options(
-        joinedload(Appointment.caregiver).joinedload(Caregiver.user),
-        joinedload(Appointment.member).joinedload(Member.user)
-    ).all()
+    return db.query(Appointment).options(*APPOINTMENT_LOADS).all()
+
+def get_appointments_page(db: Session, sort: str = "id", order: str = "asc", after: str = None,
+                          before: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    query = db.query(Appointment).options(*APPOINTMENT_LOADS)
+    return paginate(query, resolve_sort(APPOINTMENT_SORTS, sort), Appointment.appointment_id,
+                    after, before, limit, order == "desc", sort)
 
 def get_appointment(db: Session, appointment_id: int):
-    return db.query(Appointment).filter(Appointment.appointment_id == appointment_id).first()
+    return db.query(Appointment).options(*APPOINTMENT_LOADS).filter(Appointment.appointment_id == appointment_id).first()
 
 def create_appointment(db: Session, caregiver_id: int, member_id: int, 
                        appointment_date: str, appointment_time: str, 
                        work_hours: float, status: str):
     from datetime import datetime
+    starts_at, ends_at = schedule.appointment_window(appointment_date, appointment_time, work_hours)
     appointment = Appointment(
         caregiver_id=caregiver_id,
         member_id=member_id,
         appointment_date=datetime.strptime(appointment_date, '%Y-%m-%d').date(),
         appointment_time=appointment_time,
         work_hours=work_hours,
-        status=status
+        status=status,
+        starts_at=starts_at,
+        ends_at=ends_at
     )
-    db.add(appointment)
-    db.commit()
-    db.refresh(appointment)
+    with schedule.booking(db, caregiver_id, starts_at, ends_at, status):
+        db.add(appointment)
+        db.commit()
+    # No refresh: the commit expired the instance, so it reloads when read.
+    # Refreshing here would fail with a 500 if the row was deleted right after
+    # the commit.
     return appointment
 
 def update_appointment(db: Session, appointment_id: int, appointment_date: str, 
@@ -189,12 +261,15 @@ def update_appointment(db: Session, appointment_id: int, appointment_date: str,
     from datetime import datetime
     appointment = db.query(Appointment).filter(Appointment.appointment_id == appointment_id).first()
     if appointment:
-        appointment.appointment_date = datetime.strptime(appointment_date, '%Y-%m-%d').date()
-        appointment.appointment_time = appointment_time
-        appointment.work_hours = work_hours
-        appointment.status = status
-        db.commit()
-        db.refresh(appointment)
+        starts_at, ends_at = schedule.appointment_window(appointment_date, appointment_time, work_hours)
+        with schedule.booking(db, appointment.caregiver_id, starts_at, ends_at, status, appointment_id):
+            appointment.appointment_date = datetime.strptime(appointment_date, '%Y-%m-%d').date()
+            appointment.appointment_time = appointment_time
+            appointment.work_hours = work_hours
+            appointment.status = status
+            appointment.starts_at = starts_at
+            appointment.ends_at = ends_at
+            db.commit()
     return appointment
 
 def delete_appointment(db: Session, appointment_id: int):
@@ -202,4 +277,155 @@ def delete_appointment(db: Session, appointment_id: int):
     if appointment:
         db.delete(appointment)
         db.commit()
-    return appointment
\ No newline at end of file
+    return appointment
+
+# BATCH CREATE
+#
+# create_*_batch write many rows in one transaction. Every row is checked on
+# its own (its values, then the ids it references, with one IN query per
+# referenced table for the whole batch), and the rows that pass go in with a
+# multi-row INSERT ... RETURNING. The result has one entry per input row, in
+# order: {"index": i, "id": new_id} or {"index": i, "error": message}; a row
+# that fails a check never stops the others. The INSERT bypasses the ORM flush, so the
+# dashboard counters, the report rollups and the commit notifications
+# (changes.py) are written here, in the same transaction.
+
+def _value(row, name, kind, required=True):
+    value = row.get(name)
+    if value is None:
+        if required:
+            raise ValueError(f"{name} is required")
+        return None
+    try:
+        if kind is str:
+            if not isinstance(value, str):
+                raise TypeError
+            return value
+        if kind is date:
+            return date.fromisoformat(value)
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise TypeError
+        if kind is int and isinstance(value, float) and not value.is_integer():
+            raise ValueError
+        return kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r}")
+
+def _parse_rows(rows, fields, parse, results):
+    # index -> column values of the rows that parse; the others get their error
+    values = {}
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("Expected an object")
+            unknown = sorted(set(row) - set(fields))
+            if unknown:
+                raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+            values[index] = parse(row)
+        except ValueError as e:
+            results[index] = {"index": index, "error": str(e)}
+    return values
+
+def _check_references(db: Session, values, references, results):
+    # references: (column name, referenced primary key column) pairs
+    for name, column in references:
+        ids = {row[name] for row in values.values()}
+        if not ids:
+            return
+        existing = set(db.execute(select(column).where(column.in_(ids))).scalars())
+        for index, row in list(values.items()):
+            if row[name] not in existing:
+                results[index] = {"index": index, "error": f"{name} {row[name]} does not exist"}
+                del values[index]
+
+def _insert_rows(db: Session, model, values, results):
+    # One INSERT ... RETURNING for all the rows, in the order of their
+    # parameters, then the counters, rollups and commit. SQLAlchemy batches
+    # it on PostgreSQL; SQLite can't order RETURNING rows, so there it sends
+    # one INSERT per row, still in the one transaction. The rows were checked
+    # above; if the database still rejects one (a parent row or an overlapping
+    # booking written concurrently), the whole batch is rolled back and every
+    # row reported as not saved.
+    if not values:
+        return
+    table = model.__table__
+    pk = model.__mapper__.primary_key[0].key
+    indexes = sorted(values)
+    try:
+        inserted = [dict(r._mapping) for r in db.execute(
+            insert(table).returning(*table.c, sort_by_parameter_order=True), [values[i] for i in indexes])]
+        if table.name in counters.COUNTED_TABLES:
+            counters.add(db.connection(), {table.name: len(inserted)})
+        if model is Appointment:
+            rollups.add_inserted(db.connection(), inserted)
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if schedule.OVERLAP_CONSTRAINT in str(e.orig):
+            schedule.invalidate(*{values[i]["caregiver_id"] for i in indexes})
+            message = "Not saved: an appointment in the batch overlaps one booked concurrently"
+        else:
+            message = f"Not saved: the database rejected the batch ({e.orig})"
+        for index in indexes:
+            results[index] = {"index": index, "error": message}
+        return
+    for index, row in zip(indexes, inserted):
+        results[index] = {"index": index, "id": row[pk]}
+    changes.notify({table.name: {row[pk]: row for row in inserted}})
+
+APPOINTMENT_BATCH_FIELDS = ("caregiver_id", "member_id", "appointment_date", "appointment_time", "work_hours",
+                            "status")
+JOB_BATCH_FIELDS = ("member_id", "required_caregiving_type", "other_requirements")
+APPLICATION_BATCH_FIELDS = ("caregiver_id", "job_id", "status", "cover_letter")
+
+def _appointment_values(row):
+    values = {
+        "caregiver_id": _value(row, "caregiver_id", int),
+        "member_id": _value(row, "member_id", int),
+        "appointment_date": _value(row, "appointment_date", date),
+        "appointment_time": _value(row, "appointment_time", str),
+        "work_hours": _value(row, "work_hours", float),
+        "status": _value(row, "status", str),
+    }
+    values["starts_at"], values["ends_at"] = schedule.appointment_window(
+        values["appointment_date"], values["appointment_time"], values["work_hours"])
+    return values
+
+def create_appointments_batch(db: Session, rows: list):
+    results = [None] * len(rows)
+    values = _parse_rows(rows, APPOINTMENT_BATCH_FIELDS, _appointment_values, results)
+    _check_references(db, values, (("caregiver_id", Caregiver.caregiver_id), ("member_id", Member.member_id)),
+                      results)
+    indexes = sorted(values)
+    bookings = [(values[i]["caregiver_id"], values[i]["starts_at"], values[i]["ends_at"], values[i]["status"])
+                for i in indexes]
+    with schedule.batch_booking(db, bookings) as conflicts:
+        for index, conflict in zip(indexes, conflicts):
+            if conflict is not None:
+                results[index] = {"index": index, "error": str(conflict)}
+                del values[index]
+        _insert_rows(db, Appointment, values, results)
+    return results
+
+def create_jobs_batch(db: Session, rows: list):
+    results = [None] * len(rows)
+    values = _parse_rows(rows, JOB_BATCH_FIELDS, lambda row: {
+        "member_id": _value(row, "member_id", int),
+        "required_caregiving_type": _value(row, "required_caregiving_type", str),
+        "other_requirements": _value(row, "other_requirements", str, required=False),
+    }, results)
+    _check_references(db, values, (("member_id", Member.member_id),), results)
+    _insert_rows(db, Job, values, results)
+    return results
+
+def create_applications_batch(db: Session, rows: list):
+    results = [None] * len(rows)
+    values = _parse_rows(rows, APPLICATION_BATCH_FIELDS, lambda row: {
+        "caregiver_id": _value(row, "caregiver_id", int),
+        "job_id": _value(row, "job_id", int),
+        "status": _value(row, "status", str, required=False) or "pending",
+        "cover_letter": _value(row, "cover_letter", str, required=False),
+    }, results)
+    _check_references(db, values, (("caregiver_id", Caregiver.caregiver_id), ("job_id", Job.job_id)), results)
+    _insert_rows(db, JobApplication, values, results)
+    return results
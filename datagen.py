@@ -0,0 +1,273 @@
+# Synthetic data generator for benchmark and load-test databases.
+#
+#   python datagen.py data/ --users 1000000 --workers 8
+#   python datagen.py data/ --users 1000000 --load --database-url postgresql://.../bench
+#
+# Writes CSV parts for every table (users.00000.csv, ...) that bulk_load.py
+# loads, and with --load loads them straight away. The output depends only on
+# --seed and the size options: every part is generated from its own random
+# stream, so any number of worker processes produce identical files.
+#
+# Sizes follow from --users: 40% caregivers and 60% members, 1.3 addresses and
+# 1.5 jobs per member, --applications-per-job and --appointments-per-caregiver
+# on average (so --users 1000000 is about 12M rows in total). Cities, caregiving
+# types, rates and activity are skewed: a few cities and types dominate and
+# some caregivers get far more applications and appointments than others.
+# Appointment status follows the date (past ones are mostly completed), and a
+# caregiver's appointments never overlap. User 1 is Arman Armanov and the first
+# member is Amina Aminova, as the reports in queries.py expect.
+
+import argparse
+import csv
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+PART_SIZE = 20_000  # users, members, jobs or caregivers per part file
+
+GIVEN_NAMES = ["Arman", "Amina", "Aruzhan", "Dias", "Aigerim", "Nursultan", "Dana", "Yerlan", "Madina", "Timur",
+               "Asel", "Daniyar", "Kamila", "Alikhan", "Zarina", "Askar", "Aliya", "Bauyrzhan", "Saule", "Miras",
+               "Togzhan", "Sanzhar", "Ainur", "Olzhas", "Diana", "Ruslan", "Elena", "Sergey", "Anna", "Dmitry"]
+SURNAMES = ["Armanov", "Aminova", "Nurlanov", "Sadykova", "Bekov", "Zhaksylykova", "Omarov", "Kim", "Ivanova",
+            "Abenov", "Tulegenova", "Serikov", "Kassymova", "Akhmetov", "Baimukhanova", "Petrov", "Yessenova",
+            "Mukhamedov", "Karimova", "Utepov"]
+# (value, weight): skewed towards the first entries
+CITIES = [("Astana", 34), ("Almaty", 30), ("Shymkent", 11), ("Karaganda", 7), ("Aktobe", 5), ("Pavlodar", 4),
+          ("Oskemen", 3), ("Atyrau", 3), ("Kostanay", 2), ("Taraz", 1)]
+CAREGIVING_TYPES = [("babysitter", 45), ("elderly_care", 30), ("Caregiver", 15), ("Special Needs", 6), ("Tutor", 4)]
+STREETS = ["Kabanbay Batyr", "Turan", "Abay", "Dostyk", "Mangilik El", "Respublika", "Kenesary", "Satpayev",
+           "Tole Bi", "Al-Farabi"]
+REQUIREMENT_WORDS = ("patient experienced reliable caring gentle energetic punctual bilingual certified friendly "
+                     "organised creative calm flexible mature honest cheerful attentive").split()
+REQUIREMENT_PHRASES = ["soft-spoken", "first aid", "non-smoker", "own car", "night shifts", "speaks Kazakh"]
+HOUSE_RULES = ["No pets.", "No smoking.", "Shoes off indoors.", "Quiet after 9pm.", "No visitors.",
+               "Vegetarian kitchen.", "Screen time limited to 1 hour."]
+APPLICATION_STATUSES = [("pending", 55), ("rejected", 30), ("accepted", 15)]
+PAST_STATUSES = [("completed", 80), ("cancelled", 12), ("confirmed", 8)]
+FUTURE_STATUSES = [("confirmed", 55), ("pending", 35), ("cancelled", 10)]
+
+TODAY = date(2025, 11, 1)  # fixed, so output doesn't depend on when it runs
+HISTORY_DAYS = 730
+
+
+class Sizes:
+    def __init__(self, users, applications_per_job=4.0, appointments_per_caregiver=15.0):
+        self.users = users
+        self.caregivers = max(1, users * 2 // 5)
+        self.members = max(1, users - self.caregivers)
+        self.jobs = self.members * 3 // 2
+        self.applications_per_job = applications_per_job
+        self.appointments_per_caregiver = appointments_per_caregiver
+
+    def member_user_id(self, member_id):
+        return self.caregivers + member_id
+
+
+def _weighted(choices):
+    values = [v for v, _ in choices]
+    cumulative, total = [], 0
+    for _, weight in choices:
+        total += weight
+        cumulative.append(total)
+    return values, cumulative
+
+
+_CITIES = _weighted(CITIES)
+_TYPES = _weighted(CAREGIVING_TYPES)
+_APPLICATION_STATUSES = _weighted(APPLICATION_STATUSES)
+_PAST_STATUSES = _weighted(PAST_STATUSES)
+_FUTURE_STATUSES = _weighted(FUTURE_STATUSES)
+
+
+def _pick(rng, weighted):
+    values, cumulative = weighted
+    return rng.choices(values, cum_weights=cumulative)[0]
+
+
+def _skewed_id(rng, n, skew=2.0):
+    # 1..n with low ids much more likely (a few very active caregivers/members)
+    return min(n, int(n * rng.random() ** skew) + 1)
+
+
+def _activity(rng, mean):
+    # Heavy-tailed count with the given mean (Pareto, alpha 2)
+    return int(mean / 2 * (1 / math.sqrt(1 - rng.random())))
+
+
+def _rng(seed, table, part):
+    return random.Random(f"{seed}:{table}:{part}")
+
+
+def gen_users(rng, sizes, first, last):
+    for user_id in range(first, last):
+        if user_id == 1:
+            given, surname = "Arman", "Armanov"
+        elif user_id == sizes.member_user_id(1):
+            given, surname = "Amina", "Aminova"
+        else:
+            given, surname = rng.choice(GIVEN_NAMES), rng.choice(SURNAMES)
+        yield (user_id, f"{given}.{surname}{user_id}@example.kz".lower(), given, surname, _pick(rng, _CITIES),
+               f"+7{rng.randint(7000000000, 7779999999)}", f"Hello, I am {given}.", "password")
+
+
+def gen_caregivers(rng, sizes, first, last):
+    for caregiver_id in range(first, last):
+        caregiving_type = _pick(rng, _TYPES)
+        rate = round(min(60.0, rng.lognormvariate(2.3, 0.4)), 2)  # median about 10
+        yield (caregiver_id, caregiver_id, f"https://example.kz/photos/{caregiver_id}.jpg",
+               rng.choice(["Female", "Female", "Female", "Male"]), caregiving_type, rate)
+
+
+def gen_members(rng, sizes, first, last):
+    for member_id in range(first, last):
+        rules = " ".join(rng.sample(HOUSE_RULES, rng.randint(1, 3)))
+        yield member_id, sizes.member_user_id(member_id), rules
+
+
+def gen_addresses(rng, sizes, first, last):
+    # Parts are by member; address ids are 2 per member so they stay unique.
+    for member_id in range(first, last):
+        for n in range(2 if rng.random() < 0.3 else 1):
+            yield (2 * member_id - 1 + n, sizes.member_user_id(member_id),
+                   f"{rng.choice(STREETS)} {rng.randint(1, 120)}", _pick(rng, _CITIES), None,
+                   f"{rng.randint(10000, 99999)}", "Kazakhstan")
+
+
+def gen_jobs(rng, sizes, first, last):
+    for job_id in range(first, last):
+        words = rng.sample(REQUIREMENT_WORDS, rng.randint(4, 10))
+        if rng.random() < 0.15:
+            words.insert(rng.randrange(len(words)), rng.choice(REQUIREMENT_PHRASES))
+        posted = datetime.combine(TODAY, datetime.min.time()) - timedelta(minutes=rng.randint(0, HISTORY_DAYS * 1440))
+        yield (job_id, _skewed_id(rng, sizes.members, 1.5), _pick(rng, _TYPES), " ".join(words).capitalize() + ".",
+               posted.isoformat(sep=" "))
+
+
+def gen_job_applications(rng, sizes, first, last):
+    # Parts are by job; application ids are assigned by the database.
+    for job_id in range(first, last):
+        for _ in range(_activity(rng, sizes.applications_per_job)):
+            applied = datetime.combine(TODAY, datetime.min.time()) - timedelta(minutes=rng.randint(0, 60 * 1440))
+            yield (_skewed_id(rng, sizes.caregivers), job_id, applied.isoformat(sep=" "),
+                   _pick(rng, _APPLICATION_STATUSES), "I would love to help your family.")
+
+
+def gen_appointments(rng, sizes, first, last):
+    # Parts are by caregiver. Each caregiver's appointments are on distinct,
+    # increasing days, so they never overlap.
+    for caregiver_id in range(first, last):
+        count = _activity(rng, sizes.appointments_per_caregiver)
+        day = TODAY - timedelta(days=rng.randint(0, HISTORY_DAYS))
+        for _ in range(count):
+            day += timedelta(days=rng.randint(1, 1 + 2 * HISTORY_DAYS // max(count, 1)))
+            hours = rng.choice([1.0, 2.0, 2.0, 3.0, 4.0, 6.0, 8.0])
+            starts_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=rng.randint(7, 15))
+            status = _pick(rng, _PAST_STATUSES if day < TODAY else _FUTURE_STATUSES)
+            yield (caregiver_id, _skewed_id(rng, sizes.members, 1.5), day.isoformat(),
+                   starts_at.strftime("%H:%M"), hours, status, starts_at.isoformat(sep=" "),
+                   (starts_at + timedelta(hours=hours)).isoformat(sep=" "))
+
+
+# table -> (columns, generator, number of driving rows)
+TABLES = {
+    "users": (("user_id", "email", "given_name", "surname", "city", "phone_number", "profile_description",
+               "password"), gen_users, lambda s: s.users),
+    "caregivers": (("caregiver_id", "user_id", "photo_url", "gender", "caregiving_type", "hourly_rate"),
+                   gen_caregivers, lambda s: s.caregivers),
+    "members": (("member_id", "user_id", "house_rules"), gen_members, lambda s: s.members),
+    "addresses": (("address_id", "user_id", "street_address", "city", "state_province", "postal_code", "country"),
+                  gen_addresses, lambda s: s.members),
+    "jobs": (("job_id", "member_id", "required_caregiving_type", "other_requirements", "date_posted"),
+             gen_jobs, lambda s: s.jobs),
+    "job_applications": (("caregiver_id", "job_id", "date_applied", "status", "cover_letter"),
+                         gen_job_applications, lambda s: s.jobs),
+    "appointments": (("caregiver_id", "member_id", "appointment_date", "appointment_time", "work_hours", "status",
+                      "starts_at", "ends_at"), gen_appointments, lambda s: s.caregivers),
+}
+
+
+def _write_part(args):
+    table, part, sizes, seed, directory = args
+    columns, generate, total = TABLES[table]
+    first = part * PART_SIZE + 1
+    last = min(total(sizes), (part + 1) * PART_SIZE) + 1
+    path = os.path.join(directory, f"{table}.{part:05d}.csv")
+    rows = 0
+    with open(path + ".tmp", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in generate(_rng(seed, table, part), sizes, first, last):
+            writer.writerow(row)
+            rows += 1
+    os.replace(path + ".tmp", path)
+    return table, rows
+
+
+def generate(directory, sizes, seed=42, workers=None):
+    os.makedirs(directory, exist_ok=True)
+    tasks = [(table, part, sizes, seed, directory)
+             for table, (_, _, total) in TABLES.items()
+             for part in range(math.ceil(total(sizes) / PART_SIZE))]
+    counts = dict.fromkeys(TABLES, 0)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for table, rows in pool.map(_write_part, tasks):
+            counts[table] += rows
+    return counts
+
+
+def seed_database(engine, sizes, seed=42, workers=None, batch_size=50_000):
+    # Wipe the database and load a freshly generated data set into it. The
+    # tables come from create_all, so the schema is stamped as the latest.
+    import tempfile
+    import bulk_load
+    import schema
+    from models import Base
+    Base.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        bulk_load._progress.drop(conn, checkfirst=True)
+    with tempfile.TemporaryDirectory() as directory:
+        generate(directory, sizes, seed, workers)
+        loaded = bulk_load.load(engine, directory, batch_size=batch_size)
+    bulk_load.refresh_derived(engine)
+    schema.stamp(engine)
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate (and optionally load) synthetic platform data")
+    parser.add_argument("directory", help="where the CSV parts are written")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--applications-per-job", type=float, default=4.0)
+    parser.add_argument("--appointments-per-caregiver", type=float, default=15.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--load", action="store_true", help="load the files with bulk_load.py afterwards")
+    parser.add_argument("--database-url", help="database to load into (defaults to DATABASE_URL)")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    args = parser.parse_args()
+
+    sizes = Sizes(args.users, args.applications_per_job, args.appointments_per_caregiver)
+    started = time.perf_counter()
+    counts = generate(args.directory, sizes, args.seed, args.workers)
+    for table, rows in counts.items():
+        print(f"{table:<18} {rows:>12,}")
+    print(f"Generated {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s")
+
+    if args.load:
+        import bulk_load
+        if args.database_url:
+            from sqlalchemy import create_engine
+            engine = create_engine(args.database_url)
+        else:
+            from db import engine
+        started = time.perf_counter()
+        loaded = bulk_load.load(engine, args.directory, batch_size=args.batch_size)
+        print(f"Loaded {sum(loaded.values()):,} rows in {time.perf_counter() - started:.1f}s")
+        bulk_load.refresh_derived(engine)
+
+
+if __name__ == "__main__":
+    main()
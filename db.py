@@ -1,19 +1,101 @@
 # db.py
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, exc, text
 from sqlalchemy.orm import sessionmaker
 
 load_dotenv()
 
 DATABASE_URL = os.getenv('DATABASE_URL')
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL not set in environment variables")
 
-engine = create_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Connection pool. Every threadpool worker (THREADPOOL_SIZE in app.py) may hold
+# a connection, so DB_POOL_SIZE + DB_MAX_OVERFLOW should cover it; otherwise
+# requests queue for up to DB_POOL_TIMEOUT seconds and then fail fast.
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 20))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+
+# Instead of pinging on every checkout (pool_pre_ping), only connections that
+# sat idle in the pool longer than this are checked before reuse. Connections
+# that die while busy are still detected by the driver error and invalidated.
+PING_IDLE_SECONDS = float(os.getenv('DB_PING_IDLE_SECONDS', 30))
+
+# Seconds to wait for a new PostgreSQL connection before giving up.
+CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 5))
+
+def _engine_options(url):
+    if url.startswith('sqlite'):
+        # Route handlers run in a threadpool, so connections cross threads.
+        return {'connect_args': {'check_same_thread': False}}
+    return {
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_recycle': POOL_RECYCLE,
+        'pool_timeout': POOL_TIMEOUT,
+        'connect_args': {'connect_timeout': CONNECT_TIMEOUT},
+    }
+
+# The engine is created on first use rather than at import, and creating it
+# does not connect: importing the app (uvicorn workers, reloads, scripts)
+# never waits on the database. `from db import engine` still works.
+_engine = None
+_engine_lock = threading.Lock()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if not DATABASE_URL:
+                    raise ValueError("DATABASE_URL not set in environment variables")
+                engine = create_engine(DATABASE_URL, echo=False, **_engine_options(DATABASE_URL))
+                event.listen(engine, 'checkin', _mark_idle)
+                event.listen(engine, 'checkout', _ping_if_idle)
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+def dispose_engine():
+    # Close pooled connections at shutdown, if the engine was ever created.
+    if _engine is not None:
+        _engine.dispose()
+
+def __getattr__(name):
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _mark_idle(dbapi_connection, connection_record):
+    connection_record.info['idle_since'] = time.monotonic()
+
+def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+    idle_since = connection_record.info.get('idle_since')
+    if idle_since is None or time.monotonic() - idle_since < PING_IDLE_SECONDS:
+        return
+    try:
+        cursor = dbapi_connection.cursor()
+        cursor.execute('SELECT 1')
+        cursor.close()
+    except Exception:
+        # The pool discards this connection and retries with a fresh one.
+        raise exc.DisconnectionError()
+
+def get_db():
+    # FastAPI dependency: one session per request, always closed (and any
+    # open transaction rolled back) even when the handler raises.
+    get_engine()
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
 
 def get_session():
+    get_engine()
     return SessionLocal()
 
 def close_session(session):
@@ -22,7 +104,7 @@ def close_session(session):
 
 def test_connection():
     try:
-        with engine.connect() as conn:
+        with get_engine().connect() as conn:
             result = conn.execute(text("SELECT version();"))
             print("Database connected:", result.fetchone()[0].split(',')[0])
             return True
@@ -31,4 +113,4 @@ def test_connection():
         return False
 
 if __name__ == "__main__":
-    test_connection()
\ No newline at end of file
+    test_connection()
@@ -0,0 +1,91 @@
+# Streaming table exports for billing and analytics.
+#
+# Rows are read through a server-side cursor (stream_results) in chunks of
+# EXPORT_CHUNK_SIZE and written out chunk by chunk, using plain column
+# projections rather than ORM objects, so memory use doesn't depend on the
+# size of the table. The stream holds its own connection for as long as the
+# client keeps reading.
+
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select
+from models import User, Caregiver, Member, Job, Appointment, JobApplication, Address
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 5000))
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+_EXPORTS = {
+    "users": (User, [c for c in User.__table__.c if c.name != "password"]),
+    "caregivers": (Caregiver, list(Caregiver.__table__.c)),
+    "members": (Member, list(Member.__table__.c)),
+    "addresses": (Address, list(Address.__table__.c)),
+    "jobs": (Job, list(Job.__table__.c)),
+    "job_applications": (JobApplication, list(JobApplication.__table__.c)),
+    "appointments": (Appointment, list(Appointment.__table__.c)),
+}
+ENTITIES = tuple(_EXPORTS)
+
+# Date-range filter column per entity
+_DATE_COLUMNS = {
+    "appointments": Appointment.appointment_date,
+    "job_applications": JobApplication.date_applied,
+    "jobs": Job.date_posted,
+}
+
+
+def build_query(entity, statuses=None, date_from=None, date_to=None):
+    model, columns = _EXPORTS[entity]
+    stmt = select(*columns).order_by(*model.__table__.primary_key.columns)
+    if statuses:
+        if "status" not in model.__table__.c:
+            raise ValueError(f"{entity} cannot be filtered by status")
+        stmt = stmt.where(model.__table__.c.status.in_(statuses))
+    if date_from or date_to:
+        column = _DATE_COLUMNS.get(entity)
+        if column is None:
+            raise ValueError(f"{entity} cannot be filtered by date")
+        if date_from:
+            stmt = stmt.where(column >= date_from)
+        if date_to:
+            # The end date is inclusive, also for DateTime columns.
+            if column.type.python_type is datetime:
+                stmt = stmt.where(column < _next_day(date_to))
+            else:
+                stmt = stmt.where(column <= date_to)
+    return stmt
+
+
+def _next_day(day):
+    return datetime.combine(day + timedelta(days=1), time.min)
+
+
+def _value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def stream(bind, stmt, fmt="csv"):
+    # Generator of text chunks; pass it to a StreamingResponse.
+    with bind.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_SIZE).execute(stmt)
+        keys = list(result.keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == "csv" else None
+        if writer:
+            writer.writerow(keys)
+        for rows in result.partitions():
+            if writer:
+                writer.writerows([_value(v) for v in row] for row in rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps({k: _value(v) for k, v in zip(keys, row)}))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
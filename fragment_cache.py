@@ -0,0 +1,32 @@
+# Rendered HTML fragments of the list pages.
+#
+# The table of a list page (rows plus the pagination bar) is cached under the
+# page parameters and the versions of the tables it shows (table_versions.py),
+# so viewing an unchanged page again is one dict lookup instead of a query and
+# a template render. Nothing is invalidated explicitly: a write bumps a table
+# version, later requests build a new key, and the old entries age out of the
+# LRU. FRAGMENT_CACHE_SIZE bounds the number of entries (0 disables caching).
+
+import os
+import threading
+from collections import OrderedDict
+
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", 256))
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_or_render(key, render):
+    with _lock:
+        html = _cache.get(key)
+        if html is not None:
+            _cache.move_to_end(key)
+            return html
+    html = render()
+    if FRAGMENT_CACHE_SIZE > 0:
+        with _lock:
+            _cache[key] = html
+            while len(_cache) > FRAGMENT_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return html
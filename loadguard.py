@@ -0,0 +1,97 @@
+# Lazy-load and query-budget checks for development and tests.
+#
+# LOAD_GUARD=warn counts the lazy relationship loads (N+1 queries) of every
+# request and prints the requests that do any, or that issue more SQL
+# statements than their route's budget; LOAD_GUARD=raise turns both into
+# exceptions, so a lazy load fails at the attribute access that caused it and
+# a request over budget fails in the test client. Off by default (no event
+# listener is installed).
+#
+# Routes declare their budget with @query_budget(n) under the route
+# decorator; the crud reads declare the eager loading their templates need
+# (crud.*_LOADS). `python check_loads.py` runs every route against generated
+# data with LOAD_GUARD=raise.
+
+import os
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import metrics
+
+LOAD_GUARD = os.getenv("LOAD_GUARD", "off").lower()
+
+# (method, path, queries, lazy loads, budget) of the latest requests
+recent = deque(maxlen=1000)
+
+
+class LazyLoadError(Exception):
+    pass
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(queries):
+    # Most statements a request to this route may issue
+    def decorate(endpoint):
+        endpoint.query_budget = queries
+        return endpoint
+    return decorate
+
+
+def allow(statements):
+    # Lets the current request issue this many statements beyond its route's
+    # budget, for work that grows with the input (the batch creates' INSERTs)
+    stats = metrics.current_request()
+    if stats is not None:
+        stats.extra_budget += statements
+
+
+def _on_orm_execute(orm_execute_state):
+    if not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None:
+        return
+    stats = metrics.current_request()
+    if stats is None:
+        return  # CLI scripts and background threads
+    stats.lazy_loads += 1
+    if LOAD_GUARD == "raise":
+        path = orm_execute_state.loader_strategy_path
+        raise LazyLoadError(f"lazy load of {path.natural_path[-1] if path else 'a relationship'} during "
+                            f"{stats.path}; add it to the query's eager loading")
+
+
+class LoadGuardMiddleware:
+    # Must run inside MetricsMiddleware, which counts the statements.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        stats = metrics.current_request()
+        if scope["type"] != "http" or stats is None:
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            budget = getattr(scope.get("endpoint"), "query_budget", None)
+            if budget is not None:
+                budget += stats.extra_budget
+            recent.append((scope["method"], stats.path, stats.queries, stats.lazy_loads, budget))
+        problems = []
+        if stats.lazy_loads:
+            problems.append(f"{stats.lazy_loads} lazy load(s)")
+        if budget is not None and stats.queries > budget:
+            problems.append(f"{stats.queries} queries, budget {budget}")
+        if not problems:
+            return
+        message = f"{scope['method']} {stats.path}: " + ", ".join(problems)
+        if LOAD_GUARD == "raise" and budget is not None and stats.queries > budget:
+            raise QueryBudgetExceeded(message)
+        print(f"Load guard: {message}")
+
+
+def install(app):
+    if LOAD_GUARD not in ("warn", "raise"):
+        return
+    event.listen(Session, "do_orm_execute", _on_orm_execute)
+    app.add_middleware(LoadGuardMiddleware)
@@ -0,0 +1,336 @@
+# HTTP load test for the web app.
+#
+#   python loadtest.py --boot --database-url sqlite:///loadtest.db --users 20000 --concurrency 50 --duration 60
+#   python loadtest.py --boot --database-url postgresql://.../loadtest --server-workers 4 --pool-size 10
+#   python loadtest.py --url http://localhost:8000 --database-url postgresql://.../app --requests 5000
+#
+# With --boot the database is seeded by datagen.py (--users; 0 keeps the data
+# already there), the app is started under uvicorn with the given worker
+# count, threadpool and connection pool settings, and stopped again at the
+# end. Otherwise the running server at --url is tested; the database it uses
+# is still needed to pick existing ids.
+#
+# Each of --concurrency clients picks requests from a weighted mix: list pages
+# (random sort order and page), edit forms and JSON reads, and with
+# --write-ratio of the time a create, edit or delete POST. Deletes only remove
+# rows the run itself created. Latency percentiles (p50/p95/p99), requests/sec
+# and status codes are reported per route, and --output saves them as JSON to
+# compare worker counts, pool sizes or builds. The exit status is 1 when more
+# than --max-error-rate of the requests fail (5xx or no response).
+# Seeding drops and recreates every table: never point --boot at real data.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+import httpx
+from sqlalchemy import create_engine, func, select
+from pagination import encode_cursor
+
+# List page -> sort keys to pick from (id most often, as in the UI)
+LIST_TABLES = {
+    "users": ["id", "id", "surname", "city"],
+    "caregivers": ["id", "id", "caregiving_type", "hourly_rate"],
+    "members": ["id"],
+    "jobs": ["id", "id", "required_caregiving_type"],
+    "appointments": ["id", "id", "appointment_date", "status"],
+}
+CAREGIVING_TYPES = ["babysitter", "elderly_care", "Caregiver"]
+STATUSES = ["pending", "confirmed", "completed"]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Workload:
+    # Builds requests against the ids that exist in the database.
+    def __init__(self, max_ids, run_id):
+        self.max_ids = max_ids
+        self.run_id = run_id
+        # Rows created by this run get ids after the seeded ones; deletes walk
+        # through them in order and never touch seeded data.
+        self.created = Counter()
+        self.deleted = Counter()
+
+    def id(self, rng, table):
+        return rng.randint(1, max(1, self.max_ids[table]))
+
+    def reads(self, rng):
+        table = rng.choice(list(LIST_TABLES))
+        search = rng.choice(["users", "caregivers", "members"])
+        return [
+            (6, "GET /", lambda: ("GET", "/", None)),
+            (20, f"GET /{table}", lambda: ("GET", f"/{table}", self._page_params(rng, table))),
+            (10, f"GET /{table}/edit/{{id}}", lambda: ("GET", f"/{table}/edit/{self.id(rng, table)}", None)),
+            (3, f"GET /api/search/{search}",
+             lambda: ("GET", f"/api/search/{search}", {"q": rng.choice(["Ar", "Am", "As", "Da", "Ti"])})),
+            (2, "GET /api/jobs/{id}/matches", lambda: ("GET", f"/api/jobs/{self.id(rng, 'jobs')}/matches", None)),
+            (2, "GET /caregivers/{id}/free-slots",
+             lambda: ("GET", f"/caregivers/{self.id(rng, 'caregivers')}/free-slots",
+                      {"start": date.today().isoformat(), "end": (date.today() + timedelta(days=7)).isoformat()})),
+        ]
+
+    def _page_params(self, rng, table):
+        params = {"sort": rng.choice(LIST_TABLES[table]), "order": rng.choice(["asc", "desc"])}
+        if rng.random() < 0.3:
+            # A later page, jumped to through an id cursor
+            params.update(sort="id", after=encode_cursor([self.id(rng, table)]))
+        return params
+
+    def writes(self, rng):
+        return [
+            (4, "POST /jobs/create", lambda: self._create("jobs", "/jobs/create", {
+                "member_id": self.id(rng, "members"), "required_caregiving_type": rng.choice(CAREGIVING_TYPES),
+                "other_requirements": "Load test job."})),
+            (3, "POST /appointments/create", lambda: self._create("appointments", "/appointments/create", {
+                "caregiver_id": self.id(rng, "caregivers"), "member_id": self.id(rng, "members"),
+                **self._slot(rng), "status": "pending"})),
+            (1, "POST /users/create", lambda: self._create("users", "/users/create", {
+                "email": f"loadtest-{self.run_id}-{self.created['users']}-{rng.random():.12f}@example.kz",
+                **self._user_fields(rng)})),
+            (4, "POST /jobs/edit/{id}", lambda: ("POST", f"/jobs/edit/{self.id(rng, 'jobs')}", {
+                "required_caregiving_type": rng.choice(CAREGIVING_TYPES),
+                "other_requirements": f"Edited by load test {rng.randint(1, 10**6)}."})),
+            (2, "POST /caregivers/edit/{id}", lambda: ("POST", f"/caregivers/edit/{self.id(rng, 'caregivers')}", {
+                "photo_url": "https://example.kz/photo.jpg", "gender": rng.choice(["Female", "Male"]),
+                "caregiving_type": rng.choice(CAREGIVING_TYPES), "hourly_rate": round(rng.uniform(5, 30), 2)})),
+            (2, "POST /appointments/edit/{id}",
+             lambda: ("POST", f"/appointments/edit/{self.id(rng, 'appointments')}",
+                      {**self._slot(rng), "status": rng.choice(STATUSES)})),
+            (2, "POST /jobs/delete/{id}", lambda: self._delete("jobs")),
+            (2, "POST /appointments/delete/{id}", lambda: self._delete("appointments")),
+            (1, "POST /users/delete/{id}", lambda: self._delete("users")),
+        ]
+
+    def _create(self, table, path, form):
+        self.created[table] += 1
+        return "POST", path, form
+
+    def _delete(self, table):
+        if self.deleted[table] >= self.created[table]:
+            return None  # nothing of ours left to delete
+        self.deleted[table] += 1
+        return "POST", f"/{table}/delete/{self.max_ids[table] + self.deleted[table]}", None
+
+    @staticmethod
+    def _slot(rng):
+        # Far enough ahead that most slots are free; clashes return 409.
+        day = date.today() + timedelta(days=rng.randint(400, 4000))
+        return {"appointment_date": day.isoformat(), "appointment_time": f"{rng.randint(7, 18):02d}:00",
+                "work_hours": rng.choice([1, 2, 3])}
+
+    @staticmethod
+    def _user_fields(rng):
+        return {"given_name": "Load", "surname": "Test", "city": rng.choice(["Astana", "Almaty"]),
+                "phone_number": "+77010000000", "profile_description": "Load test user.", "password": "loadtest"}
+
+    def next_request(self, rng, write_ratio):
+        choices = self.writes(rng) if rng.random() < write_ratio else self.reads(rng)
+        while True:
+            weights = [w for w, _, _ in choices]
+            _, route, build = rng.choices(choices, weights=weights)[0]
+            request = build()
+            if request:
+                return route, request
+            choices = [c for c in choices if c[1] != route]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = []
+
+    def record(self, route, elapsed, status):
+        self.latencies[route].append(elapsed)
+        self.statuses[route][status] += 1
+
+    def failures(self, route=None):
+        routes = [route] if route else self.statuses
+        return sum(n for r in routes for status, n in self.statuses[r].items() if status == "error" or status >= 500)
+
+    def summary(self, elapsed):
+        routes = {}
+        for route in sorted(self.latencies):
+            samples = self.latencies[route]
+            routes[route] = {
+                "requests": len(samples),
+                "requests_per_sec": round(len(samples) / elapsed, 1),
+                "p50_ms": round(percentile(samples, 50) * 1000, 1),
+                "p95_ms": round(percentile(samples, 95) * 1000, 1),
+                "p99_ms": round(percentile(samples, 99) * 1000, 1),
+                "failed": self.failures(route),
+                "statuses": {str(k): v for k, v in sorted(self.statuses[route].items(), key=str)},
+            }
+        everything = [s for samples in self.latencies.values() for s in samples]
+        return {
+            "elapsed_sec": round(elapsed, 2),
+            "requests": len(everything),
+            "requests_per_sec": round(len(everything) / elapsed, 1),
+            "p50_ms": round(percentile(everything, 50) * 1000, 1),
+            "p95_ms": round(percentile(everything, 95) * 1000, 1),
+            "p99_ms": round(percentile(everything, 99) * 1000, 1),
+            "failed": self.failures(),
+            "routes": routes,
+        }
+
+
+async def client_loop(client, workload, rng, write_ratio, stats, budget, deadline):
+    while time.perf_counter() < deadline:
+        if budget is not None:
+            if budget[0] <= 0:
+                return
+            budget[0] -= 1
+        route, (method, path, data) = workload.next_request(rng, write_ratio)
+        start = time.perf_counter()
+        try:
+            if method == "GET":
+                response = await client.get(path, params=data)
+            else:
+                response = await client.post(path, data=data)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = "error"
+            stats.errors.append(f"{route}: {e!r}")
+        stats.record(route, time.perf_counter() - start, status)
+
+
+async def run(url, workload, concurrency, total, duration, write_ratio, timeout, seed):
+    stats = Stats()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        # Warm up connections, templates and the server's caches.
+        for path in ["/", "/users", "/caregivers", "/members", "/jobs", "/appointments"]:
+            await client.get(path)
+        budget = None if duration else [total]
+        start = time.perf_counter()
+        deadline = start + duration if duration else float("inf")
+        await asyncio.gather(*[client_loop(client, workload, random.Random(f"{seed}:{n}"), write_ratio, stats,
+                                           budget, deadline)
+                               for n in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    return stats, elapsed
+
+
+def max_ids(engine):
+    from models import User, Caregiver, Member, Job, Appointment
+    columns = {"users": User.user_id, "caregivers": Caregiver.caregiver_id, "members": Member.member_id,
+               "jobs": Job.job_id, "appointments": Appointment.appointment_id}
+    with engine.connect() as conn:
+        return {table: conn.execute(select(func.max(column))).scalar() or 0 for table, column in columns.items()}
+
+
+def start_server(args):
+    env = dict(os.environ, DATABASE_URL=args.database_url, THREADPOOL_SIZE=str(args.threadpool_size),
+               DB_POOL_SIZE=str(args.pool_size), DB_MAX_OVERFLOW=str(args.max_overflow))
+    command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(args.port),
+               "--workers", str(args.server_workers), "--log-level", "warning", "--no-access-log"]
+    server = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    url = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with status {server.returncode}")
+        try:
+            if httpx.get(url + "/", timeout=5).status_code == 200:
+                return server, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    stop_server(server)
+    raise RuntimeError(f"server did not answer within {args.startup_timeout}s")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGINT)
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def print_summary(summary, args):
+    print(f"{summary['requests']} requests, concurrency {args.concurrency}, write ratio {args.write_ratio}, "
+          f"{summary['elapsed_sec']:.2f}s")
+    print(f"{'route':<36} {'reqs':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>6}  statuses")
+    for route, r in summary["routes"].items():
+        statuses = " ".join(f"{k}:{v}" for k, v in r["statuses"].items())
+        print(f"{route:<36} {r['requests']:>7} {r['requests_per_sec']:>8.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['failed']:>6}  {statuses}")
+    print(f"{'total':<36} {summary['requests']:>7} {summary['requests_per_sec']:>8.1f} {summary['p50_ms']:>8.1f} "
+          f"{summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f} {summary['failed']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-route latency and throughput under a mixed workload")
+    parser.add_argument("--url", default="http://localhost:8000", help="server to test when not using --boot")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"),
+                        help="the app's database (defaults to DATABASE_URL)")
+    parser.add_argument("--boot", action="store_true", help="seed the database and start the app here")
+    parser.add_argument("--users", type=int, default=10_000, help="with --boot: users to generate (0 keeps data)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--threadpool-size", type=int, default=40)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--max-overflow", type=int, default=20)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="run for this many seconds instead")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="share of requests that are POSTs")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url (or DATABASE_URL) is needed to pick existing ids")
+    engine = create_engine(args.database_url)
+    if args.boot and args.users:
+        import datagen
+        print(f"Seeding {args.users} users...")
+        datagen.seed_database(engine, datagen.Sizes(args.users))
+    workload = Workload(max_ids(engine), run_id=int(time.time()))
+    engine.dispose()
+
+    server, url = None, args.url
+    if args.boot:
+        server, url = start_server(args)
+    try:
+        stats, elapsed = asyncio.run(run(url, workload, args.concurrency, args.requests, args.duration,
+                                         args.write_ratio, args.timeout, args.seed))
+    finally:
+        if server:
+            stop_server(server)
+
+    summary = stats.summary(elapsed)
+    summary["settings"] = {key: getattr(args, key) for key in (
+        "concurrency", "write_ratio", "server_workers", "threadpool_size", "pool_size", "max_overflow")}
+    print_summary(summary, args)
+    if stats.errors:
+        print(f"{len(stats.errors)} request(s) got no response, first: {stats.errors[0]}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results written to {args.output}")
+    if summary["requests"] and summary["failed"] / summary["requests"] > args.max_error_rate:
+        print(f"Failed: {summary['failed']} of {summary['requests']} requests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
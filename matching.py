@@ -0,0 +1,327 @@
+# Caregiver-to-job matching.
+#
+# Every caregiver is a row in a column-oriented feature matrix (NumPy arrays):
+# caregiving type and city codes, hourly rate, completed appointment hours and
+# job application history. Ranking a job is a handful of vectorized operations
+# over those arrays plus an argpartition for the top N, so it stays in the
+# millisecond range for 100k caregivers. The matrix is loaded on first use and
+# then patched row by row: changes.py reports which caregivers, users,
+# addresses, appointments and applications were written, and the affected
+# caregiver rows are re-read before the next ranking. A write that doesn't say
+# which rows it changed (rates.apply) triggers a full reload in a background
+# thread, and rankings use the current matrix until it is swapped in. The
+# notifications only cover this process, so the matrix is also reloaded that
+# way every MATCHING_TTL seconds to pick up other workers' writes. Loads
+# and refreshes query outside the lock that rankings and the commit hook
+# take, so neither waits on the database. NumPy is imported with the first
+# load, which keeps it out of the app's startup time.
+
+import os
+import threading
+import time
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from models import User, Caregiver, Job, Member, Appointment, Address, JobApplication
+import changes
+
+MAX_MATCHES = 100
+MATCHING_TTL = float(os.getenv("MATCHING_TTL", 60))  # 0 disables the periodic reload
+
+# Score weights. A caregiver of the wrong caregiving type is never eligible.
+CITY_WEIGHT = 3.0
+RATE_WEIGHT = 2.0
+EXPERIENCE_WEIGHT = 1.5
+HISTORY_WEIGHT = 1.0
+APPLIED_WEIGHT = 1.0
+
+_CAREGIVERS = (select(Caregiver.caregiver_id, Caregiver.user_id, Caregiver.caregiving_type,
+                      Caregiver.hourly_rate, User.city)
+               .join(User, Caregiver.user_id == User.user_id))
+_ADDRESS_CITIES = select(Address.user_id, Address.city).order_by(Address.user_id, Address.address_id)
+_COMPLETED_HOURS = (select(Appointment.caregiver_id, func.sum(Appointment.work_hours))
+                    .where(Appointment.status == "completed").group_by(Appointment.caregiver_id))
+_APPLICATIONS = (select(JobApplication.caregiver_id, func.count(),
+                        func.sum(case((JobApplication.status == "accepted", 1), else_=0)))
+                 .group_by(JobApplication.caregiver_id))
+
+
+class FeatureMatrix:
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()          # the arrays and pending sets; held briefly
+        self._update_lock = threading.Lock()    # one load or refresh at a time, held while querying
+        self.reloading = False  # a load is running; commits are queued for after it
+        self.loaded_at = 0.0
+        self._codes = {"type": {}, "city": {}}
+        self._row_of = {}       # caregiver_id -> row
+        self._user_rows = {}    # user_id -> row
+        self._size = 0  # the arrays are allocated by load()
+        self._pending = set()   # caregiver ids to re-read
+        self._pending_users = set()
+        self._stale = False
+
+    def _allocate(self, capacity):
+        import numpy as np
+        self.caregiver_id = np.zeros(capacity, dtype=np.int64)
+        self.user_id = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.type_code = np.full(capacity, -1, dtype=np.int32)
+        self.city_code = np.full(capacity, -1, dtype=np.int32)
+        self.address_city_code = np.full(capacity, -1, dtype=np.int32)
+        self.hourly_rate = np.zeros(capacity, dtype=np.float64)
+        self.completed_hours = np.zeros(capacity, dtype=np.float64)
+        self.applications = np.zeros(capacity, dtype=np.int32)
+        self.accepted = np.zeros(capacity, dtype=np.int32)
+
+    def _grow(self):
+        old = {name: getattr(self, name) for name in _COLUMNS}
+        self._allocate(len(self.caregiver_id) * 2)
+        for name, values in old.items():
+            getattr(self, name)[:len(values)] = values
+
+    def code(self, kind, value):
+        if value is None:
+            return -1
+        codes = self._codes[kind]
+        key = value.strip().lower()
+        if key not in codes:
+            codes[key] = len(codes)
+        return codes[key]
+
+    def load(self, db):
+        # Built into a separate matrix, so neither rankings nor commit hooks
+        # wait for the queries; only the swap takes the lock.
+        started = time.monotonic()
+        built = FeatureMatrix()
+        caregivers = db.execute(_CAREGIVERS).all()
+        built._allocate(max(1024, len(caregivers) * 2))
+        for row in caregivers:
+            built._put(row)
+        built._apply_stats(_read_stats(db, None, None), None)
+        with self._lock:
+            for name in _COLUMNS + ("_codes", "_row_of", "_user_rows", "_size"):
+                setattr(self, name, getattr(built, name))
+            self.ready, self.loaded_at = True, started
+
+    def refresh(self, db, caregiver_ids, user_ids):
+        with self._lock:
+            caregiver_ids = set(caregiver_ids)
+            caregiver_ids.update(int(self.caregiver_id[self._user_rows[u]])
+                                 for u in user_ids if u in self._user_rows)
+        if not caregiver_ids:
+            return
+        rows = {r[0]: r for r in db.execute(_CAREGIVERS.where(Caregiver.caregiver_id.in_(caregiver_ids)))}
+        found = [c for c in caregiver_ids if c in rows]
+        stats = _read_stats(db, found, [rows[c][1] for c in found])
+        with self._lock:
+            for caregiver_id in caregiver_ids:
+                if caregiver_id in rows:
+                    self._put(rows[caregiver_id])
+                else:
+                    self._remove(caregiver_id)
+            self._apply_stats(stats, found)
+
+    def _put(self, row):
+        caregiver_id, user_id, caregiving_type, hourly_rate, city = row
+        i = self._row_of.get(caregiver_id)
+        if i is None:
+            if self._size == len(self.caregiver_id):
+                self._grow()
+            i = self._size
+            self._size += 1
+            self._row_of[caregiver_id] = i
+        self._user_rows[user_id] = i
+        self.caregiver_id[i] = caregiver_id
+        self.user_id[i] = user_id
+        self.active[i] = True
+        self.type_code[i] = self.code("type", caregiving_type)
+        self.city_code[i] = self.code("city", city)
+        self.hourly_rate[i] = hourly_rate or 0.0
+
+    def _remove(self, caregiver_id):
+        i = self._row_of.pop(caregiver_id, None)
+        if i is not None:
+            self.active[i] = False
+
+    def _apply_stats(self, stats, caregiver_ids):
+        # Stats from _read_stats() for every caregiver (caregiver_ids=None) or
+        # just the listed ones.
+        addresses, hours, applications = stats
+        if caregiver_ids is not None:
+            if not caregiver_ids:
+                return
+            rows = [self._row_of[c] for c in caregiver_ids]
+            self.address_city_code[rows] = -1
+            self.completed_hours[rows] = 0.0
+            self.applications[rows] = 0
+            self.accepted[rows] = 0
+
+        seen_users = set()
+        for user_id, city in addresses:
+            i = self._user_rows.get(user_id)
+            if i is not None and user_id not in seen_users:
+                seen_users.add(user_id)
+                self.address_city_code[i] = self.code("city", city)
+        for caregiver_id, total in hours:
+            if caregiver_id in self._row_of:
+                self.completed_hours[self._row_of[caregiver_id]] = total or 0.0
+        for caregiver_id, count, accepted in applications:
+            if caregiver_id in self._row_of:
+                i = self._row_of[caregiver_id]
+                self.applications[i] = count
+                self.accepted[i] = accepted or 0
+
+    def rank(self, caregiving_type, cities, budget=None, applied=(), limit=10):
+        import numpy as np
+        with self._lock:
+            n = self._size
+            type_code = self._codes["type"].get((caregiving_type or "").strip().lower())
+            if type_code is None:
+                return []
+            eligible = self.active[:n] & (self.type_code[:n] == type_code)
+            candidates = np.flatnonzero(eligible)
+            if candidates.size == 0:
+                return []
+
+            city_codes = [self._codes["city"][c.strip().lower()] for c in cities
+                          if c and c.strip().lower() in self._codes["city"]]
+            city_match = (np.isin(self.city_code[candidates], city_codes)
+                          | np.isin(self.address_city_code[candidates], city_codes)).astype(np.float64)
+
+            rates = self.hourly_rate[candidates]
+            if budget is None:
+                budget = float(np.median(rates))
+            over = np.clip((rates - budget) / max(budget, 1e-9), 0.0, 1.0)
+            rate_fit = 1.0 - over
+
+            hours = np.log1p(self.completed_hours[candidates])
+            experience = hours / hours.max() if hours.max() > 0 else hours
+
+            # Smoothed acceptance rate, so caregivers with no history score 0.5.
+            history = (self.accepted[candidates] + 1.0) / (self.applications[candidates] + 2.0)
+
+            has_applied = np.isin(self.caregiver_id[candidates], list(applied)).astype(np.float64)
+
+            score = (CITY_WEIGHT * city_match + RATE_WEIGHT * rate_fit + EXPERIENCE_WEIGHT * experience
+                     + HISTORY_WEIGHT * history + APPLIED_WEIGHT * has_applied)
+
+            k = min(limit, candidates.size)
+            top = np.argpartition(-score, k - 1)[:k]
+            top = top[np.lexsort((self.caregiver_id[candidates][top], -score[top]))]
+            return [{
+                "caregiver_id": int(self.caregiver_id[candidates[t]]),
+                "score": round(float(score[t]), 4),
+                "city_match": bool(city_match[t]),
+                "hourly_rate": float(rates[t]),
+                "completed_hours": float(self.completed_hours[candidates[t]]),
+                "applications": int(self.applications[candidates[t]]),
+                "accepted_applications": int(self.accepted[candidates[t]]),
+                "applied_to_job": bool(has_applied[t]),
+            } for t in top]
+
+
+_COLUMNS = ("caregiver_id", "user_id", "active", "type_code", "city_code", "address_city_code", "hourly_rate",
+            "completed_hours", "applications", "accepted")
+
+def _read_stats(db, caregiver_ids, user_ids):
+    # Address cities, completed hours and application counts, for every
+    # caregiver (caregiver_ids=None) or just the listed ones and their users.
+    addresses, hours, applications = _ADDRESS_CITIES, _COMPLETED_HOURS, _APPLICATIONS
+    if caregiver_ids is not None:
+        if not caregiver_ids:
+            return [], [], []
+        addresses = addresses.where(Address.user_id.in_(user_ids))
+        hours = hours.where(Appointment.caregiver_id.in_(caregiver_ids))
+        applications = applications.where(JobApplication.caregiver_id.in_(caregiver_ids))
+    return db.execute(addresses).all(), db.execute(hours).all(), db.execute(applications).all()
+
+
+_matrix = FeatureMatrix()
+
+
+def match_job(db: Session, job_id: int, budget: float = None, limit: int = 10):
+    job = db.execute(select(Job.required_caregiving_type, Member.user_id, User.city)
+                     .join(Member, Job.member_id == Member.member_id)
+                     .join(User, Member.user_id == User.user_id)
+                     .where(Job.job_id == job_id)).first()
+    if job is None:
+        return None
+    cities = {job.city}
+    cities.update(db.execute(select(Address.city).where(Address.user_id == job.user_id)).scalars())
+    applied = set(db.execute(select(JobApplication.caregiver_id).where(JobApplication.job_id == job_id)).scalars())
+
+    if not _matrix.ready:
+        with _matrix._update_lock:
+            if not _matrix.ready:
+                with _matrix._lock:
+                    _matrix.reloading = True
+                try:
+                    _take_pending()
+                    _matrix.load(db)
+                finally:
+                    _matrix.reloading = False
+    else:
+        with _matrix._lock:
+            expired = MATCHING_TTL > 0 and time.monotonic() - _matrix.loaded_at > MATCHING_TTL
+            reload = (_matrix._stale or expired) and not _matrix.reloading
+            if reload:
+                _matrix.reloading = True
+        if reload:
+            threading.Thread(target=_reload, args=(db.get_bind(),), daemon=True).start()
+        # While a reload runs, rank on the current data; the reload picks up
+        # the pending changes when it has swapped in.
+        if not _matrix.reloading and (_matrix._pending or _matrix._pending_users):
+            with _matrix._update_lock:
+                _matrix.refresh(db, *_take_pending())
+    matches = _matrix.rank(job.required_caregiving_type, cities, budget, applied, min(limit, MAX_MATCHES))
+
+    names = dict((r[0], (f"{r[1]} {r[2]}", r[3], r[4])) for r in db.execute(
+        select(Caregiver.caregiver_id, User.given_name, User.surname, Caregiver.caregiving_type, User.city)
+        .join(User, Caregiver.user_id == User.user_id)
+        .where(Caregiver.caregiver_id.in_([m["caregiver_id"] for m in matches]))))
+    for match in matches:
+        match["name"], match["caregiving_type"], match["city"] = names.get(match["caregiver_id"], (None, None, None))
+    return matches
+
+
+def _take_pending():
+    with _matrix._lock:
+        pending, pending_users = _matrix._pending, _matrix._pending_users
+        _matrix._pending, _matrix._pending_users = set(), set()
+    return pending, pending_users
+
+
+def _reload(bind):
+    # Full reload after a write that didn't say which rows it changed (a
+    # notify with None, e.g. rates.apply) or once MATCHING_TTL has passed,
+    # off the request and commit paths.
+    try:
+        with _matrix._update_lock, Session(bind=bind) as db:
+            with _matrix._lock:
+                _matrix._stale = False
+            _take_pending()  # the load reads these; later ones are re-read afterwards
+            _matrix.load(db)
+    except Exception as e:
+        print(f"Reloading the matching matrix failed: {e}")
+        with _matrix._lock:
+            _matrix._stale = True
+    finally:
+        _matrix.reloading = False
+
+
+@changes.subscribe
+def _on_commit(changed):
+    with _matrix._lock:
+        if not (_matrix.ready or _matrix.reloading):
+            return
+        if any(changed.get(t, ()) is None for t in ("caregivers", "users", "addresses", "appointments",
+                                                     "job_applications")):
+            _matrix._stale = True
+            return
+        _matrix._pending.update(changed.get("caregivers", ()))
+        _matrix._pending_users.update(changed.get("users", ()))
+        for table in ("appointments", "job_applications"):
+            _matrix._pending.update(row["caregiver_id"] for row in changed.get(table, {}).values()
+                                    if "caregiver_id" in row)
+        _matrix._pending_users.update(row["user_id"] for row in changed.get("addresses", {}).values()
+                                      if "user_id" in row)
@@ -0,0 +1,194 @@
+# Request and SQL telemetry, exposed in Prometheus text format at /metrics.
+#
+# Engine events time every statement: SQL from inside a request is added to
+# that request's query count and database time (through a context variable
+# the ASGI middleware sets), and every statement is recorded in a histogram
+# under its fingerprint, the statement text with bound parameters (SQLAlchemy
+# already sends placeholders) and whitespace/IN-list differences normalised
+# away. Statements slower than SLOW_QUERY_MS are printed with their
+# fingerprint and request path.
+#
+# Per request the work is a few perf_counter() calls and dict updates under
+# a lock, so it stays on in production. The number of distinct fingerprints is
+# capped at METRICS_MAX_STATEMENTS; later ones are counted as "other".
+
+import hashlib
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+METRICS_MAX_STATEMENTS = int(os.getenv("METRICS_MAX_STATEMENTS", 500))
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class RequestStats:
+    __slots__ = ("path", "queries", "db_seconds", "lazy_loads", "extra_budget")
+
+    def __init__(self, path):
+        self.path = path
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.lazy_loads = 0  # counted by loadguard.py when enabled
+        self.extra_budget = 0  # added by loadguard.allow() for input-sized work
+
+
+_request = ContextVar("metrics_request", default=None)
+
+
+def current_request():
+    return _request.get()
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-2]}')
+            lines.append(f"{self.name}_count{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]:.6f}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram("http_request_duration_seconds", "Time to serve a request, by route.",
+                             ("method", "route"), DURATION_BUCKETS)
+request_queries = Histogram("http_request_db_queries", "SQL statements issued per request, by route.",
+                            ("method", "route"), QUERY_COUNT_BUCKETS)
+request_db_time = Histogram("http_request_db_seconds", "Time spent in SQL per request, by route.",
+                            ("method", "route"), DURATION_BUCKETS)
+statement_duration = Histogram("db_statement_duration_seconds", "SQL statement execution time, by fingerprint.",
+                               ("fingerprint",), DURATION_BUCKETS)
+HISTOGRAMS = (request_duration, request_queries, request_db_time, statement_duration)
+
+# statement text -> (fingerprint id, normalised SQL); statements are few and
+# repeat, so this is one dict lookup per query after the first.
+_fingerprints = {}
+_statements = {}  # fingerprint id -> normalised SQL, for db_statement_info
+_fingerprint_lock = threading.Lock()
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES \(\.\.\.\))(?:, \(\.\.\.\))+")
+_NUMBERED = re.compile(r"(%\(\w+?)_\d+(\)s)|(:\w+?)_\d+\b")
+
+
+def fingerprint(statement):
+    cached = _fingerprints.get(statement)
+    if cached:
+        return cached
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _NUMBERED.sub(lambda m: (m.group(1) + m.group(2)) if m.group(1) else m.group(3), sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    sql = _VALUES_LIST.sub(r"\1", sql)
+    key = hashlib.sha1(sql.encode()).hexdigest()[:12]
+    with _fingerprint_lock:
+        if len(_fingerprints) >= METRICS_MAX_STATEMENTS * 4:
+            _fingerprints.clear()  # unbounded statement text, e.g. literal IN lists
+        if key not in _statements and len(_statements) >= METRICS_MAX_STATEMENTS:
+            key = "other"
+        else:
+            _statements.setdefault(key, sql)
+        _fingerprints[statement] = (key, sql)
+    return key, sql
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    key, sql = fingerprint(statement)
+    statement_duration.observe((key,), elapsed)
+    stats = _request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        path = stats.path if stats else "-"
+        print(f"Slow query {elapsed * 1000:.0f}ms [{key}] {path}: {sql[:500]}")
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute.
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware: the route template is known once routing has run,
+    # and the handler's threadpool copy of the context shares RequestStats.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope["path"])
+        token = _request.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request.reset(token)
+            route = getattr(scope.get("route"), "path", None) or _unrouted(stats.path)
+            labels = (scope["method"], route)
+            request_duration.observe(labels, elapsed)
+            request_queries.observe(labels, stats.queries)
+            request_db_time.observe(labels, stats.db_seconds)
+
+
+def _unrouted(path):
+    # Mounted apps (static files) and 404s: one label each, not one per URL
+    return "/static" if path.startswith("/static/") else "unmatched"
+
+
+def render():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.append("# HELP db_statement_info Normalised SQL of each statement fingerprint.")
+    lines.append("# TYPE db_statement_info gauge")
+    for key, sql in sorted(_statements.items()):
+        lines.append(f'db_statement_info{{fingerprint="{key}",statement="{_escape(sql[:1000])}"}} 1')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,42 @@
+# Alembic environment. The target database is -x url=... or DATABASE_URL;
+# models.Base.metadata is the schema that autogenerate compares against.
+
+import os
+from logging.config import fileConfig
+from alembic import context
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, pool
+from models import Base
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+load_dotenv()
+url = (context.get_x_argument(as_dictionary=True).get("url") or config.attributes.get("url")
+       or os.getenv("DATABASE_URL"))
+if not url:
+    raise ValueError("Set DATABASE_URL or pass -x url=...")
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(url=url, target_metadata=target_metadata, literal_binds=True,
+                      dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(url, poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata,
+                          render_as_batch=connection.dialect.name == "sqlite")
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,107 @@
+"""baseline schema
+
+The schema as create_all built it before migrations existed. Databases
+created that way are brought under migration with `alembic stamp 0001`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 13:10:26.325218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('users',
+    sa.Column('user_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('given_name', sa.String(length=50), nullable=False),
+    sa.Column('surname', sa.String(length=50), nullable=False),
+    sa.Column('city', sa.String(length=50), nullable=False),
+    sa.Column('phone_number', sa.String(length=20), nullable=False),
+    sa.Column('profile_description', sa.Text(), nullable=True),
+    sa.Column('password', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('user_id'),
+    sa.UniqueConstraint('email')
+    )
+    op.create_table('addresses',
+    sa.Column('address_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('street_address', sa.String(length=255), nullable=False),
+    sa.Column('city', sa.String(length=100), nullable=False),
+    sa.Column('state_province', sa.String(length=100), nullable=True),
+    sa.Column('postal_code', sa.String(length=20), nullable=True),
+    sa.Column('country', sa.String(length=100), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('address_id')
+    )
+    op.create_table('caregivers',
+    sa.Column('caregiver_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('photo_url', sa.String(length=255), nullable=True),
+    sa.Column('gender', sa.String(length=20), nullable=True),
+    sa.Column('caregiving_type', sa.String(length=50), nullable=False),
+    sa.Column('hourly_rate', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('caregiver_id'),
+    sa.UniqueConstraint('user_id')
+    )
+    op.create_table('members',
+    sa.Column('member_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('house_rules', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('member_id'),
+    sa.UniqueConstraint('user_id')
+    )
+    op.create_table('appointments',
+    sa.Column('appointment_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('caregiver_id', sa.Integer(), nullable=False),
+    sa.Column('member_id', sa.Integer(), nullable=False),
+    sa.Column('appointment_date', sa.Date(), nullable=False),
+    sa.Column('appointment_time', sa.String(length=10), nullable=False),
+    sa.Column('work_hours', sa.Float(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.ForeignKeyConstraint(['caregiver_id'], ['caregivers.caregiver_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['member_id'], ['members.member_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('appointment_id')
+    )
+    op.create_table('jobs',
+    sa.Column('job_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('member_id', sa.Integer(), nullable=False),
+    sa.Column('required_caregiving_type', sa.String(length=50), nullable=False),
+    sa.Column('other_requirements', sa.Text(), nullable=True),
+    sa.Column('date_posted', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['member_id'], ['members.member_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('job_id')
+    )
+    op.create_table('job_applications',
+    sa.Column('application_id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('caregiver_id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.Integer(), nullable=False),
+    sa.Column('date_applied', sa.DateTime(), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('cover_letter', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['caregiver_id'], ['caregivers.caregiver_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['job_id'], ['jobs.job_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('application_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job_applications')
+    op.drop_table('jobs')
+    op.drop_table('appointments')
+    op.drop_table('members')
+    op.drop_table('caregivers')
+    op.drop_table('addresses')
+    op.drop_table('users')
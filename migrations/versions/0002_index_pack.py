@@ -0,0 +1,57 @@
+"""index pack
+
+Secondary indexes for the foreign keys the joins, eager loads and cascading
+deletes follow, the list page sort orders (sort column + id, for keyset
+pagination) and the billable-appointment reports. On PostgreSQL they are
+built with CREATE INDEX CONCURRENTLY, outside a transaction, so the tables
+stay writable. If a concurrent build fails it leaves an INVALID index behind:
+drop it and run the upgrade again.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 13:40:02.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BILLABLE = sa.text("status IN ('confirmed', 'completed')")
+
+# name, table, columns, partial index condition
+INDEXES = [
+    ('ix_appointments_member_id', 'appointments', ['member_id'], None),
+    ('ix_appointments_date_id', 'appointments', ['appointment_date', 'appointment_id'], None),
+    ('ix_appointments_status_id', 'appointments', ['status', 'appointment_id'], None),
+    ('ix_appointments_billable_caregiver_date', 'appointments', ['caregiver_id', 'appointment_date'], BILLABLE),
+    ('ix_jobs_member_id', 'jobs', ['member_id'], None),
+    ('ix_jobs_type_id', 'jobs', ['required_caregiving_type', 'job_id'], None),
+    ('ix_job_applications_job_date', 'job_applications', ['job_id', 'date_applied'], None),
+    ('ix_job_applications_caregiver_id', 'job_applications', ['caregiver_id'], None),
+    ('ix_users_city_id', 'users', ['city', 'user_id'], None),
+    ('ix_users_surname_id', 'users', ['surname', 'user_id'], None),
+    ('ix_caregivers_type_id', 'caregivers', ['caregiving_type', 'caregiver_id'], None),
+    ('ix_caregivers_rate_id', 'caregivers', ['hourly_rate', 'caregiver_id'], None),
+    ('ix_addresses_user_id', 'addresses', ['user_id'], None),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True,
+                            postgresql_where=where, sqlite_where=where)
+    op.execute('ANALYZE')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
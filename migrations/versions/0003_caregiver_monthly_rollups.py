@@ -0,0 +1,55 @@
+"""caregiver monthly rollups
+
+Adds caregiver_monthly_rollups (billable appointments, hours and earnings per
+caregiver and month, read by the earnings reports) and fills it from the
+existing appointments, the same totals `python rollups.py` rebuilds. From
+then on the app keeps it current on every write.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 16:05:41.730912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL = """
+    INSERT INTO caregiver_monthly_rollups (caregiver_id, month, appointment_count, hours, earnings)
+    SELECT a.caregiver_id, {month}, COUNT(*), SUM(a.work_hours), SUM(a.work_hours) * c.hourly_rate
+    FROM appointments a
+    JOIN caregivers c ON a.caregiver_id = c.caregiver_id
+    WHERE a.status IN ('confirmed', 'completed')
+    GROUP BY a.caregiver_id, {month}, c.hourly_rate
+"""
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('caregiver_monthly_rollups'):
+        op.create_table('caregiver_monthly_rollups',
+        sa.Column('caregiver_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('appointment_count', sa.Integer(), nullable=False),
+        sa.Column('hours', sa.Float(), nullable=False),
+        sa.Column('earnings', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['caregiver_id'], ['caregivers.caregiver_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('caregiver_id', 'month')
+        )
+    if bind.dialect.name == 'postgresql':
+        month = "CAST(date_trunc('month', a.appointment_date) AS DATE)"
+    else:
+        month = "date(a.appointment_date, 'start of month')"
+    op.execute('DELETE FROM caregiver_monthly_rollups')
+    op.execute(BACKFILL.format(month=month))
+
+
+def downgrade() -> None:
+    op.drop_table('caregiver_monthly_rollups')
@@ -0,0 +1,41 @@
+"""table counters
+
+Adds table_counters, the dashboard row counts that counters.py keeps in step
+with every write, and fills it with the current COUNT(*) of each counted
+table.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 18:02:17.504113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTED_TABLES = ('users', 'caregivers', 'members', 'jobs', 'appointments')
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table('table_counters'):
+        op.create_table('table_counters',
+        sa.Column('table_name', sa.String(length=50), nullable=False),
+        sa.Column('row_count', sa.BigInteger(), nullable=False),
+        sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('table_name')
+        )
+    op.execute('DELETE FROM table_counters')
+    for table in COUNTED_TABLES:
+        op.execute(f"INSERT INTO table_counters (table_name, row_count, reconciled_at) "
+                   f"SELECT '{table}', COUNT(*), CURRENT_TIMESTAMP FROM {table}")
+
+
+def downgrade() -> None:
+    op.drop_table('table_counters')
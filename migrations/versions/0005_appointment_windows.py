@@ -0,0 +1,72 @@
+"""appointment windows
+
+Adds appointments.starts_at/ends_at, the booked window schedule.py checks
+for double bookings, with the per-caregiver index it reads schedules from,
+and derives the window of every existing appointment from its date, time and
+work_hours. Rows whose window can't be derived (an unparseable time, hours
+outside 0-24) are reported and left NULL; they don't block anyone's
+schedule.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 18:04:51.229870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+appointments = sa.table('appointments', sa.column('appointment_id', sa.Integer),
+                        sa.column('appointment_date', sa.Date), sa.column('appointment_time', sa.String),
+                        sa.column('work_hours', sa.Float), sa.column('starts_at', sa.DateTime),
+                        sa.column('ends_at', sa.DateTime))
+
+
+def upgrade() -> None:
+    from schedule import appointment_window
+
+    bind = op.get_bind()
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('appointments')}
+    for name in ('starts_at', 'ends_at'):
+        if name not in columns:
+            op.add_column('appointments', sa.Column(name, sa.DateTime(), nullable=True))
+    op.create_index('ix_appointments_caregiver_starts_at', 'appointments', ['caregiver_id', 'starts_at'],
+                    if_not_exists=True)
+
+    update = (sa.update(appointments).where(appointments.c.appointment_id == sa.bindparam('id'))
+              .values(starts_at=sa.bindparam('start'), ends_at=sa.bindparam('end')))
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.select(appointments.c.appointment_id, appointments.c.appointment_date,
+                                      appointments.c.appointment_time, appointments.c.work_hours)
+                            .where(appointments.c.starts_at.is_(None), appointments.c.appointment_id > last_id)
+                            .order_by(appointments.c.appointment_id).limit(BATCH_SIZE)).all()
+        if not rows:
+            break
+        windows = []
+        for appointment_id, appointment_date, appointment_time, work_hours in rows:
+            try:
+                starts_at, ends_at = appointment_window(appointment_date, appointment_time, work_hours)
+            except (ValueError, OverflowError) as e:
+                print(f"Leaving appointment {appointment_id} without a window: {e}")
+                continue
+            windows.append({'id': appointment_id, 'start': starts_at, 'end': ends_at})
+        if windows:
+            bind.execute(update, windows)
+        last_id = rows[-1].appointment_id
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_caregiver_starts_at', table_name='appointments', if_exists=True)
+    with op.batch_alter_table('appointments') as batch:
+        batch.drop_column('ends_at')
+        batch.drop_column('starts_at')
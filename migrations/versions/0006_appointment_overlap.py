@@ -0,0 +1,43 @@
+"""appointment overlap constraint
+
+On PostgreSQL, the ex_appointments_caregiver_overlap exclusion constraint:
+no two non-cancelled appointments of a caregiver may overlap. It needs the
+btree_gist extension for the caregiver_id equality. Existing overlapping
+appointments make the upgrade fail; cancel or move them and run it again.
+Other backends rely on the check in schedule.py alone.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 18:06:33.871402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NAME = 'ex_appointments_caregiver_overlap'
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    exists = bind.execute(sa.text('SELECT 1 FROM pg_constraint WHERE conname = :name'), {'name': NAME}).first()
+    if not exists:
+        op.create_exclude_constraint(NAME, 'appointments', ('caregiver_id', '='),
+                                     (sa.text('tsrange(starts_at, ends_at)'), '&&'),
+                                     where=sa.text("starts_at IS NOT NULL AND status <> 'cancelled'"),
+                                     using='gist')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(f'ALTER TABLE appointments DROP CONSTRAINT IF EXISTS {NAME}')
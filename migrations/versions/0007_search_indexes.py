@@ -0,0 +1,59 @@
+"""search indexes
+
+Expression indexes for the typeahead fallback (lower(column) LIKE 'term%' on
+users' names and email) and, on PostgreSQL, the GIN full-text indexes over
+members.house_rules and jobs.other_requirements that text_search.py queries.
+On PostgreSQL they are built with CREATE INDEX CONCURRENTLY, like 0002.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 18:08:12.660095
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREFIX_INDEXES = [
+    ('ix_users_given_name_prefix', 'given_name'),
+    ('ix_users_surname_prefix', 'surname'),
+    ('ix_users_email_prefix', 'email'),
+]
+# name, table, column (PostgreSQL only)
+FTS_INDEXES = [
+    ('ix_members_house_rules_fts', 'members', 'house_rules'),
+    ('ix_jobs_other_requirements_fts', 'jobs', 'other_requirements'),
+]
+
+
+def ts_document(column):
+    return sa.func.to_tsvector(sa.literal_column("'english'"), sa.func.coalesce(sa.column(column),
+                                                                                sa.literal_column("''")))
+
+
+def upgrade() -> None:
+    postgres = op.get_context().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, column in PREFIX_INDEXES:
+            op.create_index(name, 'users', [sa.text(f'lower({column}) text_pattern_ops' if postgres
+                                                    else f'lower({column})')],
+                            if_not_exists=True, postgresql_concurrently=True)
+        if postgres:
+            for name, table, column in FTS_INDEXES:
+                op.create_index(name, table, [ts_document(column)], if_not_exists=True,
+                                postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(FTS_INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+        for name, _ in reversed(PREFIX_INDEXES):
+            op.drop_index(name, table_name='users', if_exists=True, postgresql_concurrently=True)
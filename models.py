@@ -1,10 +1,19 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Text, DateTime
+from sqlalchemy import (Column, Integer, BigInteger, String, Float, Date, ForeignKey, Text, DateTime, Index, DDL,
+                        event, func, literal_column)
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
 Base = declarative_base()
 
 
+def ts_document(column):
+    # Full-text document for text_search.py. It must match the indexed
+    # expression exactly for PostgreSQL to use the index, so the config and
+    # the empty string are rendered inline rather than as bound parameters.
+    return func.to_tsvector(literal_column("'english'"), func.coalesce(column, literal_column("''")))
+
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -22,6 +31,18 @@ class User(Base):
     member = relationship("Member", back_populates="user", uselist=False, cascade="all, delete-orphan")
     addresses = relationship("Address", back_populates="user", cascade="all, delete-orphan")
 
+
+# Prefix lookups for the typeahead fallback: lower(column) LIKE 'term%'
+Index('ix_users_given_name_prefix', func.lower(User.given_name).label('given_name_lower'),
+      postgresql_ops={'given_name_lower': 'text_pattern_ops'})
+Index('ix_users_surname_prefix', func.lower(User.surname).label('surname_lower'),
+      postgresql_ops={'surname_lower': 'text_pattern_ops'})
+Index('ix_users_email_prefix', func.lower(User.email).label('email_lower'),
+      postgresql_ops={'email_lower': 'text_pattern_ops'})
+# List sorts (keyset on sort column + id) and city filters
+Index('ix_users_city_id', User.city, User.user_id)
+Index('ix_users_surname_id', User.surname, User.user_id)
+
 class Caregiver(Base):
     __tablename__ = 'caregivers'
 
@@ -37,6 +58,11 @@ class Caregiver(Base):
     appointments = relationship("Appointment", back_populates="caregiver", cascade="all, delete-orphan")
     job_applications = relationship("JobApplication", back_populates="caregiver", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('ix_caregivers_type_id', caregiving_type, caregiver_id),
+        Index('ix_caregivers_rate_id', hourly_rate, caregiver_id),
+    )
+
 
 class Member(Base):
     __tablename__ = 'members'
@@ -50,6 +76,11 @@ class Member(Base):
     jobs = relationship("Job", back_populates="member", cascade="all, delete-orphan")
     appointments = relationship("Appointment", back_populates="member", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('ix_members_house_rules_fts', ts_document(house_rules),
+              postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+
 
 class Job(Base):
     __tablename__ = 'jobs'
@@ -64,6 +95,13 @@ class Job(Base):
     member = relationship("Member", back_populates="jobs")
     applications = relationship("JobApplication", back_populates="job", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('ix_jobs_other_requirements_fts', ts_document(other_requirements),
+              postgresql_using='gin').ddl_if(dialect='postgresql'),
+        Index('ix_jobs_member_id', member_id),
+        Index('ix_jobs_type_id', required_caregiving_type, job_id),
+    )
+
 
 class Appointment(Base):
     __tablename__ = 'appointments'
@@ -75,11 +113,35 @@ class Appointment(Base):
     appointment_time = Column(String(10), nullable=False)
     work_hours = Column(Float, nullable=False)
     status = Column(String(20), nullable=False)
+    # Booked window, derived from date, time and work_hours (see schedule.py).
+    # NULL only on rows written before these columns existed.
+    starts_at = Column(DateTime)
+    ends_at = Column(DateTime)
 
     # Relationships
     caregiver = relationship("Caregiver", back_populates="appointments")
     member = relationship("Member", back_populates="appointments")
 
+    __table_args__ = (
+        Index('ix_appointments_caregiver_starts_at', caregiver_id, starts_at),
+        Index('ix_appointments_member_id', member_id),
+        Index('ix_appointments_date_id', appointment_date, appointment_id),
+        Index('ix_appointments_status_id', status, appointment_id),
+        # Billable appointments per caregiver and date: the reports and rollups
+        Index('ix_appointments_billable_caregiver_date', caregiver_id, appointment_date,
+              postgresql_where=status.in_(('confirmed', 'completed')),
+              sqlite_where=status.in_(('confirmed', 'completed'))),
+        # No two active appointments of a caregiver may overlap. Needs btree_gist
+        # for the integer equality part.
+        ExcludeConstraint((caregiver_id, '='), (func.tsrange(starts_at, ends_at), '&&'),
+                          name='ex_appointments_caregiver_overlap', using='gist',
+                          where="starts_at IS NOT NULL AND status <> 'cancelled'").ddl_if(dialect='postgresql'),
+    )
+
+
+event.listen(Appointment.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+
 
 class Address(Base):
     __tablename__ = 'addresses'
@@ -95,6 +157,10 @@ class Address(Base):
     # Relationship
     user = relationship("User", back_populates="addresses")
 
+    __table_args__ = (
+        Index('ix_addresses_user_id', user_id),
+    )
+
 
 class JobApplication(Base):
     __tablename__ = 'job_applications'
@@ -108,4 +174,30 @@ class JobApplication(Base):
 
     # Relationships
     caregiver = relationship("Caregiver", back_populates="job_applications")
-    job = relationship("Job", back_populates="applications")
\ No newline at end of file
+    job = relationship("Job", back_populates="applications")
+
+    __table_args__ = (
+        Index('ix_job_applications_job_date', job_id, date_applied),
+        Index('ix_job_applications_caregiver_id', caregiver_id),
+    )
+
+
+class TableCounter(Base):
+    __tablename__ = 'table_counters'
+
+    # One row per counted table, kept in step by counters.py
+    table_name = Column(String(50), primary_key=True)
+    row_count = Column(BigInteger, nullable=False, default=0)
+    reconciled_at = Column(DateTime)
+
+
+class CaregiverMonthlyRollup(Base):
+    __tablename__ = 'caregiver_monthly_rollups'
+
+    # Billable (confirmed or completed) appointments per caregiver and month,
+    # kept in step by rollups.py. earnings = hours * the caregiver's current rate.
+    caregiver_id = Column(Integer, ForeignKey('caregivers.caregiver_id', ondelete='CASCADE'), primary_key=True)
+    month = Column(Date, primary_key=True)
+    appointment_count = Column(Integer, nullable=False, default=0)
+    hours = Column(Float, nullable=False, default=0)
+    earnings = Column(Float, nullable=False, default=0)
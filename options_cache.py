@@ -0,0 +1,82 @@
+# Cached (id, name, detail) tuples for the <select> dropdowns.
+#
+# The forms only need an id and a label per row, so each list is loaded with a
+# narrow column projection instead of full ORM objects, then kept in process
+# memory until a committed write touches one of the tables it is built from.
+# The TTL bounds how stale a list can get when another worker process made the
+# change, and OPTION_CACHE_MAX_ROWS bounds the memory (and page size) per list.
+
+import os
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import User, Caregiver, Member
+import changes
+
+OPTION_CACHE_MAX_ROWS = int(os.getenv("OPTION_CACHE_MAX_ROWS", 1000))
+OPTION_CACHE_TTL = float(os.getenv("OPTION_CACHE_TTL", 60))
+
+Option = namedtuple("Option", ["id", "name", "detail"])
+
+
+class OptionList(list):
+    # truncated is set when the table holds more rows than OPTION_CACHE_MAX_ROWS
+    truncated = False
+
+
+_QUERIES = {
+    "users": select(User.user_id, User.given_name, User.surname, User.email)
+        .order_by(User.user_id),
+    "caregivers": select(Caregiver.caregiver_id, User.given_name, User.surname, Caregiver.caregiving_type)
+        .join(User, Caregiver.user_id == User.user_id).order_by(Caregiver.caregiver_id),
+    "members": select(Member.member_id, User.given_name, User.surname, User.email)
+        .join(User, Member.user_id == User.user_id).order_by(Member.member_id),
+}
+
+# Which cached lists need rebuilding when a table changes.
+_DEPENDENTS = {
+    "users": ("users", "caregivers", "members"),
+    "caregivers": ("caregivers",),
+    "members": ("members",),
+}
+
+_cache = {}
+_lock = threading.Lock()
+_generation = 0
+
+
+def get_options(db: Session, entity: str):
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(entity)
+        generation = _generation
+    if entry and entry[0] > now:
+        return entry[1]
+
+    rows = db.execute(_QUERIES[entity].limit(OPTION_CACHE_MAX_ROWS + 1)).all()
+    options = OptionList(Option(r[0], f"{r[1]} {r[2]}", r[3]) for r in rows[:OPTION_CACHE_MAX_ROWS])
+    options.truncated = len(rows) > OPTION_CACHE_MAX_ROWS
+    with _lock:
+        # Don't store a list that a concurrent commit has already invalidated.
+        if generation == _generation:
+            _cache[entity] = (now + OPTION_CACHE_TTL, options)
+    return options
+
+
+def invalidate(*entities):
+    global _generation
+    with _lock:
+        _generation += 1
+        for entity in entities or list(_cache):
+            _cache.pop(entity, None)
+
+
+@changes.subscribe
+def _on_commit(changed):
+    stale = set()
+    for table in changed:
+        stale.update(_DEPENDENTS.get(table, ()))
+    if stale:
+        invalidate(*stale)
@@ -0,0 +1,112 @@
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Page:
+    def __init__(self, items, sort, order, limit, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.sort = sort
+        self.order = order
+        self.limit = limit
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def clamp_limit(limit):
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _to_json(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _from_json(value, column):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_from_json(v, c) for v, c in zip(values, columns)]
+    except (ValueError, TypeError):
+        raise ValueError("Invalid page cursor")
+
+
+def resolve_sort(sorts, sort):
+    if sort not in sorts:
+        raise ValueError(f"Cannot sort by '{sort}', expected one of: {', '.join(sorts)}")
+    return sorts[sort]
+
+
+def paginate(query, sort_column, pk_column, after=None, before=None,
+             limit=DEFAULT_PAGE_SIZE, descending=False, sort="id", db=None):
+    # Keyset pagination on (sort_column, pk_column): each page is an index
+    # range scan that starts right after the cursor, so page N costs the same
+    # as page 1 no matter how many rows precede it. query is an ORM Query, or
+    # a Core select() to run on db (which must include both columns).
+    limit = clamp_limit(limit)
+    columns = [pk_column] if sort_column is pk_column else [sort_column, pk_column]
+    key = tuple_(*columns) if len(columns) > 1 else columns[0]
+
+    backwards = before is not None
+    cursor = before if backwards else after
+    if cursor is not None:
+        values = decode_cursor(cursor, columns)
+        bound = tuple_(*values) if len(values) > 1 else values[0]
+        # Moving forward through an ascending list, or backward through a
+        # descending one, means looking for keys greater than the cursor.
+        query = query.where(key > bound if backwards == descending else key < bound)
+
+    reverse_scan = backwards != descending
+    query = query.order_by(*[c.desc() if reverse_scan else c.asc() for c in columns])
+    query = query.limit(limit + 1)
+    rows = db.execute(query).all() if db is not None else query.all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    def cursor_of(item):
+        return encode_cursor([getattr(item, c.key) for c in columns])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            prev_cursor = cursor_of(rows[0]) if has_more else None
+            next_cursor = cursor_of(rows[-1])
+        else:
+            prev_cursor = cursor_of(rows[0]) if after is not None else None
+            next_cursor = cursor_of(rows[-1]) if has_more else None
+
+    return Page(rows, sort, "desc" if descending else "asc", limit, next_cursor, prev_cursor)
@@ -2,8 +2,11 @@
 
 from sqlalchemy import func, and_, or_, text
 from tabulate import tabulate
-from models import User, Caregiver, Member, Address, Job, JobApplication, Appointment
-from decimal import Decimal
+from models import User, Caregiver, Member, Address, Job, JobApplication, Appointment, CaregiverMonthlyRollup
+import counters  # its flush hook keeps table_counters in step for the writes below
+import rates
+import rollups
+import text_search
 
 
 def print_results(headers, rows, message=""):
@@ -35,22 +38,20 @@ def update_3_1_phone_number(session):
 def update_3_2_commission_fee(session):
     print(f"3.2 UPDATE: Add commission to hourly rates")
 
-    before = session.query(Caregiver.caregiver_user_id, User.given_name, User.surname, Caregiver.hourly_rate) \
-        .join(User).all()
+    summary = rates.preview(session)
     print("\nBefore:")
-    print_results(['ID', 'Name', 'Old Rate'],
-                  [[r[0], f"{r[1]} {r[2]}", f"${r[3]:.2f}"] for r in before])
+    print_results(['Caregivers', '+$0.30', '+10%', 'Min Rate', 'Avg Rate', 'Max Rate'],
+                  [[summary['caregivers'], summary['flat_increase'], summary['percent_increase'],
+                    *(f"${summary['current'][k]:.2f}" if summary['current'][k] is not None else '-'
+                      for k in ('min', 'avg', 'max'))]])
 
-    caregivers = session.query(Caregiver).all()
-    for c in caregivers:
-        c.hourly_rate = c.hourly_rate + Decimal('0.30') if c.hourly_rate < 10 else c.hourly_rate * Decimal('1.10')
-    session.commit()
+    updated = rates.apply(session)
 
-    after = session.query(Caregiver.caregiver_user_id, User.given_name, User.surname, Caregiver.hourly_rate) \
-        .join(User).all()
-    print(f"\nUpdated {len(caregivers)} caregiver(s)\n\nAfter:")
-    print_results(['ID', 'Name', 'New Rate'],
-                  [[r[0], f"{r[1]} {r[2]}", f"${r[3]:.2f}"] for r in after])
+    after = session.query(func.count(), func.min(Caregiver.hourly_rate), func.avg(Caregiver.hourly_rate),
+                          func.max(Caregiver.hourly_rate)).one()
+    print(f"\nUpdated {updated} caregiver(s)\n\nAfter:")
+    print_results(['Caregivers', 'Min Rate', 'Avg Rate', 'Max Rate'],
+                  [[after[0], *(f"${v:.2f}" if v is not None else '-' for v in after[1:])]])
 
 
 
@@ -60,24 +61,27 @@ def delete_4_1_jobs_by_amina(session):
 
     amina = session.query(User).filter(User.given_name == 'Amina', User.surname == 'Aminova').first()
     if amina:
-        jobs = session.query(Job.job_id, Job.required_caregiving_type, Job.other_requirements) \
-            .filter(Job.member_user_id == amina.user_id).all()
+        amina_members = session.query(Member.member_id).filter(Member.user_id == amina.user_id).scalar_subquery()
+        jobs = session.query(Job).filter(Job.member_id.in_(amina_members)).all()
         print(f"\nJobs before deletion:")
         print_results(['Job ID', 'Type', 'Requirements'],
-                      [[j[0], j[1], j[2][:50] + '...'] for j in jobs])
+                      [[j.job_id, j.required_caregiving_type, (j.other_requirements or '')[:50] + '...'] for j in jobs])
 
-        deleted = session.query(Job).filter(Job.member_user_id == amina.user_id).delete()
+        # Deleted through the session, not query().delete(), so the flush
+        # hooks keep table_counters in step
+        for job in jobs:
+            session.delete(job)
         session.commit()
-        print(f"\nDeleted {deleted} job(s)")
+        print(f"\nDeleted {len(jobs)} job(s)")
 
 
 def delete_4_2_members_on_kabanbay_batyr(session):
     print(f"4.2 DELETE: Members on Kabanbay Batyr street")
 
-    members = session.query(User.user_id, User.given_name, User.surname, Address.street, Address.town) \
-        .join(Member, User.user_id == Member.member_user_id) \
-        .join(Address, Member.member_user_id == Address.member_user_id) \
-        .filter(Address.street == 'Kabanbay Batyr').all()
+    members = session.query(User.user_id, User.given_name, User.surname, Address.street_address, Address.city) \
+        .join(Member, User.user_id == Member.user_id) \
+        .join(Address, Member.user_id == Address.user_id) \
+        .filter(Address.street_address.like('Kabanbay Batyr%')).all()
 
     print("\nMembers before deletion:")
     print_results(['ID', 'Name', 'Street', 'Town'],
@@ -85,9 +89,13 @@ def delete_4_2_members_on_kabanbay_batyr(session):
 
     if members:
         member_ids = [m[0] for m in members]
-        deleted = session.query(Member).filter(Member.member_user_id.in_(member_ids)).delete(synchronize_session=False)
+        # Through the session, so the members' cascaded jobs and appointments
+        # also leave table_counters and the earnings rollups
+        to_delete = session.query(Member).filter(Member.user_id.in_(member_ids)).all()
+        for member in to_delete:
+            session.delete(member)
         session.commit()
-        print(f"\nDeleted {deleted} member(s)")
+        print(f"\nDeleted {len(to_delete)} member(s)")
 
 
 # 5. SIMPLE QUERIES
@@ -100,10 +108,10 @@ def query_5_1_accepted_appointments(session):
                um.given_name || ' ' || um.surname AS member_name,
                a.status, a.appointment_date
         FROM appointments a
-        JOIN caregivers c ON a.caregiver_user_id = c.caregiver_user_id
-        JOIN users uc ON c.caregiver_user_id = uc.user_id
-        JOIN members m ON a.member_user_id = m.member_user_id
-        JOIN users um ON m.member_user_id = um.user_id
+        JOIN caregivers c ON a.caregiver_id = c.caregiver_id
+        JOIN users uc ON c.user_id = uc.user_id
+        JOIN members m ON a.member_id = m.member_id
+        JOIN users um ON m.user_id = um.user_id
         WHERE a.status IN ('confirmed', 'completed')
         ORDER BY a.appointment_id
     """)).fetchall()
@@ -114,11 +122,10 @@ def query_5_1_accepted_appointments(session):
 def query_5_2_jobs_with_soft_spoken(session):
     print(f"5.2 SELECT: Jobs with 'soft-spoken'")
 
-    results = session.query(Job.job_id, Job.required_caregiving_type, Job.other_requirements) \
-        .filter(Job.other_requirements.like('%soft-spoken%')).all()
+    results = text_search.search(session, '"soft-spoken"', field='requirements', limit=None)
 
     print_results(['Job ID', 'Type', 'Requirements'],
-                  [[r[0], r[1], r[2][:60] + '...'] for r in results])
+                  [[r['job_id'], r['required_caregiving_type'], r['other_requirements'][:60] + '...'] for r in results])
 
 
 def query_5_3_babysitter_work_hours(session):
@@ -128,23 +135,20 @@ def query_5_3_babysitter_work_hours(session):
         .filter(Job.required_caregiving_type == 'babysitter').all()
 
     print_results(['Job ID', 'Type', 'Requirements'],
-                  [[r[0], r[1], r[2][:70] + '...'] for r in results])
+                  [[r[0], r[1], (r[2] or '')[:70] + '...'] for r in results])
 
 
 def query_5_4_elderly_care_astana_no_pets(session):
     print(f"5.4 SELECT: Elderly Care in Astana with 'No pets'")
 
-    results = session.query(User.user_id, User.given_name, User.surname, User.city,
-                            Member.house_rules, Job.required_caregiving_type) \
-        .join(Member, User.user_id == Member.member_user_id) \
-        .join(Job, Member.member_user_id == Job.member_user_id) \
-        .filter(and_(User.city == 'Astana',
-                     Job.required_caregiving_type == 'elderly_care',
-                     Member.house_rules.like('%No pets%'))) \
-        .distinct().all()
+    results = text_search.search(session, '"No pets"', caregiving_type='elderly_care', city='Astana',
+                                 field='house_rules', limit=None)
+    # Every match, one row per member (a member may post several such jobs)
+    members = {r['member_id']: r for r in results}
 
     print_results(['ID', 'Name', 'City', 'House Rules', 'Seeking'],
-                  [[r[0], f"{r[1]} {r[2]}", r[3], r[4][:50] + '...', r[5]] for r in results])
+                  [[r['member_id'], r['member_name'], r['city'], r['house_rules'][:50] + '...',
+                    r['required_caregiving_type']] for r in members.values()])
 
 
 
@@ -153,104 +157,93 @@ def query_6_1_applicants_per_job(session):
     print(f"6.1 COMPLEX: Applicants per job (JOIN + Aggregation)")
 
     results = session.query(Job.job_id,
-                            func.concat(User.given_name, ' ', User.surname).label('member'),
+                            (User.given_name + ' ' + User.surname).label('member'),
                             Job.required_caregiving_type,
-                            func.count(JobApplication.caregiver_user_id).label('applicants')) \
-        .join(Member, Job.member_user_id == Member.member_user_id) \
-        .join(User, Member.member_user_id == User.user_id) \
+                            func.count(JobApplication.caregiver_id).label('applicants')) \
+        .join(Member, Job.member_id == Member.member_id) \
+        .join(User, Member.user_id == User.user_id) \
         .outerjoin(JobApplication, Job.job_id == JobApplication.job_id) \
         .group_by(Job.job_id, User.given_name, User.surname, Job.required_caregiving_type) \
-        .order_by(func.count(JobApplication.caregiver_user_id).desc()).all()
+        .order_by(func.count(JobApplication.caregiver_id).desc(), Job.job_id).all()
 
     print_results(['Job ID', 'Posted By', 'Type', 'Applicants'], results)
 
 
+def _caregiver_totals(session, order_by, having=None):
+    # Per-caregiver totals from the monthly rollups (see rollups.py)
+    totals = rollups.caregiver_totals().subquery()
+    query = session.query(Caregiver.caregiver_id, User.given_name, User.surname, Caregiver.caregiving_type,
+                          Caregiver.hourly_rate, totals.c.appointments, totals.c.hours, totals.c.earnings) \
+        .join(totals, totals.c.caregiver_id == Caregiver.caregiver_id) \
+        .join(User, Caregiver.user_id == User.user_id)
+    if having is not None:
+        query = query.filter(having(totals))
+    return query.order_by(order_by(totals).desc(), Caregiver.caregiver_id).all()
+
+
 def query_6_2_total_hours_by_caregivers(session):
     print(f"6.2 COMPLEX: Total hours by caregivers")
 
-    results = session.query(Caregiver.caregiver_user_id,
-                            func.concat(User.given_name, ' ', User.surname).label('name'),
-                            Caregiver.caregiving_type,
-                            func.sum(Appointment.work_hours).label('total_hours')) \
-        .join(User, Caregiver.caregiver_user_id == User.user_id) \
-        .join(Appointment, Caregiver.caregiver_user_id == Appointment.caregiver_user_id) \
-        .filter(or_(Appointment.status == 'confirmed', Appointment.status == 'completed')) \
-        .group_by(Caregiver.caregiver_user_id, User.given_name, User.surname, Caregiver.caregiving_type) \
-        .order_by(func.sum(Appointment.work_hours).desc()).all()
+    results = _caregiver_totals(session, lambda t: t.c.hours)
 
     print_results(['ID', 'Name', 'Type', 'Total Hours'],
-                  [[r[0], r[1], r[2], f"{float(r[3]):.2f}"] for r in results])
+                  [[r[0], f"{r[1]} {r[2]}", r[3], f"{float(r[6]):.2f}"] for r in results])
 
 
 def query_6_3_average_pay_by_caregiver(session):
     print(f"6.3 COMPLEX: Average pay per caregiver")
 
-    results = session.query(Caregiver.caregiver_user_id,
-                            func.concat(User.given_name, ' ', User.surname).label('name'),
-                            Caregiver.hourly_rate,
-                            func.avg(Caregiver.hourly_rate * Appointment.work_hours).label('avg_pay')) \
-        .join(User, Caregiver.caregiver_user_id == User.user_id) \
-        .join(Appointment, Caregiver.caregiver_user_id == Appointment.caregiver_user_id) \
-        .filter(or_(Appointment.status == 'confirmed', Appointment.status == 'completed')) \
-        .group_by(Caregiver.caregiver_user_id, User.given_name, User.surname, Caregiver.hourly_rate) \
-        .order_by(func.avg(Caregiver.hourly_rate * Appointment.work_hours).desc()).all()
+    results = _caregiver_totals(session, lambda t: t.c.earnings / t.c.appointments)
 
     print_results(['ID', 'Name', 'Rate', 'Avg Pay/Appointment'],
-                  [[r[0], r[1], f"${float(r[2]):.2f}", f"${float(r[3]):.2f}"] for r in results])
+                  [[r[0], f"{r[1]} {r[2]}", f"${float(r[4]):.2f}", f"${float(r[7]) / r[5]:.2f}"] for r in results])
 
 
 def query_6_4_caregivers_earning_above_average(session):
     print(f"6.4 COMPLEX: Caregivers earning above average (Nested)")
 
-    avg_earnings = session.query(func.avg(Caregiver.hourly_rate * Appointment.work_hours)) \
-        .join(Appointment, Caregiver.caregiver_user_id == Appointment.caregiver_user_id) \
-        .filter(or_(Appointment.status == 'confirmed', Appointment.status == 'completed')) \
-        .scalar()
-
-    print(f"\nOverall average: ${float(avg_earnings):.2f}")
+    # Average pay per appointment, computed once and reused as the threshold
+    total_earnings, total_appointments = session.query(func.sum(CaregiverMonthlyRollup.earnings),
+                                                       func.sum(CaregiverMonthlyRollup.appointment_count)) \
+        .join(Caregiver, CaregiverMonthlyRollup.caregiver_id == Caregiver.caregiver_id).one()
+    if not total_appointments:
+        print_results([], [])
+        return
+    avg_earnings = float(total_earnings) / total_appointments
 
-    avg_subq = session.query(func.avg(Caregiver.hourly_rate * Appointment.work_hours)) \
-        .join(Appointment, Caregiver.caregiver_user_id == Appointment.caregiver_user_id) \
-        .filter(or_(Appointment.status == 'confirmed', Appointment.status == 'completed')) \
-        .scalar_subquery()
+    print(f"\nOverall average: ${avg_earnings:.2f}")
 
-    results = session.query(Caregiver.caregiver_user_id,
-                            func.concat(User.given_name, ' ', User.surname).label('name'),
-                            Caregiver.hourly_rate,
-                            func.sum(Caregiver.hourly_rate * Appointment.work_hours).label('total')) \
-        .join(User, Caregiver.caregiver_user_id == User.user_id) \
-        .join(Appointment, Caregiver.caregiver_user_id == Appointment.caregiver_user_id) \
-        .filter(or_(Appointment.status == 'confirmed', Appointment.status == 'completed')) \
-        .group_by(Caregiver.caregiver_user_id, User.given_name, User.surname, Caregiver.hourly_rate) \
-        .having(func.sum(Caregiver.hourly_rate * Appointment.work_hours) > avg_subq) \
-        .order_by(func.sum(Caregiver.hourly_rate * Appointment.work_hours).desc()).all()
+    results = _caregiver_totals(session, lambda t: t.c.earnings, lambda t: t.c.earnings > avg_earnings)
 
     print_results(['ID', 'Name', 'Rate', 'Total Earnings'],
-                  [[r[0], r[1], f"${float(r[2]):.2f}", f"${float(r[3]):.2f}"] for r in results])
+                  [[r[0], f"{r[1]} {r[2]}", f"${float(r[4]):.2f}", f"${float(r[7]):.2f}"] for r in results])
 
 
 # 7. DERIVED ATTRIBUTE
 
-def query_7_total_cost_for_appointments(session):
+def query_7_total_cost_for_appointments(session, limit=None):
     print(f"7. DERIVED ATTRIBUTE: Total cost per appointment")
 
     results = session.query(Appointment.appointment_id,
-                            func.concat(User.given_name, ' ', User.surname).label('caregiver'),
+                            User.given_name, User.surname,
                             Caregiver.hourly_rate,
                             Appointment.work_hours,
                             (Caregiver.hourly_rate * Appointment.work_hours).label('total_cost'),
                             Appointment.status) \
-        .join(Caregiver, Appointment.caregiver_user_id == Caregiver.caregiver_user_id) \
-        .join(User, Caregiver.caregiver_user_id == User.user_id) \
-        .filter(or_(Appointment.status == 'confirmed', Appointment.status == 'completed')) \
-        .order_by(Appointment.appointment_id).all()
+        .join(Caregiver, Appointment.caregiver_id == Caregiver.caregiver_id) \
+        .join(User, Caregiver.user_id == User.user_id) \
+        .filter(Appointment.status.in_(rollups.BILLABLE_STATUSES)) \
+        .order_by(Appointment.appointment_id).limit(limit).all()
 
     print_results(['ID', 'Caregiver', 'Rate', 'Hours', 'Total Cost', 'Status'],
-                  [[r[0], r[1], f"${float(r[2]):.2f}", f"{float(r[3]):.2f}h",
-                    f"${float(r[4]):.2f}", r[5]] for r in results])
+                  [[r[0], f"{r[1]} {r[2]}", f"${float(r[3]):.2f}", f"{float(r[4]):.2f}h",
+                    f"${float(r[5]):.2f}", r[6]] for r in results],
+                  f"First {limit} billable appointments" if limit is not None else "")
 
-    grand_total = sum([float(r[4]) for r in results])
-    print(f"\nGrand Total: ${grand_total:.2f}")
+    # The grand total covers every billable appointment, from the rollups
+    grand_total = session.query(func.sum(CaregiverMonthlyRollup.earnings)) \
+        .join(Caregiver, CaregiverMonthlyRollup.caregiver_id == Caregiver.caregiver_id).scalar() or 0
+    print(f"\nGrand Total: ${float(grand_total):.2f}")
 
 
 # 8. VIEW OPERATION
@@ -261,15 +254,15 @@ def query_8_view_job_applications(session):
     results = session.execute(text("""
         SELECT ja.job_id, j.required_caregiving_type,
                um.given_name || ' ' || um.surname AS posted_by,
-               ja.caregiver_user_id,
+               ja.caregiver_id,
                uc.given_name || ' ' || uc.surname AS applicant,
                c.caregiving_type, c.hourly_rate, ja.date_applied
         FROM job_applications ja
         JOIN jobs j ON ja.job_id = j.job_id
-        JOIN members m ON j.member_user_id = m.member_user_id
-        JOIN users um ON m.member_user_id = um.user_id
-        JOIN caregivers c ON ja.caregiver_user_id = c.caregiver_user_id
-        JOIN users uc ON c.caregiver_user_id = uc.user_id
+        JOIN members m ON j.member_id = m.member_id
+        JOIN users um ON m.user_id = um.user_id
+        JOIN caregivers c ON ja.caregiver_id = c.caregiver_id
+        JOIN users uc ON c.user_id = uc.user_id
         ORDER BY ja.job_id, ja.date_applied
     """)).fetchall()
 
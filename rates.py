@@ -0,0 +1,110 @@
+# Bulk hourly rate adjustment.
+#
+# Rates below `threshold` get a flat amount added, the rest are raised by a
+# percentage (the platform commission from query 3.2: +$0.30 under $10, +10%
+# otherwise). The change runs as a single UPDATE ... SET hourly_rate = CASE
+# ... END in the database, optionally limited to one caregiving type and/or
+# the caregivers living in one city. A dry run returns what would change as
+# one aggregate row instead of listing the caregivers.
+#
+#   python rates.py --dry-run --type Babysitter --city Astana
+#   python rates.py --threshold 10 --flat 0.30 --percent 10
+
+import argparse
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+from models import User, Caregiver
+import changes
+import rollups
+
+DEFAULT_THRESHOLD = 10.0
+DEFAULT_FLAT = 0.30
+DEFAULT_PERCENT = 10.0
+
+
+def new_rate(threshold=DEFAULT_THRESHOLD, flat=DEFAULT_FLAT, percent=DEFAULT_PERCENT):
+    return case((Caregiver.hourly_rate < threshold, Caregiver.hourly_rate + flat),
+                else_=Caregiver.hourly_rate * (1 + percent / 100.0))
+
+
+def _filters(caregiving_type=None, city=None):
+    conditions = []
+    if caregiving_type:
+        conditions.append(Caregiver.caregiving_type == caregiving_type)
+    if city:
+        conditions.append(Caregiver.user_id.in_(select(User.user_id).where(User.city == city)))
+    return conditions
+
+
+def preview(db: Session, threshold=DEFAULT_THRESHOLD, flat=DEFAULT_FLAT, percent=DEFAULT_PERCENT,
+            caregiving_type=None, city=None):
+    rate = new_rate(threshold, flat, percent)
+    row = db.execute(select(
+        func.count(),
+        func.sum(case((Caregiver.hourly_rate < threshold, 1), else_=0)),
+        func.min(Caregiver.hourly_rate), func.avg(Caregiver.hourly_rate), func.max(Caregiver.hourly_rate),
+        func.min(rate), func.avg(rate), func.max(rate),
+    ).where(*_filters(caregiving_type, city))).one()
+    count, flat_count = row[0], row[1] or 0
+    return {
+        "caregivers": count,
+        "flat_increase": flat_count,
+        "percent_increase": count - flat_count,
+        "current": _stats(row[2:5]),
+        "adjusted": _stats(row[5:8]),
+    }
+
+
+def _stats(values):
+    low, mean, high = values
+    return {"min": _round(low), "avg": _round(mean), "max": _round(high)}
+
+
+def _round(value):
+    return round(float(value), 2) if value is not None else None
+
+
+def apply(db: Session, threshold=DEFAULT_THRESHOLD, flat=DEFAULT_FLAT, percent=DEFAULT_PERCENT,
+          caregiving_type=None, city=None):
+    stmt = (update(Caregiver)
+            .where(*_filters(caregiving_type, city))
+            .values(hourly_rate=new_rate(threshold, flat, percent))
+            .execution_options(synchronize_session=False))
+    updated = db.execute(stmt).rowcount
+    rollups.reprice(db.connection(), select(Caregiver.caregiver_id).where(*_filters(caregiving_type, city)))
+    db.commit()
+    # The UPDATE bypasses the unit of work, so tell the caches directly.
+    changes.notify({"caregivers": None})
+    return updated
+
+
+def adjust(db: Session, dry_run=False, **options):
+    if dry_run:
+        return {"dry_run": True, **preview(db, **options)}
+    return {"dry_run": False, "updated": apply(db, **options)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adjust caregiver hourly rates in one UPDATE")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="rates below this get the flat increase")
+    parser.add_argument("--flat", type=float, default=DEFAULT_FLAT, help="amount added below the threshold")
+    parser.add_argument("--percent", type=float, default=DEFAULT_PERCENT, help="increase at or above it, in %%")
+    parser.add_argument("--type", dest="caregiving_type", help="only this caregiving type")
+    parser.add_argument("--city", help="only caregivers living in this city")
+    parser.add_argument("--dry-run", action="store_true", help="show the effect without changing anything")
+    args = parser.parse_args()
+
+    from db import get_session, close_session
+    session = get_session()
+    try:
+        result = adjust(session, args.dry_run, threshold=args.threshold, flat=args.flat, percent=args.percent,
+                        caregiving_type=args.caregiving_type, city=args.city)
+    finally:
+        close_session(session)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
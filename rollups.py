@@ -0,0 +1,192 @@
+# Per-caregiver, per-month totals of billable appointments for the reports.
+#
+# caregiver_monthly_rollups holds appointment count, hours and earnings
+# (hours * the caregiver's current hourly rate) for confirmed and completed
+# appointments. Every ORM flush applies the difference each inserted, updated
+# or deleted appointment makes to its (caregiver, month) row, in the same
+# transaction, and re-prices a caregiver's rows when their rate changes. The
+# reports in queries.py aggregate these rows instead of the appointments
+# table. Writes that bypass the ORM either call reprice() (rates.py) or
+# add_inserted() (crud.py's batch creates), or are followed by rebuild()
+# (bulk_load.py, `python rollups.py`).
+
+from collections import defaultdict
+from sqlalchemy import bindparam, cast, delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import Caregiver, Appointment, CaregiverMonthlyRollup as Rollup
+
+BILLABLE_STATUSES = ("confirmed", "completed")
+
+_FIELDS = ("caregiver_id", "appointment_date", "work_hours", "status")
+
+
+def _rate(caregiver_id):
+    return func.coalesce(select(Caregiver.hourly_rate)
+                         .where(Caregiver.caregiver_id == caregiver_id).scalar_subquery(), 0)
+
+
+def _contribution(caregiver_id, appointment_date, work_hours, status):
+    if status not in BILLABLE_STATUSES or caregiver_id is None or appointment_date is None:
+        return None
+    return (caregiver_id, appointment_date.replace(day=1)), work_hours or 0.0
+
+
+def _values_before_flush(state):
+    values = []
+    for key in _FIELDS:
+        history = state.attrs[key].history
+        values.append((history.deleted or history.unchanged or history.added or [None])[0])
+    return values
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_deltas(session, flush_context):
+    deltas = defaultdict(lambda: [0, 0.0])  # (caregiver_id, month) -> [appointments, hours]
+    repriced = set()
+
+    def add(contribution, sign):
+        if contribution:
+            key, hours = contribution
+            deltas[key][0] += sign
+            deltas[key][1] += sign * hours
+
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            add(_contribution(*(getattr(obj, key) for key in _FIELDS)), 1)
+    for obj in session.dirty:
+        if isinstance(obj, Appointment) and session.is_modified(obj, include_collections=False):
+            add(_contribution(*_values_before_flush(inspect(obj))), -1)
+            add(_contribution(*(getattr(obj, key) for key in _FIELDS)), 1)
+        elif isinstance(obj, Caregiver) and inspect(obj).attrs.hourly_rate.history.has_changes():
+            repriced.add(obj.caregiver_id)
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            add(_contribution(*_values_before_flush(inspect(obj))), -1)
+
+    if not deltas and not repriced:
+        return
+    connection = session.connection()
+    decrements = []
+    for (caregiver_id, month), (count, hours) in deltas.items():
+        if count > 0:
+            _apply(connection, caregiver_id, month, count, hours)
+        elif count or hours:
+            decrements.append({"cid": caregiver_id, "m": month, "count": count, "hours": hours})
+    if decrements:
+        # Rows only lose appointments here (e.g. a cascading delete), so they
+        # already exist: one executemany instead of an UPDATE per month.
+        connection.execute(_decrement, decrements)
+    if repriced:
+        reprice(connection, repriced)
+
+
+_decrement = (update(Rollup)
+              .where(Rollup.caregiver_id == bindparam("cid"), Rollup.month == bindparam("m"))
+              .values(appointment_count=Rollup.appointment_count + bindparam("count"),
+                      hours=Rollup.hours + bindparam("hours"),
+                      earnings=Rollup.earnings + bindparam("hours") * _rate(bindparam("cid"))))
+
+
+def _apply(connection, caregiver_id, month, count, hours):
+    earnings = hours * _rate(caregiver_id)
+    updated = connection.execute(
+        update(Rollup)
+        .where(Rollup.caregiver_id == caregiver_id, Rollup.month == month)
+        .values(appointment_count=Rollup.appointment_count + count, hours=Rollup.hours + hours,
+                earnings=Rollup.earnings + earnings)
+    ).rowcount
+    if updated or count <= 0:
+        return
+    values = {"caregiver_id": caregiver_id, "month": month, "appointment_count": count, "hours": hours,
+              "earnings": earnings}
+    dialect = _UPSERT_DIALECTS.get(connection.dialect.name)
+    if dialect is None:
+        connection.execute(insert(Rollup).values(**values))
+        return
+    # Another transaction may have created the row since our UPDATE.
+    connection.execute(_upsert(dialect.insert(Rollup).values(**values)))
+
+
+_UPSERT_DIALECTS = {"postgresql": postgresql, "sqlite": sqlite}
+
+
+def _upsert(stmt):
+    return stmt.on_conflict_do_update(
+        index_elements=[Rollup.caregiver_id, Rollup.month],
+        set_={"appointment_count": Rollup.appointment_count + stmt.excluded.appointment_count,
+              "hours": Rollup.hours + stmt.excluded.hours,
+              "earnings": Rollup.earnings + stmt.excluded.earnings},
+    )
+
+
+def add_inserted(connection, appointments):
+    # Adds appointments inserted without the ORM (crud's batch creates), given
+    # as dicts of their columns: one executemany upsert over the
+    # (caregiver, month) rows they touch instead of a statement per month.
+    deltas = defaultdict(lambda: [0, 0.0])
+    for appointment in appointments:
+        contribution = _contribution(*(appointment[key] for key in _FIELDS))
+        if contribution:
+            key, hours = contribution
+            deltas[key][0] += 1
+            deltas[key][1] += hours
+    if not deltas:
+        return
+    dialect = _UPSERT_DIALECTS.get(connection.dialect.name)
+    if dialect is None:
+        for (caregiver_id, month), (count, hours) in deltas.items():
+            _apply(connection, caregiver_id, month, count, hours)
+        return
+    stmt = dialect.insert(Rollup).values(caregiver_id=bindparam("cid"), month=bindparam("m"),
+                                         appointment_count=bindparam("count"), hours=bindparam("h"),
+                                         earnings=bindparam("h") * _rate(bindparam("cid")))
+    connection.execute(_upsert(stmt), [{"cid": caregiver_id, "m": month, "count": count, "h": hours}
+                                       for (caregiver_id, month), (count, hours) in deltas.items()])
+
+
+def reprice(connection, caregiver_ids):
+    # caregiver_ids: an iterable of ids or a SELECT of caregiver ids
+    connection.execute(
+        update(Rollup)
+        .where(Rollup.caregiver_id.in_(caregiver_ids))
+        .values(earnings=Rollup.hours * _rate(Rollup.caregiver_id))
+    )
+
+
+def _month(column, dialect_name):
+    if dialect_name == "postgresql":
+        return cast(func.date_trunc("month", column), Rollup.month.type)
+    return func.date(column, "start of month")
+
+
+def rebuild(db: Session):
+    month = _month(Appointment.appointment_date, db.get_bind().dialect.name).label("month")
+    totals = (select(Appointment.caregiver_id, month, func.count(), func.sum(Appointment.work_hours),
+                     func.sum(Appointment.work_hours) * Caregiver.hourly_rate)
+              .join(Caregiver, Appointment.caregiver_id == Caregiver.caregiver_id)
+              .where(Appointment.status.in_(BILLABLE_STATUSES))
+              .group_by(Appointment.caregiver_id, month, Caregiver.hourly_rate))
+    db.execute(delete(Rollup))
+    db.execute(insert(Rollup).from_select(
+        ["caregiver_id", "month", "appointment_count", "hours", "earnings"], totals))
+    db.commit()
+    return db.execute(select(func.count()).select_from(Rollup)).scalar()
+
+
+def caregiver_totals():
+    # One row per caregiver: (caregiver_id, appointments, hours, earnings)
+    return (select(Rollup.caregiver_id, func.sum(Rollup.appointment_count).label("appointments"),
+                   func.sum(Rollup.hours).label("hours"), func.sum(Rollup.earnings).label("earnings"))
+            .where(Rollup.appointment_count > 0)
+            .group_by(Rollup.caregiver_id))
+
+
+if __name__ == "__main__":
+    from db import get_session, close_session
+
+    session = get_session()
+    try:
+        print(f"Rebuilt {rebuild(session)} caregiver month rows")
+    finally:
+        close_session(session)
@@ -0,0 +1,308 @@
+# Caregiver availability: appointment windows, double-booking checks and
+# free-slot lookups.
+#
+# Every appointment covers [starts_at, ends_at). Cancelled appointments don't
+# occupy their window. On PostgreSQL the ex_appointments_caregiver_overlap
+# exclusion constraint (models.py) is the authoritative guard; in front of it,
+# and as the only guard on other backends, each caregiver's booked windows are
+# kept in process as a list sorted by start time. A schedule is read with one
+# query on ix_appointments_caregiver_starts_at the first time the caregiver is
+# needed, dropped whenever a committed write touches one of their
+# appointments, and expires after SCHEDULE_CACHE_TTL seconds so changes made by
+# other worker processes are picked up.
+#
+#   python schedule.py --backfill   # fill starts_at/ends_at on existing rows
+
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Appointment
+import changes
+
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", 10000))
+SCHEDULE_CACHE_TTL = float(os.getenv("SCHEDULE_CACHE_TTL", 60))
+MAX_FREE_SLOT_DAYS = 62
+MAX_WORK_HOURS = 24
+
+OVERLAP_CONSTRAINT = "ex_appointments_caregiver_overlap"
+TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M%p", "%I %p")
+
+
+class AppointmentConflict(Exception):
+    def __init__(self, caregiver_id, starts_at, ends_at, appointment_id=None):
+        self.caregiver_id = caregiver_id
+        self.appointment_id = appointment_id
+        clash = f" with appointment {appointment_id}" if appointment_id else ""
+        super().__init__(f"Caregiver {caregiver_id} is already booked between "
+                         f"{starts_at:%Y-%m-%d %H:%M} and {ends_at:%Y-%m-%d %H:%M}{clash}")
+
+
+@lru_cache(maxsize=1024)
+def parse_time(value):
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value.strip().upper(), fmt).time()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised appointment time: {value!r}")
+
+
+def appointment_window(appointment_date, appointment_time, work_hours):
+    if isinstance(appointment_date, str):
+        appointment_date = date.fromisoformat(appointment_date)
+    # Also rejects NaN and infinity, which timedelta can't take
+    if work_hours is None or not 0 < work_hours <= MAX_WORK_HOURS:
+        raise ValueError(f"work_hours must be more than 0 and at most {MAX_WORK_HOURS}")
+    starts_at = datetime.combine(appointment_date, parse_time(appointment_time))
+    try:
+        return starts_at, starts_at + timedelta(hours=work_hours)
+    except OverflowError:
+        raise ValueError(f"Appointment on {appointment_date} ends past the last supported date")
+
+
+def blocks_schedule(status):
+    return status != "cancelled"
+
+
+class CaregiverSchedule:
+    def __init__(self, rows, loaded_at):
+        # rows are (starts_at, ends_at, appointment_id) sorted by starts_at
+        self.intervals = list(rows)
+        self.starts = [r[0] for r in self.intervals]
+        self.loaded_at = loaded_at
+        # Legacy rows may overlap, so a lookup can't stop at the nearest
+        # predecessor; it walks back until no earlier interval is long enough.
+        self.longest = max((r[1] - r[0] for r in self.intervals), default=timedelta(0))
+
+    def overlapping(self, starts_at, ends_at, exclude_id=None):
+        i = bisect.bisect_left(self.starts, ends_at) - 1
+        while i >= 0 and self.starts[i] + self.longest > starts_at:
+            start, end, appointment_id = self.intervals[i]
+            if end > starts_at and appointment_id != exclude_id:
+                return appointment_id
+            i -= 1
+        return None
+
+    def booked(self, range_start, range_end):
+        i = bisect.bisect_left(self.starts, range_start - self.longest)
+        j = bisect.bisect_left(self.starts, range_end)
+        return [r for r in self.intervals[i:j] if r[1] > range_start]
+
+
+_schedules = OrderedDict()  # caregiver_id -> CaregiverSchedule, least recently used first
+_lock = threading.Lock()
+_generation = 0
+# Writers for the same caregiver are serialized from check to commit.
+_write_locks = [threading.Lock() for _ in range(64)]
+
+
+def get_schedule(db: Session, caregiver_id: int):
+    return get_schedules(db, [caregiver_id])[caregiver_id]
+
+
+def get_schedules(db: Session, caregiver_ids):
+    # caregiver_id -> CaregiverSchedule; the ones not cached are read in one query
+    now = time.monotonic()
+    schedules = {}
+    with _lock:
+        for caregiver_id in caregiver_ids:
+            schedule = _schedules.get(caregiver_id)
+            if schedule and schedule.loaded_at + SCHEDULE_CACHE_TTL > now:
+                _schedules.move_to_end(caregiver_id)
+                schedules[caregiver_id] = schedule
+        generation = _generation
+    missing = [caregiver_id for caregiver_id in dict.fromkeys(caregiver_ids) if caregiver_id not in schedules]
+    if not missing:
+        return schedules
+
+    rows = defaultdict(list)
+    for caregiver_id, *row in db.execute(
+            select(Appointment.caregiver_id, Appointment.starts_at, Appointment.ends_at, Appointment.appointment_id)
+            .where(Appointment.caregiver_id.in_(missing) if len(missing) > 1 else
+                   Appointment.caregiver_id == missing[0],
+                   Appointment.starts_at.isnot(None),
+                   Appointment.status != "cancelled")
+            .order_by(Appointment.caregiver_id, Appointment.starts_at)):
+        rows[caregiver_id].append(tuple(row))
+    loaded = {caregiver_id: CaregiverSchedule(rows[caregiver_id], now) for caregiver_id in missing}
+    with _lock:
+        # Don't keep schedules that a concurrent commit has already invalidated.
+        if generation == _generation:
+            for caregiver_id, schedule in loaded.items():
+                _schedules[caregiver_id] = schedule
+                _schedules.move_to_end(caregiver_id)
+            while len(_schedules) > SCHEDULE_CACHE_SIZE:
+                _schedules.popitem(last=False)
+    schedules.update(loaded)
+    return schedules
+
+
+def find_conflict(db: Session, caregiver_id: int, starts_at, ends_at, exclude_id=None):
+    return get_schedule(db, caregiver_id).overlapping(starts_at, ends_at, exclude_id)
+
+
+@contextmanager
+def booking(db: Session, caregiver_id, starts_at, ends_at, status, exclude_id=None):
+    # Wrap the flush/commit of a new or moved appointment. Raises
+    # AppointmentConflict before the write if the window is taken, or after it
+    # if the database constraint caught a booking made elsewhere.
+    with _write_locks[caregiver_id % len(_write_locks)]:
+        if blocks_schedule(status):
+            clash = find_conflict(db, caregiver_id, starts_at, ends_at, exclude_id)
+            if clash is not None:
+                raise AppointmentConflict(caregiver_id, starts_at, ends_at, clash)
+        try:
+            yield
+        except IntegrityError as e:
+            db.rollback()
+            if OVERLAP_CONSTRAINT in str(e.orig):
+                invalidate(caregiver_id)
+                raise AppointmentConflict(caregiver_id, starts_at, ends_at) from e
+            raise
+
+
+@contextmanager
+def batch_booking(db: Session, bookings):
+    # Checks many new appointments at once. bookings is a list of
+    # (caregiver_id, starts_at, ends_at, status); yields a list holding None or
+    # the AppointmentConflict of each, where a booking also conflicts with an
+    # earlier one of the same batch. The caregivers stay locked until the block
+    # exits, so the caller inserts the bookings without a conflict and commits
+    # inside it.
+    locks = sorted({caregiver_id % len(_write_locks) for caregiver_id, _, _, _ in bookings})
+    with ExitStack() as stack:
+        for index in locks:  # always in the same order, so two batches can't deadlock
+            stack.enter_context(_write_locks[index])
+        blocking = [b for b in bookings if blocks_schedule(b[3])]
+        schedules = get_schedules(db, [caregiver_id for caregiver_id, _, _, _ in blocking]) if blocking else {}
+        accepted = defaultdict(list)  # caregiver_id -> windows taken earlier in this batch
+        conflicts = []
+        for caregiver_id, starts_at, ends_at, status in bookings:
+            conflict = None
+            if blocks_schedule(status):
+                clash = schedules[caregiver_id].overlapping(starts_at, ends_at)
+                if clash is not None or any(start < ends_at and end > starts_at
+                                            for start, end in accepted[caregiver_id]):
+                    conflict = AppointmentConflict(caregiver_id, starts_at, ends_at, clash)
+                else:
+                    accepted[caregiver_id].append((starts_at, ends_at))
+            conflicts.append(conflict)
+        yield conflicts
+
+
+def free_slots(db: Session, caregiver_id: int, start: date, end: date, day_start="08:00", day_end="20:00",
+               min_minutes=30):
+    # Open windows between day_start and day_end on each day from start to end
+    # inclusive, at least min_minutes long.
+    if end < start:
+        raise ValueError("end must not be before start")
+    if (end - start).days >= MAX_FREE_SLOT_DAYS:
+        raise ValueError(f"date range is limited to {MAX_FREE_SLOT_DAYS} days")
+    opens, closes = parse_time(day_start), parse_time(day_end)
+    if closes <= opens:
+        raise ValueError("day_end must be after day_start")
+    min_length = timedelta(minutes=min_minutes)
+
+    schedule = get_schedule(db, caregiver_id)
+    slots = []
+    day = start
+    while day <= end:
+        cursor, day_close = datetime.combine(day, opens), datetime.combine(day, closes)
+        for booked_start, booked_end, _ in schedule.booked(cursor, day_close):
+            if booked_start - cursor >= min_length:
+                slots.append((cursor, booked_start))
+            cursor = max(cursor, booked_end)
+        if day_close - cursor >= min_length:
+            slots.append((cursor, day_close))
+        day += timedelta(days=1)
+    return slots
+
+
+def invalidate(*caregiver_ids):
+    global _generation
+    with _lock:
+        _generation += 1
+        for caregiver_id in caregiver_ids or list(_schedules):
+            _schedules.pop(caregiver_id, None)
+
+
+@changes.subscribe
+def _on_commit(changed):
+    if "appointments" not in changed:
+        return
+    rows = changed["appointments"]
+    if rows is None or any("caregiver_id" not in row for row in rows.values()):
+        invalidate()
+        return
+    # An update that moved an appointment to another caregiver only reports
+    # the new owner; the old one catches up when its schedule expires.
+    invalidate(*{row["caregiver_id"] for row in rows.values()})
+
+
+def backfill(db: Session, batch_size=1000):
+    # Derive starts_at/ends_at for rows written before the columns existed.
+    filled, skipped, last_id = 0, 0, 0
+    while True:
+        rows = db.execute(select(Appointment.appointment_id, Appointment.appointment_date,
+                                 Appointment.appointment_time, Appointment.work_hours)
+                          .where(Appointment.starts_at.is_(None), Appointment.appointment_id > last_id)
+                          .order_by(Appointment.appointment_id).limit(batch_size)).all()
+        if not rows:
+            break
+        updates = []
+        for appointment_id, appointment_date, appointment_time, work_hours in rows:
+            try:
+                starts_at, ends_at = appointment_window(appointment_date, appointment_time, work_hours)
+            except ValueError as e:
+                print(f"Skipping appointment {appointment_id}: {e}")
+                skipped += 1
+                continue
+            updates.append({"appointment_id": appointment_id, "starts_at": starts_at, "ends_at": ends_at})
+        if updates:
+            db.bulk_update_mappings(Appointment, updates)
+        db.commit()
+        filled += len(updates)
+        last_id = rows[-1].appointment_id
+    changes.notify({"appointments": None})
+    return filled, skipped
+
+
+if __name__ == "__main__":
+    import sys
+    from sqlalchemy import inspect, text
+    from db import engine, SessionLocal
+
+    if "--backfill" not in sys.argv:
+        print("usage: python schedule.py --backfill")
+        sys.exit(1)
+    columns = {c["name"] for c in inspect(engine).get_columns("appointments")}
+    with engine.begin() as conn:
+        for name in ("starts_at", "ends_at"):
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE appointments ADD COLUMN {name} TIMESTAMP"))
+    with SessionLocal() as db:
+        filled, skipped = backfill(db)
+    print(f"Filled {filled} appointments, skipped {skipped}")
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.schema import AddConstraint, CreateIndex
+        table = Appointment.__table__
+        names = {i["name"] for i in inspect(engine).get_indexes("appointments")}
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+            for index in table.indexes:
+                if index.name not in names:
+                    conn.execute(CreateIndex(index))
+        try:
+            with engine.begin() as conn:
+                conn.execute(AddConstraint(next(c for c in table.constraints if c.name == OVERLAP_CONSTRAINT)))
+            print("Added the overlap constraint")
+        except Exception as e:
+            print(f"Could not add {OVERLAP_CONSTRAINT} (existing overlaps or already present): {e}")
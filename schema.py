@@ -0,0 +1,75 @@
+# Schema versions, managed by the Alembic migrations in migrations/.
+#
+#   alembic upgrade head                 # migrate the DATABASE_URL database
+#   alembic stamp 0001                   # adopt a database built by create_all before migrations
+#   alembic revision --autogenerate -m "..."
+#
+# Tables created by create_all (bulk_load.py and datagen.py --load into an
+# empty database, datagen.seed_database, the benchmarks) are stamped with the
+# head revision, since create_all builds the latest schema.
+
+import os
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def config(url):
+    cfg = Config(os.path.join(_ROOT, "alembic.ini"))
+    cfg.set_main_option("script_location", os.path.join(_ROOT, "migrations"))
+    cfg.attributes["url"] = url
+    cfg.attributes["configure_logger"] = False
+    return cfg
+
+
+def _url(engine):
+    return engine.url.render_as_string(hide_password=False)
+
+
+def head_revision():
+    return ScriptDirectory.from_config(config(None)).get_current_head()
+
+
+def current_revision(connection):
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+def stamp(engine, revision="head"):
+    command.stamp(config(_url(engine)), revision)
+
+
+def upgrade(engine, revision="head"):
+    command.upgrade(config(_url(engine)), revision)
+
+
+def downgrade(engine, revision):
+    command.downgrade(config(_url(engine)), revision)
+
+
+def check(engine, mode):
+    # Compare the database's revision with the migrations shipped with the
+    # code. mode: "warn" prints a mismatch, "require" raises, "upgrade" migrates.
+    head = head_revision()
+    try:
+        with engine.connect() as connection:
+            current = current_revision(connection)
+    except Exception as e:
+        if mode == "warn":
+            print(f"Schema check skipped, database unavailable: {e}")
+            return False
+        raise
+    if current == head:
+        return True
+    if mode == "upgrade":
+        print(f"Upgrading database schema {current or '(empty)'} -> {head}...")
+        upgrade(engine)
+        return True
+    message = (f"database schema is at revision {current or '(none)'}, the code expects {head}; "
+               f"run `alembic upgrade head`")
+    if mode == "require":
+        raise RuntimeError(message)
+    print(f"Warning: {message}")
+    return False
@@ -0,0 +1,196 @@
+# In-memory prefix index for the user/caregiver/member typeahead.
+#
+# Each entity keeps a sorted array of (token, id) pairs, where the tokens are
+# the lower-cased given name, surname and email of the underlying user, so a
+# prefix lookup is a bisect plus a short forward scan. Indexes are built in a
+# background thread on first use; until then searches fall back to a prefix
+# LIKE on the database (see the lower(...) indexes in models.py). Committed
+# writes queue the affected ids, which are re-read on the next search. Those
+# notifications only cover this process, so an index is also rebuilt in the
+# background every SEARCH_INDEX_TTL seconds (as OPTION_CACHE_TTL bounds the
+# dropdown lists) to pick up rows written by other workers; searches keep
+# using the current index meanwhile.
+
+import bisect
+import os
+import threading
+import time
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from models import User, Caregiver, Member
+import changes
+
+SEARCH_MAX_RESULTS = 50
+# Upper bound on index entries examined per query, so very short prefixes
+# ("a") stay fast on large tables.
+SEARCH_SCAN_LIMIT = int(os.getenv("SEARCH_SCAN_LIMIT", 5000))
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", 60))  # 0 disables the periodic rebuild
+
+# Each source yields (id, user_id, given_name, surname, email, detail).
+_SOURCES = {
+    "users": (User.user_id, select(User.user_id, User.user_id.label("owner_id"), User.given_name,
+                                   User.surname, User.email, User.email.label("detail"))),
+    "caregivers": (Caregiver.caregiver_id, select(Caregiver.caregiver_id, Caregiver.user_id, User.given_name,
+                                                  User.surname, User.email, Caregiver.caregiving_type)
+                   .join(User, Caregiver.user_id == User.user_id)),
+    "members": (Member.member_id, select(Member.member_id, Member.user_id, User.given_name, User.surname,
+                                         User.email, User.email.label("detail"))
+                .join(User, Member.user_id == User.user_id)),
+}
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.ready = False
+        self.building = False
+        self._keys = []        # sorted (token, id)
+        self._entries = {}     # id -> (name, detail, user_id, tokens)
+        self._by_user = {}     # user_id -> id
+        self._pending = set()  # ids to re-read before the next search
+        self._pending_users = set()  # user ids whose entity rows must be re-read
+        self._stale = False    # the whole index must be rebuilt
+        self._replay = set()   # ids re-read during a rebuild, re-read again once it swaps in
+        self.loaded_at = 0.0
+        self._lock = threading.RLock()
+
+    def load(self, rows):
+        started = time.monotonic()
+        keys, entries, by_user = [], {}, {}
+        for row in rows:
+            tokens = _tokens(row)
+            entries[row[0]] = (f"{row[2]} {row[3]}", row[5], row[1], tokens)
+            by_user[row[1]] = row[0]
+            keys.extend((token, row[0]) for token in tokens)
+        keys.sort()
+        with self._lock:
+            self._keys, self._entries, self._by_user = keys, entries, by_user
+            # Changes already applied to the old index may be missing from
+            # the rows just read
+            self._pending |= self._replay
+            self._replay = set()
+            self.ready, self.building, self.loaded_at = True, False, started
+
+    def put(self, row):
+        with self._lock:
+            self.remove(row[0])
+            tokens = _tokens(row)
+            self._entries[row[0]] = (f"{row[2]} {row[3]}", row[5], row[1], tokens)
+            self._by_user[row[1]] = row[0]
+            for token in tokens:
+                bisect.insort(self._keys, (token, row[0]))
+
+    def remove(self, entity_id):
+        with self._lock:
+            entry = self._entries.pop(entity_id, None)
+            if entry is None:
+                return
+            self._by_user.pop(entry[2], None)
+            for token in entry[3]:
+                i = bisect.bisect_left(self._keys, (token, entity_id))
+                if i < len(self._keys) and self._keys[i] == (token, entity_id):
+                    del self._keys[i]
+
+    def search(self, terms, limit):
+        # Probe with the longest term, then require every other term to
+        # prefix-match one of the candidate's tokens.
+        probe = max(terms, key=len)
+        others = [t for t in terms if t is not probe]
+        results, seen = [], set()
+        with self._lock:
+            keys = self._keys
+            i = bisect.bisect_left(keys, (probe,))
+            end = min(len(keys), i + SEARCH_SCAN_LIMIT)
+            while i < end and len(results) < limit and keys[i][0].startswith(probe):
+                entity_id = keys[i][1]
+                i += 1
+                if entity_id in seen:
+                    continue
+                seen.add(entity_id)
+                name, detail, _, tokens = self._entries[entity_id]
+                if all(any(tok.startswith(t) for tok in tokens) for t in others):
+                    results.append({"id": entity_id, "name": name, "detail": detail})
+        return results
+
+
+def _tokens(row):
+    return tuple({(value or "").lower() for value in (row[2], row[3], row[4]) if value})
+
+
+_indexes = {entity: PrefixIndex() for entity in _SOURCES}
+
+
+def search(db: Session, entity: str, query: str, limit: int = 10):
+    terms = query.lower().split()
+    if not terms:
+        return []
+    limit = min(limit, SEARCH_MAX_RESULTS)
+    index = _indexes[entity]
+
+    with index._lock:
+        if index._stale and not index.building:
+            index._stale = index.ready = False
+        expired = index.ready and SEARCH_INDEX_TTL > 0 and time.monotonic() - index.loaded_at > SEARCH_INDEX_TTL
+        if (expired or not index.ready) and not index.building:
+            index.building = True
+            index._replay = set()
+            threading.Thread(target=_build, args=(entity, db.get_bind()), daemon=True).start()
+        ready = index.ready
+        if ready:
+            pending = index._pending | {index._by_user[u] for u in index._pending_users if u in index._by_user}
+            index._pending, index._pending_users = set(), set()
+            if index.building:
+                index._replay |= pending
+
+    if not ready:
+        return _search_database(db, entity, terms, limit)
+    if pending:
+        _refresh(db, entity, pending)
+    return index.search(terms, limit)
+
+
+def _build(entity, bind):
+    index = _indexes[entity]
+    try:
+        with Session(bind=bind) as db:
+            index.load(db.execute(_SOURCES[entity][1]))
+    except Exception as e:
+        print(f"Building the {entity} search index failed: {e}")
+        with index._lock:
+            index.building = False
+            index._pending |= index._replay
+            index.loaded_at = time.monotonic()  # a periodic rebuild is retried after another TTL
+
+
+def _refresh(db, entity, ids):
+    index = _indexes[entity]
+    pk, query = _SOURCES[entity]
+    rows = {row[0]: row for row in db.execute(query.where(pk.in_(ids)))}
+    for entity_id in ids:
+        if entity_id in rows:
+            index.put(rows[entity_id])
+        else:
+            index.remove(entity_id)
+
+
+def _search_database(db, entity, terms, limit):
+    pk, query = _SOURCES[entity]
+    for term in terms:
+        pattern = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        query = query.where(or_(func.lower(User.given_name).like(pattern, escape="\\"),
+                                func.lower(User.surname).like(pattern, escape="\\"),
+                                func.lower(User.email).like(pattern, escape="\\")))
+    rows = db.execute(query.order_by(pk).limit(limit))
+    return [{"id": r[0], "name": f"{r[2]} {r[3]}", "detail": r[5]} for r in rows]
+
+
+@changes.subscribe
+def _on_commit(changed):
+    for entity, index in _indexes.items():
+        with index._lock:
+            if not (index.ready or index.building):
+                continue
+            if changed.get(entity, ()) is None or changed.get("users", ()) is None:
+                index._stale = True
+                continue
+            index._pending.update(changed.get(entity, ()))
+            index._pending_users.update(changed.get("users", ()))
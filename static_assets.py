@@ -0,0 +1,109 @@
+# Fingerprinted, precompressed static assets.
+#
+#   python static_assets.py            # build static/dist/ (run at deploy time)
+#
+# The build copies every file under static/ to static/dist/ under a name
+# carrying a hash of its content (style.css -> style.1a2b3c4d5e6f.css), next
+# to .br and .gz variants compressed at maximum quality, and writes
+# manifest.json mapping the source names to the fingerprinted ones. Templates
+# link assets with static_url("style.css"); a fingerprinted URL changes
+# whenever the file does, so it is served with a one-year immutable
+# Cache-Control and browsers never revalidate it. Without a build (in
+# development) static_url() returns the plain /static/ URL, which is sent with
+# Cache-Control: no-cache.
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import stat
+import brotli
+import anyio
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+from compression import negotiate
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST = "dist"
+MANIFEST = os.path.join(STATIC_DIR, DIST, "manifest.json")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Only text assets get .br/.gz variants; images and fonts are already compressed.
+PRECOMPRESSED_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+_manifest = None
+
+
+def _load_manifest():
+    global _manifest
+    try:
+        with open(MANIFEST) as f:
+            _manifest = json.load(f)
+    except FileNotFoundError:
+        _manifest = {}
+    return _manifest
+
+
+def static_url(name):
+    manifest = _manifest if _manifest is not None else _load_manifest()
+    return f"/static/{manifest.get(name, name)}"
+
+
+def build(static_dir=STATIC_DIR):
+    # Earlier builds are left in place: workers still running with the old
+    # manifest keep serving their pages' assets during a rolling deploy.
+    dist = os.path.join(static_dir, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for filename in sorted(files):
+            source = os.path.join(root, filename)
+            name = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                content = f.read()
+            stem, ext = os.path.splitext(name)
+            fingerprinted = f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+            target = os.path.join(dist, fingerprinted)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(content)
+            media_type = mimetypes.guess_type(name)[0] or ""
+            if media_type.startswith(PRECOMPRESSED_TYPES):
+                with open(target + ".br", "wb") as f:
+                    f.write(brotli.compress(content, quality=11))
+                with open(target + ".gz", "wb") as f:
+                    f.write(gzip.compress(content, compresslevel=9, mtime=0))
+            manifest[name] = f"{DIST}/{fingerprinted}"
+            print(f"{name} -> {manifest[name]} ({len(content)} bytes)")
+    manifest_path = os.path.join(dist, "manifest.json")
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+class StaticAssets(StaticFiles):
+    # StaticFiles that serves the precompressed variant of a built asset when
+    # the client accepts it, and sets Cache-Control by kind of URL.
+    async def get_response(self, path, scope):
+        immutable = path.startswith(DIST + "/")
+        response = None
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding")) if immutable else None
+        if encoding and scope["method"] in ("GET", "HEAD"):
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path,
+                                                                    path + ENCODING_SUFFIXES[encoding])
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                response = self.file_response(full_path, stat_result, scope)
+                response.headers["content-encoding"] = encoding
+                response.headers["vary"] = "Accept-Encoding"
+        if response is None:
+            response = await super().get_response(path, scope)
+        response.headers["cache-control"] = IMMUTABLE if immutable else "no-cache"
+        return response
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,54 @@
+# Per-table change counters for the page caches.
+#
+# Every committed write reported by changes.py bumps the version of its table,
+# so a cached value built from some tables stays valid exactly as long as
+# their versions don't change, and checking that is a dict lookup per table
+# instead of a query. Take the versions before reading the data: a value
+# stored under versions that a concurrent commit has already bumped is never
+# looked up again.
+#
+# The counters live in process memory. With several worker processes a write
+# made by another worker is only seen when the epoch rolls over, every
+# TABLE_VERSION_TTL seconds, which bounds how stale a cached page can be
+# (as OPTION_CACHE_TTL does for the dropdown lists). For the same reason
+# last_modified() is never older than the start of the current epoch.
+
+import os
+import threading
+import time
+import changes
+
+TABLE_VERSION_TTL = float(os.getenv("TABLE_VERSION_TTL", 30))
+
+_versions = {}
+_changed_at = {}  # table -> time.time() of its last bump
+_started = time.time()
+_lock = threading.Lock()
+
+
+def _epoch():
+    return int(time.time() // TABLE_VERSION_TTL) if TABLE_VERSION_TTL > 0 else 0
+
+
+def current(tables):
+    # (epoch, version of each table), usable as part of a cache key
+    return (_epoch(),) + tuple(_versions.get(table, 0) for table in tables)
+
+
+def last_modified(tables):
+    # Unix time the newest of the tables changed, as far as this process knows
+    since = _epoch() * TABLE_VERSION_TTL if TABLE_VERSION_TTL > 0 else _started
+    return max([since, _started] + [_changed_at.get(table, 0) for table in tables])
+
+
+def bump(*tables):
+    now = time.time()
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+            _changed_at[table] = now
+
+
+@changes.subscribe
+def _on_commit(changed):
+    bump(*changed)
@@ -0,0 +1,349 @@
+# Ranked full-text search over job requirements and the posting member's
+# house rules, with filters on caregiving type and city.
+#
+# On PostgreSQL the match runs on the GIN indexes over
+# to_tsvector('english', ...) declared in models.py, with websearch_to_tsquery
+# syntax (words, "quoted phrases", -exclusions) and ts_rank_cd ranking;
+# quoted phrases are also rechecked against the text itself, since the
+# english configuration drops their stopwords and the in-process index keeps
+# them.
+# Other backends (SQLite in tests and local runs) use an in-process positional
+# inverted index with BM25 ranking, built in a background thread on first use
+# and kept in sync through changes.py; while it is cold, searches fall back to
+# LIKE scans.
+
+import heapq
+import math
+import re
+import threading
+from sqlalchemy import and_, func, literal_column, or_, select
+from sqlalchemy.orm import Session
+from models import User, Member, Job, ts_document
+import changes
+
+SEARCH_FIELDS = ("all", "requirements", "house_rules")
+MAX_RESULTS = 100
+DETAIL_BATCH = 10_000
+
+# House-rule tokens are stored at positions offset by FIELD_GAP so a phrase
+# can't match across the two fields, and count for less when ranking.
+FIELD_GAP = 1_000_000
+HOUSE_RULES_WEIGHT = 0.5
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_QUERY_PART = re.compile(r'"([^"]*)"|(\S+)')
+
+_DOCUMENTS = (
+    select(Job.job_id, Job.member_id, Member.user_id, Job.required_caregiving_type, User.city,
+           Job.other_requirements, Member.house_rules)
+    .join(Member, Job.member_id == Member.member_id)
+    .join(User, Member.user_id == User.user_id)
+)
+
+
+def tokenize(text):
+    return _TOKEN.findall((text or "").lower())
+
+
+def parse_query(query):
+    # Each unit is a list of tokens that must appear consecutively; a plain
+    # word is a one-token unit, a quoted or hyphenated one may be longer.
+    units = []
+    for phrase, word in _QUERY_PART.findall(query):
+        tokens = tokenize(phrase or word)
+        if tokens:
+            units.append(tokens)
+    return units
+
+
+class InvertedIndex:
+    def __init__(self):
+        self.ready = False
+        self.building = False
+        self._postings = {}    # token -> {job_id: [positions]}
+        self._docs = {}        # job_id -> (member_id, user_id, caregiving_type, city, tokens)
+        self._lengths = {}     # job_id -> (requirements length, house rules length)
+        self._member_jobs = {} # member_id -> {job_id}
+        self._user_members = {}  # user_id -> member_id
+        self._total_length = [0, 0]
+        self._pending = {"jobs": set(), "members": set(), "users": set()}
+        self._stale = False
+        self._lock = threading.RLock()
+
+    def load(self, rows):
+        # Built into a separate index, so searches (on the LIKE fallback) and
+        # commit hooks don't wait for the build; only the swap takes the lock.
+        built = InvertedIndex()
+        for row in rows:
+            built.put(row)
+        with self._lock:
+            self._postings, self._docs, self._lengths = built._postings, built._docs, built._lengths
+            self._member_jobs, self._user_members = built._member_jobs, built._user_members
+            self._total_length = built._total_length
+            self.ready, self.building = True, False
+
+    def put(self, row):
+        job_id, member_id, user_id, caregiving_type, city, requirements, house_rules = row
+        with self._lock:
+            self.remove(job_id)
+            req_tokens, rule_tokens = tokenize(requirements), tokenize(house_rules)
+            positions = {}
+            for i, token in enumerate(req_tokens):
+                positions.setdefault(token, []).append(i)
+            for i, token in enumerate(rule_tokens):
+                positions.setdefault(token, []).append(FIELD_GAP + i)
+            for token, where in positions.items():
+                self._postings.setdefault(token, {})[job_id] = where
+            self._docs[job_id] = (member_id, user_id, caregiving_type, (city or "").lower(), tuple(positions))
+            self._lengths[job_id] = (len(req_tokens), len(rule_tokens))
+            self._total_length[0] += len(req_tokens)
+            self._total_length[1] += len(rule_tokens)
+            self._member_jobs.setdefault(member_id, set()).add(job_id)
+            self._user_members[user_id] = member_id
+
+    def remove(self, job_id):
+        with self._lock:
+            doc = self._docs.pop(job_id, None)
+            if doc is None:
+                return
+            for token in doc[4]:
+                postings = self._postings.get(token)
+                postings.pop(job_id, None)
+                if not postings:
+                    del self._postings[token]
+            req_length, rule_length = self._lengths.pop(job_id)
+            self._total_length[0] -= req_length
+            self._total_length[1] -= rule_length
+            self._member_jobs.get(doc[0], set()).discard(job_id)
+
+    def search(self, units, caregiving_type=None, city=None, field="all", limit=20):
+        with self._lock:
+            tokens = {token for unit in units for token in unit}
+            postings = [self._postings.get(token, {}) for token in tokens]
+            if not postings or not all(postings):
+                return []
+            # Intersect starting from the rarest token.
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for p in postings[1:]:
+                candidates.intersection_update(p)
+                if not candidates:
+                    return []
+
+            city = city.lower() if city else None
+            n_docs = len(self._docs)
+            avg_length = [max(total / n_docs, 1.0) for total in self._total_length]
+            idf = {t: math.log(1 + (n_docs - len(self._postings[t]) + 0.5) / (len(self._postings[t]) + 0.5))
+                   for t in tokens}
+
+            # Plain words searched in both fields are settled by the intersection.
+            check_positions = field != "all" or any(len(unit) > 1 for unit in units)
+            scored = []
+            for job_id in candidates:
+                _, _, doc_type, doc_city, _ = self._docs[job_id]
+                if caregiving_type and doc_type != caregiving_type:
+                    continue
+                if city and doc_city != city:
+                    continue
+                if check_positions:
+                    in_fields = [_unit_fields(self._postings, unit, job_id) for unit in units]
+                    if field == "requirements" and not all(f[0] for f in in_fields):
+                        continue
+                    if field == "house_rules" and not all(f[1] for f in in_fields):
+                        continue
+                    if not all(f[0] or f[1] for f in in_fields):
+                        continue
+                scored.append((self._score(job_id, tokens, idf, avg_length, field), job_id))
+            key = lambda s: (s[0], -s[1])
+            return heapq.nlargest(limit, scored, key=key) if limit is not None else sorted(scored, key=key,
+                                                                                             reverse=True)
+
+    def _score(self, job_id, tokens, idf, avg_length, field):
+        score = 0.0
+        for token in tokens:
+            positions = self._postings[token][job_id]
+            req_tf = sum(1 for p in positions if p < FIELD_GAP)
+            for tf, length, avg, weight, name in (
+                    (req_tf, self._lengths[job_id][0], avg_length[0], 1.0, "requirements"),
+                    (len(positions) - req_tf, self._lengths[job_id][1], avg_length[1], HOUSE_RULES_WEIGHT, "house_rules")):
+                if tf and field in ("all", name):
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg)
+                    score += weight * idf[token] * tf * (BM25_K1 + 1) / (tf + norm)
+        return score
+
+
+def _unit_fields(postings, unit, job_id):
+    # (matches in requirements, matches in house rules) for one query unit.
+    starts = postings[unit[0]][job_id]
+    if len(unit) > 1:
+        following = [set(postings[token][job_id]) for token in unit[1:]]
+        starts = [p for p in starts if all(p + i + 1 in f for i, f in enumerate(following))]
+    return any(p < FIELD_GAP for p in starts), any(p >= FIELD_GAP for p in starts)
+
+
+_index = InvertedIndex()
+
+
+def search(db: Session, query: str, caregiving_type: str = None, city: str = None,
+           field: str = "all", limit: int = 20):
+    if field not in SEARCH_FIELDS:
+        raise ValueError(f"field must be one of: {', '.join(SEARCH_FIELDS)}")
+    units = parse_query(query)
+    if not units:
+        return []
+    if limit is not None:  # None: every match, for the reports in queries.py
+        limit = min(limit, MAX_RESULTS)
+
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, query, caregiving_type, city, field, limit)
+
+    with _index._lock:
+        if _index._stale and not _index.building:
+            _index._stale = _index.ready = False
+        if not _index.ready and not _index.building:
+            _index.building = True
+            threading.Thread(target=_build, args=(db.get_bind(),), daemon=True).start()
+        ready = _index.ready
+        if ready:
+            pending = _pending_jobs()
+
+    if not ready:
+        return _search_like(db, query, units, caregiving_type, city, field, limit)
+    if pending:
+        _refresh(db, pending)
+    ranked = _index.search(units, caregiving_type, city, field, limit)
+    return _details(db, ranked)
+
+
+def _search_postgres(db, query, caregiving_type, city, field, limit):
+    tsquery = func.websearch_to_tsquery("english", query)
+    requirements = ts_document(Job.other_requirements)
+    house_rules = ts_document(Member.house_rules)
+    phrases = [_phrase_pattern(tokenize(phrase)) for phrase, _ in _QUERY_PART.findall(query) if tokenize(phrase)]
+
+    def matches(document, column):
+        return and_(document.op("@@")(tsquery), *[column.regexp_match(pattern, "i") for pattern in phrases])
+
+    if field == "requirements":
+        match, rank = matches(requirements, Job.other_requirements), func.ts_rank_cd(requirements, tsquery)
+    elif field == "house_rules":
+        match, rank = matches(house_rules, Member.house_rules), func.ts_rank_cd(house_rules, tsquery)
+    else:
+        match = or_(matches(requirements, Job.other_requirements), matches(house_rules, Member.house_rules))
+        rank = func.ts_rank_cd(requirements, tsquery) + HOUSE_RULES_WEIGHT * func.ts_rank_cd(house_rules, tsquery)
+    stmt = _result_columns(rank.label("rank")).where(match)
+    stmt = _filtered(stmt, caregiving_type, city)
+    return _rows(db.execute(stmt.order_by(rank.desc(), Job.job_id).limit(limit)))
+
+
+def _phrase_pattern(tokens):
+    # The phrase's tokens in a row, as tokenize() splits text. The english
+    # tsquery drops stopwords ("no pets" becomes 'pet', which also matches
+    # "pets welcome"), so quoted phrases are rechecked on the raw text.
+    return r"(^|[^a-z0-9])" + r"[^a-z0-9]+".join(tokens) + r"([^a-z0-9]|$)"
+
+
+def _search_like(db, query, units, caregiving_type, city, field, limit):
+    # Cold-index fallback: unranked substring scans, like the original queries.
+    conditions = []
+    for phrase, word in _QUERY_PART.findall(query):
+        pattern = f"%{phrase or word}%"
+        if field == "requirements":
+            conditions.append(Job.other_requirements.ilike(pattern))
+        elif field == "house_rules":
+            conditions.append(Member.house_rules.ilike(pattern))
+        else:
+            conditions.append(or_(Job.other_requirements.ilike(pattern), Member.house_rules.ilike(pattern)))
+    stmt = _filtered(_result_columns(literal_column("0").label("rank")).where(and_(*conditions)),
+                     caregiving_type, city)
+    return _rows(db.execute(stmt.order_by(Job.job_id).limit(limit)))
+
+
+def _result_columns(rank):
+    return (select(Job.job_id, Job.member_id, User.given_name, User.surname, User.city,
+                   Job.required_caregiving_type, Job.other_requirements, Member.house_rules, rank)
+            .join(Member, Job.member_id == Member.member_id)
+            .join(User, Member.user_id == User.user_id))
+
+
+def _filtered(stmt, caregiving_type, city):
+    if caregiving_type:
+        stmt = stmt.where(Job.required_caregiving_type == caregiving_type)
+    if city:
+        stmt = stmt.where(func.lower(User.city) == city.lower())
+    return stmt
+
+
+def _rows(result):
+    return [{
+        "job_id": r.job_id,
+        "member_id": r.member_id,
+        "member_name": f"{r.given_name} {r.surname}",
+        "city": r.city,
+        "required_caregiving_type": r.required_caregiving_type,
+        "other_requirements": r.other_requirements,
+        "house_rules": r.house_rules,
+        "rank": round(float(r.rank), 4),
+    } for r in result]
+
+
+def _details(db, ranked):
+    if not ranked:
+        return []
+    # In slices: an unlimited search can match more jobs than SQLite allows
+    # bound parameters in one statement.
+    ids = [job_id for _, job_id in ranked]
+    rows = {}
+    for start in range(0, len(ids), DETAIL_BATCH):
+        stmt = _result_columns(literal_column("0").label("rank")).where(Job.job_id.in_(ids[start:start + DETAIL_BATCH]))
+        rows.update((r["job_id"], r) for r in _rows(db.execute(stmt)))
+    results = []
+    for score, job_id in ranked:
+        if job_id in rows:
+            rows[job_id]["rank"] = round(score, 4)
+            results.append(rows[job_id])
+    return results
+
+
+def _build(bind):
+    try:
+        with Session(bind=bind) as db:
+            _index.load(db.execute(_DOCUMENTS))
+    except Exception as e:
+        print(f"Building the job text index failed: {e}")
+        with _index._lock:
+            _index.building = False
+
+
+def _pending_jobs():
+    pending = _index._pending
+    job_ids = set(pending["jobs"])
+    member_ids = set(pending["members"])
+    member_ids.update(_index._user_members[u] for u in pending["users"] if u in _index._user_members)
+    for member_id in member_ids:
+        job_ids.update(_index._member_jobs.get(member_id, ()))
+    _index._pending = {"jobs": set(), "members": set(), "users": set()}
+    return job_ids
+
+
+def _refresh(db, job_ids):
+    rows = {row[0]: row for row in db.execute(_DOCUMENTS.where(Job.job_id.in_(job_ids)))}
+    for job_id in job_ids:
+        if job_id in rows:
+            _index.put(rows[job_id])
+        else:
+            _index.remove(job_id)
+
+
+@changes.subscribe
+def _on_commit(changed):
+    with _index._lock:
+        if not (_index.ready or _index.building):
+            return
+        for table in ("jobs", "members", "users"):
+            if table in changed and changed[table] is None:
+                _index._stale = True
+                return
+            _index._pending[table].update(changed.get(table, ()))